@@ -3,8 +3,342 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import io
+import os
 import random
-from sklearn.linear_model import LinearRegression
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from cache_utils import hash_frame, make_key, memoize, read_upload
+from plot_utils import show_figure
+
+SERIES_ALIASES = ["series_id", "series", "station", "station_id", "site", "site_id"]
+YEAR_ALIASES = ["year"]
+VALUE_ALIASES = ["value"]
+MAX_TABLE_ROWS = 5000
+BACKTEST_MIN_TRAIN = 5
+BACKTEST_METRICS = ["RMSE", "MAE", "MAPE (%)"]
+HOLT_GRID = np.linspace(0.1, 0.9, 9)
+
+# threadpoolctl pins BLAS threads in pool workers; without it workers run with the BLAS default
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+def _find_column(df, aliases):
+    lookup = {str(c).strip().lower(): c for c in df.columns}
+    for alias in aliases:
+        if alias in lookup:
+            return lookup[alias]
+    raise ValueError(f"Missing column: one of {', '.join(aliases)}")
+
+def fit_trend(df):
+    from sklearn.linear_model import LinearRegression  # deferred: scikit-learn is slow to import
+    model = LinearRegression()
+    model.fit(df[["Year"]], df["Value"])
+    return model
+
+def fit_grouped_trends(series_codes, years, values, n_series=None):
+    # Ordinary least squares for every series at once from grouped sums (one bincount per moment).
+    # x is centred on each series' mean year so large year values don't cost precision.
+    # Returns a dict of per-series arrays: n, slope, intercept, r2, last_year.
+    codes = np.asarray(series_codes, dtype=np.int64)
+    x = np.asarray(years, dtype=float)
+    y = np.asarray(values, dtype=float)
+    n_series = int(codes.max()) + 1 if n_series is None else n_series
+
+    n = np.bincount(codes, minlength=n_series).astype(float)
+    safe_n = np.maximum(n, 1)
+    x_mean = np.bincount(codes, weights=x, minlength=n_series) / safe_n
+    y_mean = np.bincount(codes, weights=y, minlength=n_series) / safe_n
+    dx = x - x_mean[codes]
+    dy = y - y_mean[codes]
+    sxx = np.bincount(codes, weights=dx * dx, minlength=n_series)
+    sxy = np.bincount(codes, weights=dx * dy, minlength=n_series)
+    syy = np.bincount(codes, weights=dy * dy, minlength=n_series)
+
+    # A single distinct year has no slope; a flat series is fitted perfectly
+    slope = np.divide(sxy, sxx, out=np.full(n_series, np.nan), where=sxx > 0)
+    intercept = y_mean - slope * x_mean
+    r2 = np.divide(sxy * sxy, sxx * syy, out=np.where(sxx > 0, 1.0, np.nan), where=(sxx > 0) & (syy > 0))
+
+    last_year = np.full(n_series, -np.inf)
+    np.maximum.at(last_year, codes, x)
+    return {"n": n.astype(int), "slope": slope, "intercept": intercept, "r2": r2, "last_year": last_year}
+
+def forecast_grouped(trends, horizon):
+    # (series, horizon) predictions for the years after each series' last observation
+    future_years = trends["last_year"][:, None] + np.arange(1, horizon + 1)[None, :]
+    return future_years, trends["intercept"][:, None] + trends["slope"][:, None] * future_years
+
+def grouped_trends_from_frame(df):
+    series_col = _find_column(df, SERIES_ALIASES)
+    year_col = _find_column(df, YEAR_ALIASES)
+    value_col = _find_column(df, VALUE_ALIASES)
+
+    years = pd.to_numeric(df[year_col], errors="coerce").to_numpy(dtype=float)
+    values = pd.to_numeric(df[value_col], errors="coerce").to_numpy(dtype=float)
+    keep = np.isfinite(years) & np.isfinite(values) & df[series_col].notna().to_numpy()
+    codes, series = pd.factorize(df[series_col][keep], sort=True)
+    trends = fit_grouped_trends(codes, years[keep], values[keep], len(series))
+    return pd.Index(series, name=series_col), trends
+
+# --- Backtesting ---
+# Each model maps (train years, train values, future years) -> predictions. Years are shifted to
+# the last training year so polynomial and ridge terms stay well conditioned.
+
+def _fit_linear(x, y, x_future):
+    return np.polyval(np.polyfit(x - x[-1], y, 1), x_future - x[-1])
+
+def _fit_poly2(x, y, x_future):
+    if len(np.unique(x)) < 3:
+        return _fit_linear(x, y, x_future)
+    return np.polyval(np.polyfit(x - x[-1], y, 2), x_future - x[-1])
+
+def _fit_ridge(x, y, x_future, alpha=1.0):
+    # Closed-form 1-D ridge with an unpenalised intercept (same solution as sklearn's Ridge)
+    dx = x - x.mean()
+    slope = (dx @ (y - y.mean())) / (dx @ dx + alpha)
+    return y.mean() + slope * (x_future - x.mean())
+
+def _fit_theil_sen(x, y, x_future):
+    # Median of pairwise slopes; intercept as in scipy.stats.theilslopes
+    i, j = np.triu_indices(len(x), k=1)
+    dx = x[j] - x[i]
+    valid = dx != 0
+    slope = np.median((y[j] - y[i])[valid] / dx[valid]) if valid.any() else 0.0
+    return np.median(y) - slope * np.median(x) + slope * x_future
+
+def _fit_holt(x, y, x_future):
+    # Holt's linear-trend exponential smoothing; (alpha, beta) picked from a grid by one-step SSE,
+    # with all grid pairs smoothed together
+    alpha, beta = (g.ravel() for g in np.meshgrid(HOLT_GRID, HOLT_GRID))
+    level = np.full(len(alpha), y[0])
+    trend = np.full(len(alpha), y[1] - y[0] if len(y) > 1 else 0.0)
+    sse = np.zeros(len(alpha))
+    for value in y[1:]:
+        predicted = level + trend
+        sse += (value - predicted) ** 2
+        new_level = alpha * value + (1 - alpha) * predicted
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        level = new_level
+    best = np.argmin(sse)
+    # Steps ahead in series units (one year per step)
+    return level[best] + trend[best] * (x_future - x[-1])
+
+FORECAST_MODELS = {
+    "Linear": _fit_linear,
+    "Polynomial (deg 2)": _fit_poly2,
+    "Ridge": _fit_ridge,
+    "Theil-Sen": _fit_theil_sen,
+    "Holt Smoothing": _fit_holt,
+}
+
+def rolling_origin_splits(n, min_train=BACKTEST_MIN_TRAIN, horizon=1):
+    # Expanding-window folds: train on [0, origin), test on [origin, origin + horizon)
+    return [(origin, min(origin + horizon, n)) for origin in range(min_train, n)]
+
+def backtest_series(x, y, models, horizon=1, min_train=BACKTEST_MIN_TRAIN):
+    # Rolling-origin errors for each model on one series -> list of metric dicts
+    order = np.argsort(x, kind="stable")
+    x, y = np.asarray(x, dtype=float)[order], np.asarray(y, dtype=float)[order]
+    rows = []
+    for name in models:
+        fit = FORECAST_MODELS[name]
+        errors, actual = [], []
+        for origin, stop in rolling_origin_splits(len(x), min_train, horizon):
+            errors.append(fit(x[:origin], y[:origin], x[origin:stop]) - y[origin:stop])
+            actual.append(y[origin:stop])
+        if not errors:
+            continue
+        errors, actual = np.concatenate(errors), np.concatenate(actual)
+        nonzero = actual != 0
+        rows.append({
+            "Model": name,
+            "Folds": len(x) - min_train,
+            "RMSE": float(np.sqrt(np.mean(errors ** 2))),
+            "MAE": float(np.mean(np.abs(errors))),
+            "MAPE (%)": float(np.mean(np.abs(errors[nonzero] / actual[nonzero])) * 100) if nonzero.any() else np.nan,
+        })
+    return rows
+
+def _backtest_chunk(chunk, models, horizon, min_train):
+    # One process-pool task: a batch of series. BLAS threads are pinned to one per process so
+    # workers don't oversubscribe the cores.
+    with threadpool_limits(limits=1) if threadpool_limits else nullcontext():
+        rows = []
+        for series_id, x, y in chunk:
+            for row in backtest_series(x, y, models, horizon, min_train):
+                rows.append({"Series": series_id, **row})
+        return rows
+
+def backtest(df, series_col, year_col, value_col, models=None, horizon=1, min_train=BACKTEST_MIN_TRAIN, workers=1):
+    # Rolling-origin backtest of every model on every series. Series are split into chunks and
+    # run in a process pool when workers > 1. Returns a long metrics table (series x model).
+    models = list(FORECAST_MODELS) if models is None else list(models)
+    data = df[[series_col, year_col, value_col]].dropna() if series_col else df[[year_col, value_col]].dropna()
+    if series_col:
+        groups = [(sid, g[year_col].to_numpy(float), g[value_col].to_numpy(float)) for sid, g in data.groupby(series_col, sort=True)]
+    else:
+        groups = [("Series", data[year_col].to_numpy(float), data[value_col].to_numpy(float))]
+
+    if workers <= 1 or len(groups) < 2:
+        rows = _backtest_chunk(groups, models, horizon, min_train)
+    else:
+        # A few chunks per worker balances uneven series lengths without per-series task overhead
+        n_chunks = min(len(groups), workers * 4)
+        chunks = [groups[i::n_chunks] for i in range(n_chunks)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = pool.map(_backtest_chunk, chunks, [models] * n_chunks, [horizon] * n_chunks, [min_train] * n_chunks)
+            rows = [row for part in parts for row in part]
+
+    metrics = pd.DataFrame(rows, columns=["Series", "Model", "Folds"] + BACKTEST_METRICS)
+    return metrics.sort_values(["Series", "Model"], kind="stable").reset_index(drop=True)
+
+def best_models(metrics, metric="RMSE"):
+    # Lowest-error model per series
+    ranked = metrics.dropna(subset=[metric]).sort_values(["Series", metric], kind="stable")
+    return ranked.groupby("Series", sort=False).head(1).reset_index(drop=True)
+
+def best_model_forecasts(df, series_col, year_col, value_col, best, steps):
+    # Refit each series' chosen model on its full history and forecast the next `steps` years
+    chosen = dict(zip(best["Series"], best["Model"]))
+    data = df[[series_col, year_col, value_col]].dropna() if series_col else df[[year_col, value_col]].dropna()
+    groups = data.groupby(series_col, sort=True) if series_col else [("Series", data)]
+    rows = []
+    for series_id, g in groups:
+        if series_id not in chosen:
+            continue
+        order = np.argsort(g[year_col].to_numpy(float), kind="stable")
+        x, y = g[year_col].to_numpy(float)[order], g[value_col].to_numpy(float)[order]
+        forecast = FORECAST_MODELS[chosen[series_id]](x, y, x[-1] + np.arange(1, steps + 1))
+        rows.append({"Series": series_id, "Model": chosen[series_id], "Last Year": int(x[-1]),
+                     **{f"Forecast +{k + 1}": v for k, v in enumerate(forecast)}})
+    return pd.DataFrame(rows)
+
+def show_backtest(df, df_key, series_col, year_col="Year", value_col="Value"):
+    st.markdown("### 🧪 Backtest & Model Selection")
+    if not st.checkbox("Compare models on rolling-origin backtests", key="ai_backtest"):
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        horizon = st.number_input("Test horizon (years)", min_value=1, max_value=10, value=1, key="ai_backtest_horizon")
+    with col2:
+        min_train = st.number_input("Minimum training years", min_value=3, max_value=50, value=BACKTEST_MIN_TRAIN,
+                                    key="ai_backtest_min_train")
+    with col3:
+        metric = st.selectbox("Rank by", BACKTEST_METRICS, key="ai_backtest_metric")
+    with col4:
+        workers = st.number_input("Worker processes", min_value=1, max_value=os.cpu_count() or 1,
+                                  value=os.cpu_count() or 1, key="ai_backtest_workers")
+    models = st.multiselect("Models", list(FORECAST_MODELS), default=list(FORECAST_MODELS), key="ai_backtest_models")
+    if not models:
+        st.info("Select at least one model.")
+        return
+
+    key = make_key(df_key, series_col, tuple(models), int(horizon), int(min_train))
+    with st.spinner("Backtesting models..."):
+        metrics = memoize("ai_backtest", key, lambda: backtest(
+            df, series_col, year_col, value_col, models, int(horizon), int(min_train), int(workers)
+        ))
+    if metrics.empty:
+        st.warning(f"Series need more than {int(min_train)} years to backtest.")
+        return
+
+    best = best_models(metrics, metric)
+    summary = metrics.groupby("Model")[BACKTEST_METRICS].mean().sort_values(metric)
+    summary["Best For (series)"] = best["Model"].value_counts().reindex(summary.index, fill_value=0)
+    st.markdown("#### 🏆 Mean Error by Model")
+    st.dataframe(summary.round(4), use_container_width=True)
+
+    if series_col:
+        st.markdown(f"#### 📋 Best Model per Series (by {metric})")
+        st.dataframe(best.head(MAX_TABLE_ROWS).round(4), use_container_width=True, hide_index=True)
+    else:
+        st.success(f"✅ Best model: **{best['Model'].iloc[0]}** ({metric} {best[metric].iloc[0]:.4g})")
+
+    csv_buf = io.StringIO()
+    metrics.to_csv(csv_buf, index=False)
+    st.download_button("📄 Download Backtest Metrics as CSV", csv_buf.getvalue(), file_name="ai_backtest.csv")
+
+    # Chosen model per series, refit on the full history once per dataset + settings
+    st.markdown("#### 🔮 Forecast with the Best Model")
+    steps = st.slider("Years to forecast", 1, 10, 5, key="ai_backtest_steps")
+    forecasts = memoize("ai_best_fit", make_key(key, metric, steps), lambda: best_model_forecasts(
+        df, series_col, year_col, value_col, best, steps
+    ))
+    st.dataframe(forecasts.head(MAX_TABLE_ROWS).round(4), use_container_width=True, hide_index=True)
+    csv_buf = io.StringIO()
+    forecasts.to_csv(csv_buf, index=False)
+    st.download_button("📄 Download Best-Model Forecasts as CSV", csv_buf.getvalue(), file_name="ai_best_model_forecast.csv")
+
+def grouped_forecast():
+    st.markdown("### 📚 Grouped Series")
+    uploaded = st.file_uploader("Upload CSV/Excel with columns: series_id, Year, Value (one row per series per year)",
+                                type=["csv", "xlsx"], key="ai_grouped_upload")
+    if not uploaded:
+        st.info("Upload a long-format table of series to proceed.")
+        return
+
+    try:
+        df = read_upload(uploaded)
+        # Fit once per dataset; the horizon slider only re-evaluates the cached coefficients
+        series, trends = memoize("ai_grouped_fit", hash_frame(df), lambda: grouped_trends_from_frame(df))
+    except Exception as e:
+        st.error(f"❌ Upload Error: {e}")
+        return
+
+    horizon = st.slider("How many future years to predict?", 1, 10, 5, key="ai_grouped_horizon")
+    future_years, forecasts = forecast_grouped(trends, horizon)
+
+    fitted = np.isfinite(trends["slope"])
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Series", f"{len(series):,}")
+    col2.metric("Rising trends", f"{int((trends['slope'] > 0).sum()):,}")
+    col3.metric("Median R²", f"{np.nanmedian(trends['r2']):.3f}" if fitted.any() else "–")
+
+    table = pd.DataFrame({
+        series.name: series,
+        "N": trends["n"],
+        "Slope": trends["slope"],
+        "Intercept": trends["intercept"],
+        "R²": trends["r2"],
+    })
+    # Forecast columns are labelled by step, since each series may end in a different year
+    for step in range(horizon):
+        table[f"Forecast +{step + 1}"] = forecasts[:, step]
+
+    st.markdown("### 📋 Trend Table")
+    if len(table) > MAX_TABLE_ROWS:
+        st.caption(f"Showing the first {MAX_TABLE_ROWS:,} of {len(table):,} series; the CSV has all of them.")
+    st.dataframe(table.head(MAX_TABLE_ROWS).round(4), use_container_width=True, hide_index=True)
+
+    csv_buf = io.StringIO()
+    table.to_csv(csv_buf, index=False)
+    st.download_button("📄 Download Trends & Forecasts as CSV", csv_buf.getvalue(), file_name="ai_grouped_forecast.csv")
+
+    # Single-series view
+    st.markdown("### 📈 Forecast Plot")
+    i = st.selectbox("Series", range(len(series)), format_func=lambda k: str(series[k]), key="ai_grouped_series")
+    year_col = _find_column(df, YEAR_ALIASES)
+    history = df[df[series.name] == series[i]].sort_values(year_col)
+
+    def build():
+        fig, ax = plt.subplots(figsize=(8, 4))
+        ax.plot(history[year_col], history[_find_column(df, VALUE_ALIASES)], label="Historical", marker='o')
+        ax.plot(future_years[i], forecasts[i], label="Predicted", linestyle="--", marker='x')
+        ax.set_title(f"{series[i]}: slope {trends['slope'][i]:.4g}/yr, R² {trends['r2'][i]:.3f}")
+        ax.set_xlabel("Year")
+        ax.set_ylabel("Value")
+        ax.grid(True, linestyle="--", alpha=0.5)
+        ax.legend()
+        return fig
+
+    df_key = hash_frame(df)
+    show_figure(make_key("ai_grouped", df_key, i, horizon), build, file_name="ai_grouped_forecast.png")
+
+    show_backtest(df, df_key, series.name, year_col, _find_column(df, VALUE_ALIASES))
 
 def ai_prediction_tool():
     st.subheader("🤖 AI Prediction Tool")
@@ -28,6 +362,14 @@ def ai_prediction_tool():
         - Select how many **future years to predict**.
         - See the **forecast line**, table, and download results!
 
+        #### 📚 Many Stations at Once:
+        Choose `📚 Grouped Series` and upload a long table with `series_id`, `Year`, `Value`.
+        Every series gets its own trend (slope, intercept, R²) and forecast in a single pass.
+
+        #### 🧪 Which Model?
+        Tick `🧪 Backtest` to score linear, polynomial, ridge, Theil-Sen and Holt smoothing
+        on rolling-origin splits (train on early years, predict the next ones) and pick the best.
+
         #### 💡 Use For:
         - NDVI trends 🌿  
         - Rainfall 🌧️  
@@ -35,7 +377,12 @@ def ai_prediction_tool():
         - Population, emissions, etc.
         """)
 
-    input_method = st.radio("Select Input Method", ["📤 Upload CSV", "✍️ Manual Entry"], key="ai_input_method")
+    input_method = st.radio("Select Input Method", ["📤 Upload CSV", "📚 Grouped Series (series_id, Year, Value)", "✍️ Manual Entry"],
+                            key="ai_input_method")
+
+    if input_method == "📚 Grouped Series (series_id, Year, Value)":
+        grouped_forecast()
+        return
 
     default_df = pd.DataFrame({
         "Year": list(range(2015, 2024)),
@@ -69,7 +416,7 @@ def ai_prediction_tool():
         uploaded = st.file_uploader("Upload a CSV with columns: Year, Value", type=["csv"])
         if uploaded:
             try:
-                df = pd.read_csv(uploaded)
+                df = read_upload(uploaded)
                 st.write("📄 Uploaded Data", df)
                 if st.button("🧹 Clear Uploaded File"):
                     del st.session_state["ai_input_method"]
@@ -91,9 +438,8 @@ def ai_prediction_tool():
         years_to_predict = st.slider("How many future years to predict?", 1, 10, 5)
         future_years = np.array(list(range(min_year + 1, min_year + 1 + years_to_predict))).reshape(-1, 1)
 
-        # Linear Regression
-        model = LinearRegression()
-        model.fit(df[["Year"]], df["Value"])
+        # Linear Regression (fit once per dataset; the slider only re-evaluates predictions)
+        model = memoize("ai_fit", hash_frame(df[["Year", "Value"]]), lambda: fit_trend(df))
         future_preds = model.predict(future_years)
 
         # Combine
@@ -101,20 +447,21 @@ def ai_prediction_tool():
 
         # Plot
         st.markdown("### 📈 Forecast Plot")
-        fig, ax = plt.subplots(figsize=(8, 4))
-        ax.plot(df["Year"], df["Value"], label="Historical", marker='o')
-        ax.plot(future_years, future_preds, label="Predicted", linestyle="--", marker='x')
-        ax.set_title("Forecast using Linear Regression")
-        ax.set_xlabel("Year")
-        ax.set_ylabel("Value")
-        ax.grid(True, linestyle="--", alpha=0.5)
-        ax.legend()
-        st.pyplot(fig)
 
-        # Export Chart
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png")
-        st.download_button("📥 Download Chart as PNG", buf.getvalue(), file_name="ai_forecast.png")
+        def build():
+            fig, ax = plt.subplots(figsize=(8, 4))
+            ax.plot(df["Year"], df["Value"], label="Historical", marker='o')
+            ax.plot(future_years, future_preds, label="Predicted", linestyle="--", marker='x')
+            ax.set_title("Forecast using Linear Regression")
+            ax.set_xlabel("Year")
+            ax.set_ylabel("Value")
+            ax.grid(True, linestyle="--", alpha=0.5)
+            ax.legend()
+            return fig
+
+        # Rendered once per dataset and horizon; the same PNG feeds the page and the download
+        show_figure(make_key("ai_forecast", hash_frame(df[["Year", "Value"]]), years_to_predict), build,
+                    file_name="ai_forecast.png")
 
         # Export Table
         st.markdown("### 📋 Full Data Table")
@@ -124,5 +471,7 @@ def ai_prediction_tool():
         full_years.to_csv(csv_buf, index=False)
         st.download_button("📄 Download Data as CSV", csv_buf.getvalue(), file_name="ai_forecast.csv")
 
+        show_backtest(df, hash_frame(df[["Year", "Value"]]), None)
+
     except Exception as e:
         st.error(f"❌ Error during prediction: {e}")
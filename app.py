@@ -1,28 +1,9 @@
 import streamlit as st
-from PIL import Image
 
-# Module imports
-from geology_tools import grain_size_analysis
-from soil_tools import soil_texture_triangle
-from botany_tools import biodiversity_index_calculator
-from coastal_tools import coastal_ndwi_viewer
-from general_tools import general_data_tools
-from ai_tools import ai_prediction_tool
-from visual_3d_tools import visual_3d_tool
 from footer import footer
-
-# QFL & MIA Tool import
-from qfl_mia_tool import qfl_and_mia_tool  # Ensure this import works, qfl_mia_tool.py must exist
-
-# Optional Lottie
-from streamlit_lottie import st_lottie
-import requests
-
-def load_lottie_url(url):
-    r = requests.get(url)
-    if r.status_code != 200:
-        return None
-    return r.json()
+from assets import get_asset
+from cache_utils import show_cache_diagnostics
+from tool_registry import TOOLS, load_tool, show_import_profile
 
 # Page Config
 st.set_page_config(
@@ -33,22 +14,12 @@ st.set_page_config(
 
 # Sidebar UI
 with st.sidebar:
-    st.image("https://raw.githubusercontent.com/anindo46/MyProjects/refs/heads/main/pngwing.com.png", width=120)
+    st.image(get_asset("logo"), width=120)
     st.markdown("### 🧪 EcoGeo Lab")
     st.caption("By **Anindo Paul Sourav**  \nGeology & Mining, University of Barishal")
     st.markdown("---")
 
-    module = st.selectbox("📦 Choose a Module", [
-        "🏠 Home",
-        "🪨 Geology Tools",
-        "🧱 Soil Tools",
-        "🌿 Botany Tools",
-        "🌊 Coastal Tools",
-        "📊 General Tools",
-        "🤖 AI Predictions",
-        "🧬 3D Visualization",
-        "📊 QFL & MIA Tool"  # Added QFL tool here
-    ])
+    module = st.selectbox("📦 Choose a Module", ["🏠 Home"] + list(TOOLS))
 
     st.markdown("---")
     st.markdown("""
@@ -59,11 +30,12 @@ with st.sidebar:
 def display_home():
     col1, col2 = st.columns([1, 2])
     with col1:
-        lottie = load_lottie_url("https://assets10.lottiefiles.com/packages/lf20_w98qte06.json")
-        if lottie:
-            st_lottie(lottie, speed=1, loop=True, height=250)
-        else:
-            st.image("https://raw.githubusercontent.com/anindo46/MyProjects/refs/heads/main/pngwing.com.png", width=200)
+        # Bundled copies are served immediately; remote versions replace them once fetched
+        try:
+            from streamlit_lottie import st_lottie
+            st_lottie(get_asset("home_lottie"), speed=1, loop=True, height=250, key="home_lottie")
+        except ImportError:
+            st.image(get_asset("logo"), width=200)
     with col2:
         st.markdown("<h1 style='color:#4B8BBE;'>Welcome to EcoGeo Lab</h1>", unsafe_allow_html=True)
         st.markdown("""
@@ -76,25 +48,16 @@ def display_home():
         """, unsafe_allow_html=True)
     st.success("👈 Select a tool from the sidebar to get started!")
 
-# Module Routing
+# Module Routing (tool modules are imported on first use, see tool_registry.TOOLS)
 if module == "🏠 Home":
     display_home()
-elif module == "🪨 Geology Tools":
-    grain_size_analysis()
-elif module == "🧱 Soil Tools":
-    soil_texture_triangle()
-elif module == "🌿 Botany Tools":
-    biodiversity_index_calculator()
-elif module == "🌊 Coastal Tools":
-    coastal_ndwi_viewer()
-elif module == "📊 General Tools":
-    general_data_tools()
-elif module == "🤖 AI Predictions":
-    ai_prediction_tool()
-elif module == "🧬 3D Visualization":
-    visual_3d_tool()
-elif module == "📊 QFL & MIA Tool":  # Add new module to the routing
-    qfl_and_mia_tool()  # Calling the QFL and MIA tool
+else:
+    load_tool(module)()
+
+# Cache diagnostics (after routing so this run's hits/misses are included)
+with st.sidebar:
+    show_cache_diagnostics()
+    show_import_profile()
 
 # Footer
 footer()
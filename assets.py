@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+import time
+
+from cache_utils import get_cache, memoize
+
+# Offline-first assets: every asset has a bundled copy under assets/ that is served straight away.
+# The remote copy is fetched in a background thread (short timeout) and, once it arrives, is kept
+# in memory for REMOTE_TTL seconds and served to every session. Set ECOGEO_OFFLINE=1 on
+# air-gapped servers to skip remote fetches entirely.
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+FETCH_TIMEOUT = 3  # seconds
+REMOTE_TTL = 24 * 3600
+RETRY_AFTER = 15 * 60  # wait this long before retrying a failed fetch
+
+# name -> (remote URL, bundled file, kind)
+ASSETS = {
+    "logo": ("https://raw.githubusercontent.com/anindo46/MyProjects/refs/heads/main/pngwing.com.png", "logo.png", "image"),
+    "home_lottie": ("https://assets10.lottiefiles.com/packages/lf20_w98qte06.json", "home_lottie.json", "json"),
+}
+
+_fetching = set()
+_failed = {}  # name -> time of the last failed fetch
+_lock = threading.Lock()
+
+
+def offline():
+    return os.environ.get("ECOGEO_OFFLINE", "").lower() in ("1", "true", "yes")
+
+
+def _decode(data, kind):
+    # Raises on anything that is not a usable asset (HTML error pages, truncated downloads, ...)
+    if kind == "json":
+        return json.loads(data)
+    if not data.startswith((b"\x89PNG", b"\xff\xd8", b"GIF8", b"<svg", b"RIFF")):
+        raise ValueError("not an image")
+    return data
+
+
+def _read_bundled(name):
+    _, filename, kind = ASSETS[name]
+    with open(os.path.join(ASSET_DIR, filename), "rb") as f:
+        return _decode(f.read(), kind)
+
+
+def bundled_asset(name):
+    return memoize("bundled_assets", name, lambda: _read_bundled(name), max_entries=len(ASSETS))
+
+
+def _fetch(name):
+    url, _, kind = ASSETS[name]
+    try:
+        import requests
+        response = requests.get(url, timeout=FETCH_TIMEOUT)
+        response.raise_for_status()
+        get_cache("remote_assets", max_entries=len(ASSETS)).put(name, (time.time(), _decode(response.content, kind)))
+        with _lock:
+            _failed.pop(name, None)
+    except Exception:
+        with _lock:
+            _failed[name] = time.time()
+    finally:
+        with _lock:
+            _fetching.discard(name)
+
+
+def _refresh(name):
+    # Start at most one background fetch per asset; never blocks the script run
+    now = time.time()
+    with _lock:
+        if name in _fetching or now - _failed.get(name, 0) < RETRY_AFTER:
+            return
+        _fetching.add(name)
+    threading.Thread(target=_fetch, args=(name,), name=f"asset-{name}", daemon=True).start()
+
+
+def get_asset(name):
+    # Fresh remote copy from memory if there is one, otherwise the bundled copy (or a stale
+    # remote copy while a refresh is under way)
+    entry = get_cache("remote_assets", max_entries=len(ASSETS)).get(name)
+    if entry is not None and time.time() - entry[0] < REMOTE_TTL:
+        return entry[1]
+    if not offline():
+        _refresh(name)
+    if entry is not None:
+        return entry[1]
+    return bundled_asset(name)
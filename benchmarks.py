@@ -0,0 +1,236 @@
+"""Micro-benchmarks for EcoGeo Lab compute and render paths.
+
+Usage:
+    python benchmarks.py qfl
+    python benchmarks.py qfl --sizes 1000 10000 50000
+    python benchmarks.py beta --sites 1000 5000 10000 --workers 1 4
+    python benchmarks.py backtest --series 500 2000 --workers 1 2 4
+    python benchmarks.py upload --rows 10000 100000 1000000
+    python benchmarks.py imports --max-ms 3000
+"""
+import argparse
+import os
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+
+def _best_of(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _print_table(rows, columns):
+    print(pd.DataFrame(rows, columns=columns).to_string(index=False))
+
+
+def _random_qfl(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(rng.dirichlet([4, 2, 1], size=n) * 100, columns=["q", "f", "l"])
+
+
+def _legacy_qfl_render(data):
+    # Original per-sample loop: one scatter collection per point
+    import ternary
+    fig, tax = ternary.figure(scale=100)
+    for _, row in data.iterrows():
+        total = row["q"] + row["f"] + row["l"]
+        if total > 0:
+            tax.scatter([(row["q"] / total * 100, row["f"] / total * 100, row["l"] / total * 100)],
+                        marker="o", color="blue", s=30)
+    return fig
+
+
+def bench_qfl_render(sizes, legacy_limit=2000, repeat=3):
+    from qfl_mia_tool import build_qfl_figure
+
+    def render(build):
+        fig = build()
+        fig.canvas.draw()
+        plt.close(fig)
+
+    rows = []
+    for n in sizes:
+        data = _random_qfl(n)
+        scatter = _best_of(lambda: render(lambda: build_qfl_figure(data, density_threshold=float("inf"))), repeat)
+        density = _best_of(lambda: render(lambda: build_qfl_figure(data, density_threshold=0)), repeat)
+        legacy = _best_of(lambda: render(lambda: _legacy_qfl_render(data)), 1) if n <= legacy_limit else np.nan
+        rows.append([n, legacy, scatter, density])
+    _print_table(rows, ["points", "legacy loop (s)", "single scatter (s)", "hex density (s)"])
+
+
+def _random_survey(n_sites, n_species=300, richness=30, seed=0):
+    # Sparse site x species counts with ~richness species per site
+    from scipy import sparse
+    rng = np.random.default_rng(seed)
+    rows = np.repeat(np.arange(n_sites), richness)
+    cols = rng.integers(0, n_species, size=n_sites * richness)
+    counts = rng.integers(1, 50, size=n_sites * richness).astype(float)
+    matrix = sparse.csr_matrix((counts, (rows, cols)), shape=(n_sites, n_species))
+    matrix.sum_duplicates()
+    return matrix
+
+
+def bench_beta_diversity(sites, workers_list, metrics, k=5):
+    from botany_tools import pairwise_beta
+
+    rows = []
+    for n in sites:
+        matrix = _random_survey(n)
+        for metric in metrics:
+            for workers in workers_list:
+                seconds = _best_of(lambda: pairwise_beta(matrix, metric, nearest_k=k, workers=workers), 1)
+                rows.append([n, metric, workers, seconds, n * n / seconds / 1e6])
+    _print_table(rows, ["sites", "metric", "workers", "nearest-k (s)", "Mpairs/s"])
+
+
+def _random_series(n_series, n_years=20, seed=0):
+    rng = np.random.default_rng(seed)
+    years = np.arange(2000, 2000 + n_years)
+    df = pd.DataFrame({"series_id": np.repeat(np.arange(n_series), n_years), "Year": np.tile(years, n_series)})
+    slopes = np.repeat(rng.normal(0, 0.02, n_series), n_years)
+    df["Value"] = 0.3 + slopes * (df["Year"] - 2000) + rng.normal(0, 0.05, len(df))
+    return df
+
+
+def bench_backtest(series_counts, workers_list):
+    from ai_tools import backtest
+
+    rows = []
+    for n in series_counts:
+        df = _random_series(n)
+        base = None
+        for workers in workers_list:
+            seconds = _best_of(lambda: backtest(df, "series_id", "Year", "Value", workers=workers), 1)
+            base = seconds if base is None else base
+            rows.append([n, workers, seconds, base / seconds])
+    _print_table(rows, ["series", "workers", "all models (s)", "speed-up"])
+
+
+def bench_upload_cache(row_counts, excel_limit=50000):
+    # Parse (CSV / Excel) vs. columnar cache load for the same upload
+    import io
+    import shutil
+    import cache_utils
+
+    class Upload:
+        def __init__(self, name, data):
+            self.name, self.data = name, data
+
+        def getvalue(self):
+            return self.data
+
+    rng = np.random.default_rng(0)
+    for n in row_counts:
+        df = pd.DataFrame({"sample": rng.choice(["A", "B", "C", "D"], n), "sand": rng.random(n) * 100,
+                           "silt": rng.random(n) * 100, "count": rng.integers(0, 500, n)})
+        csv = df.to_csv(index=False).encode()
+        uploads = [Upload(f"bench_{n}.csv", csv)]
+        if n <= excel_limit:
+            buf = io.BytesIO()
+            df.to_excel(buf, index=False)
+            uploads.append(Upload(f"bench_{n}.xlsx", buf.getvalue()))
+        for upload in uploads:
+            key = cache_utils.make_key(cache_utils.hash_bytes(upload.getvalue()), [])
+            shutil.rmtree(cache_utils._entry_dir(key), ignore_errors=True)
+            for _ in range(2):  # first read parses and writes the cache, second loads it
+                cache_utils.get_cache("uploads", max_bytes=cache_utils.UPLOAD_MEMORY_MAX_BYTES).clear()
+                cache_utils.read_upload(upload)
+
+    report = cache_utils.upload_cache_report()
+    print(f"Upload cache format: {'feather' if cache_utils.HAS_ARROW else 'npy'}")
+    print(report.to_string(index=False))
+
+
+def _import_ms(modules):
+    # Cold import in a fresh interpreter; -X importtime reports cumulative microseconds per
+    # module, and the unindented lines are the ones this statement imported directly
+    import subprocess
+    import sys
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {', '.join(modules)} failed:\n{result.stderr.strip().splitlines()[-1]}")
+    total = 0
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() in modules and not parts[2].startswith("  "):
+            total += int(parts[1])
+    return total / 1000
+
+
+def _app_shell_modules():
+    # What app.py imports before any tool page is opened, read from its top-level imports so
+    # the benchmark follows app.py as it changes
+    import ast
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    names = set()
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            names.add(node.module)
+    return sorted(names)
+
+
+def bench_imports(modules, max_ms=None):
+    # Cold-start cost of the app shell vs. each tool module; exits non-zero over budget
+    from tool_registry import TOOLS
+    modules = modules or ["app shell"] + sorted({name for name, _ in TOOLS.values()})
+    rows = []
+    for module in modules:
+        ms = _import_ms(_app_shell_modules() if module == "app shell" else [module])
+        rows.append([module, ms, "" if max_ms is None or ms <= max_ms else "OVER BUDGET"])
+    _print_table(rows, ["module", "cold import (ms)", "status"])
+    if any(status for _, _, status in rows):
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    qfl = sub.add_parser("qfl", help="QFL ternary render time vs. point count")
+    qfl.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 10000, 50000])
+    qfl.add_argument("--repeat", type=int, default=3)
+
+    beta = sub.add_parser("beta", help="Pairwise beta-diversity time vs. site count and worker processes")
+    beta.add_argument("--sites", type=int, nargs="+", default=[1000, 2500, 5000, 10000])
+    beta.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    beta.add_argument("--metrics", nargs="+", default=["Bray-Curtis", "Jaccard"])
+
+    bt = sub.add_parser("backtest", help="Rolling-origin backtest time vs. series count and worker processes")
+    bt.add_argument("--series", type=int, nargs="+", default=[500, 2000])
+    bt.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+
+    upload = sub.add_parser("upload", help="Upload parse time vs. columnar cache load time")
+    upload.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+
+    imports = sub.add_parser("imports", help="Cold import time of the app shell and each tool module")
+    imports.add_argument("--modules", nargs="+", default=None)
+    imports.add_argument("--max-ms", type=float, default=None, help="fail if any import exceeds this budget")
+
+    args = parser.parse_args()
+    if args.bench == "qfl":
+        bench_qfl_render(args.sizes, repeat=args.repeat)
+    elif args.bench == "beta":
+        bench_beta_diversity(args.sites, args.workers, args.metrics)
+    elif args.bench == "backtest":
+        bench_backtest(args.series, args.workers)
+    elif args.bench == "upload":
+        bench_upload_cache(args.rows)
+    elif args.bench == "imports":
+        bench_imports(args.modules, args.max_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,498 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import io
+import os
 import random
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from scipy import sparse
+from scipy.special import gammaln
+
+from cache_utils import hash_array, hash_frame, make_key, memoize, read_upload, scratch_path
+from plot_utils import show_figure
+
+PLOT_ALIASES = ["plot", "plot_id", "plot id", "quadrat", "site", "site_id"]
+SPECIES_ALIASES = ["species", "taxon"]
+COUNT_ALIASES = ["count", "abundance", "individuals"]
+BOOTSTRAP_REPLICATES = 1000
+BOOTSTRAP_MEMORY_BUDGET = 64 * 1024 * 1024  # bytes of resampled counts held at once
+BETA_METRICS = ["Bray-Curtis", "Jaccard"]
+BETA_BLOCK_BUDGET = 64 * 1024 * 1024  # bytes of one (block rows x plots) distance block
+BETA_NEAREST_K = 5
+BETA_HEATMAP_PLOTS = 200
+BETA_DOWNLOAD_BYTES = 200 * 1024 * 1024
+BETA_DOWNLOAD_CACHE_BYTES = 2 * BETA_DOWNLOAD_BYTES  # download files of recently viewed matrices
+RAREFACTION_POINTS = 200  # effort levels precomputed per curve
+RAREFACTION_BUDGET = 64 * 1024 * 1024
+MAX_CURVES_PLOTTED = 100
+
+def _find_column(df, aliases):
+    lookup = {str(c).strip().lower(): c for c in df.columns}
+    for alias in aliases:
+        if alias in lookup:
+            return lookup[alias]
+    raise ValueError(f"Missing column: one of {', '.join(aliases)}")
+
+def site_species_matrix(df):
+    # Long format (plot, species, count) -> sparse plot x species count matrix (duplicates summed)
+    plot_col = _find_column(df, PLOT_ALIASES)
+    species_col = _find_column(df, SPECIES_ALIASES)
+    count_col = _find_column(df, COUNT_ALIASES)
+
+    counts = pd.to_numeric(df[count_col], errors="coerce").to_numpy(dtype=float)
+    keep = np.isfinite(counts) & (counts > 0) & df[plot_col].notna().to_numpy() & df[species_col].notna().to_numpy()
+    plot_codes, plots = pd.factorize(df[plot_col][keep], sort=True)
+    species_codes, species = pd.factorize(df[species_col][keep], sort=True)
+
+    matrix = sparse.csr_matrix(
+        (counts[keep], (plot_codes, species_codes)),
+        shape=(len(plots), len(species))
+    )
+    matrix.sum_duplicates()
+    return matrix, pd.Index(plots, name=plot_col), pd.Index(species, name=species_col)
+
+def _p_log_p(p):
+    # p * ln(p) with 0 * ln(0) = 0 and no log(0) warnings
+    return p * np.log(p, out=np.zeros_like(p), where=p > 0)
+
+def _indices_from_proportions(p, axis=-1):
+    H = -_p_log_p(p).sum(axis=axis)
+    D = 1 - (p ** 2).sum(axis=axis)
+    S = (p > 0).sum(axis=axis)
+    log_s = np.log(np.maximum(S, 1))
+    J = np.divide(H, log_s, out=np.zeros_like(H), where=S > 1)
+    return H, D, S, J
+
+def diversity_from_matrix(matrix):
+    # Shannon H', Simpson 1-D and evenness J for every row of a (sparse) plot x species matrix
+    matrix = sparse.csr_matrix(matrix, dtype=float)
+    totals = np.asarray(matrix.sum(axis=1)).ravel()
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    safe_totals = np.where(totals > 0, totals, 1)
+    p = matrix.data / safe_totals[rows]
+
+    n_rows = matrix.shape[0]
+    H = -np.bincount(rows, weights=_p_log_p(p), minlength=n_rows)
+    D = 1 - np.bincount(rows, weights=p ** 2, minlength=n_rows)
+    S = np.bincount(rows, weights=(p > 0), minlength=n_rows).astype(int)
+    J = np.divide(H, np.log(np.maximum(S, 1)), out=np.zeros_like(H), where=S > 1)
+
+    result = pd.DataFrame({"N": totals, "Richness (S)": S, "Shannon (H')": H, "Simpson (1-D)": D, "Evenness (J)": J})
+    result.loc[totals <= 0, ["Shannon (H')", "Simpson (1-D)", "Evenness (J)"]] = np.nan
+    return result
+
+def _padded_counts(matrix):
+    # Dense (plots, max richness) array holding only each plot's non-zero counts
+    matrix = sparse.csr_matrix(matrix)
+    richness = np.diff(matrix.indptr)
+    width = max(int(richness.max()) if len(richness) else 0, 1)
+    padded = np.zeros((matrix.shape[0], width))
+    rows = np.repeat(np.arange(matrix.shape[0]), richness)
+    cols = np.arange(len(matrix.data)) - np.repeat(matrix.indptr[:-1], richness)
+    padded[rows, cols] = matrix.data
+    return padded
+
+def bootstrap_diversity(matrix, replicates=BOOTSTRAP_REPLICATES, ci=95, seed=0, budget=BOOTSTRAP_MEMORY_BUDGET):
+    # Multinomial resampling of each plot's individuals, vectorized across plots and replicates.
+    # Plots are processed in chunks so the (plots, replicates, species) sample stays within budget.
+    counts = _padded_counts(matrix)
+    totals = counts.sum(axis=1)
+    n = np.rint(totals).astype(np.int64)
+    proportions = counts / np.where(totals > 0, totals, 1)[:, None]
+    proportions[totals <= 0, 0] = 1.0
+
+    rng = np.random.default_rng(seed)
+    chunk = max(1, int(budget // (replicates * counts.shape[1] * 8)))
+    tail = (100 - ci) / 2
+    names = ["Shannon (H')", "Simpson (1-D)", "Evenness (J)"]
+    bounds = {f"{name} {side}": np.full(len(n), np.nan) for name in names for side in ("Low", "High")}
+
+    for start in range(0, len(n), chunk):
+        stop = min(start + chunk, len(n))
+        samples = rng.multinomial(n[start:stop, None], proportions[start:stop, None, :], size=(stop - start, replicates))
+        p = samples / np.maximum(n[start:stop], 1)[:, None, None]
+        H, D, _, J = _indices_from_proportions(p)
+        for name, values in zip(names, (H, D, J)):
+            low, high = np.percentile(values, [tail, 100 - tail], axis=1)
+            bounds[f"{name} Low"][start:stop] = low
+            bounds[f"{name} High"][start:stop] = high
+
+    result = pd.DataFrame(bounds)
+    result.loc[totals <= 0] = np.nan
+    return result
+
+def batch_diversity_table(df, replicates=BOOTSTRAP_REPLICATES, ci=95):
+    matrix, plots, _ = site_species_matrix(df)
+    indices = diversity_from_matrix(matrix)
+    if replicates:
+        indices = pd.concat([indices, bootstrap_diversity(matrix, replicates, ci)], axis=1)
+    indices.insert(0, plots.name, plots)
+    return indices
+
+# --- Beta diversity ---
+
+_worker_matrices = {}
+
+def _load_matrix(source):
+    # Worker processes load the saved matrix once and reuse it for every block they handle
+    if not isinstance(source, str):
+        return source
+    if source not in _worker_matrices:
+        _worker_matrices.clear()
+        _worker_matrices[source] = sparse.load_npz(source).tocsr()
+    return _worker_matrices[source]
+
+def beta_block(matrix, start, stop, metric="Bray-Curtis"):
+    # Dissimilarity of plots start:stop against every plot, as a dense (stop - start, n) block
+    block = matrix[start:stop]
+    if metric == "Bray-Curtis":
+        # BC = sum|x - y| / (sum x + sum y)
+        from sklearn.metrics.pairwise import manhattan_distances  # deferred: scikit-learn is slow to import
+        totals = np.asarray(matrix.sum(axis=1)).ravel()
+        denom = totals[start:stop, None] + totals[None, :]
+        dist = manhattan_distances(block, matrix)
+    elif metric == "Jaccard":
+        # Presence/absence: 1 - |A & B| / |A | B|, shared species from one sparse product
+        presence = (matrix > 0).astype(np.float64)
+        richness = np.asarray(presence.sum(axis=1)).ravel()
+        shared = (presence[start:stop] @ presence.T).toarray()
+        denom = richness[start:stop, None] + richness[None, :] - shared
+        dist = denom - shared
+    else:
+        raise ValueError(f"Unknown metric: {metric}")
+    # Two empty plots are identical
+    return np.divide(dist, denom, out=np.zeros_like(dist), where=denom > 0)
+
+def _beta_job(source, start, stop, metric, k, out_path):
+    matrix = _load_matrix(source)
+    dist = beta_block(matrix, start, stop, metric)
+    if out_path is not None:
+        out = np.load(out_path, mmap_mode="r+")
+        out[start:stop] = dist
+        out.flush()
+        del out
+    if not k:
+        return None
+    # Nearest k other plots per row (self excluded), sorted by distance
+    rows = np.arange(stop - start)
+    dist[rows, rows + start] = np.inf
+    k = min(k, dist.shape[1] - 1)
+    nearest = np.argpartition(dist, k - 1, axis=1)[:, :k] if k > 0 else np.zeros((len(rows), 0), dtype=int)
+    nearest_dist = np.take_along_axis(dist, nearest, axis=1)
+    order = np.argsort(nearest_dist, axis=1, kind="stable")
+    return np.take_along_axis(nearest, order, axis=1), np.take_along_axis(nearest_dist, order, axis=1)
+
+def pairwise_beta(matrix, metric="Bray-Curtis", nearest_k=BETA_NEAREST_K, out_path=None, workers=1,
+                  budget=BETA_BLOCK_BUDGET):
+    # Pairwise plot dissimilarity computed in row blocks so the n x n result is never held in memory:
+    # blocks are written to a float32 .npy memmap at out_path and/or reduced to the nearest k plots.
+    # With workers > 1 the blocks run in a process pool against the matrix saved to scratch.
+    # Returns (distance memmap or None, (neighbour indices, distances) or None).
+    matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+    n = matrix.shape[0]
+    block_rows = max(1, min(n, int(budget // (max(n, 1) * 8 * 3))))
+
+    distances = None
+    if out_path is not None:
+        distances = np.lib.format.open_memmap(out_path, mode="w+", dtype=np.float32, shape=(n, n))
+        distances.flush()
+
+    if workers > 1:
+        # Content-hashed and private to this call (another session may be saving the same matrix);
+        # removed once the pool is done
+        key = make_key(matrix.shape, hash_array(matrix.data), hash_array(matrix.indices), hash_array(matrix.indptr))
+        source = scratch_path(f"beta_matrix_{key}_{os.getpid()}_{threading.get_ident()}.npz")
+        sparse.save_npz(source, matrix, compressed=False)
+    else:
+        source = matrix
+
+    jobs = [(source, start, min(start + block_rows, n), metric, nearest_k, out_path) for start in range(0, n, block_rows)]
+    if workers <= 1:
+        results = [_beta_job(*job) for job in jobs]
+    else:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_beta_job, *zip(*jobs)))
+        finally:
+            os.remove(source)
+
+    neighbours = None
+    if nearest_k and n:
+        neighbours = (np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results]))
+    return distances, neighbours
+
+def nearest_plots_table(plots, neighbours):
+    # Long table: one row per (plot, neighbour rank)
+    index, dist = neighbours
+    k = index.shape[1]
+    return pd.DataFrame({
+        plots.name: np.repeat(plots.to_numpy(), k),
+        "Rank": np.tile(np.arange(1, k + 1), len(plots)),
+        "Neighbour": plots.to_numpy()[index.ravel()],
+        "Dissimilarity": dist.ravel(),
+    })
+
+def read_file_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def show_beta_diversity(df, df_key):
+    st.markdown("### 🔀 Beta Diversity (Between Plots)")
+    if not st.checkbox("Compare plots (Bray-Curtis / Jaccard dissimilarity)", key="beta_diversity"):
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        metric = st.radio("Metric", BETA_METRICS, horizontal=True, key="beta_metric")
+    with col2:
+        output = st.radio("Output", ["Nearest plots", "Full matrix"], horizontal=True, key="beta_output")
+    with col3:
+        k = st.number_input("Nearest k", min_value=1, max_value=50, value=BETA_NEAREST_K, key="beta_k")
+    with col4:
+        workers = st.number_input("Worker processes", min_value=1, max_value=os.cpu_count() or 1,
+                                  value=os.cpu_count() or 1, key="beta_workers")
+
+    matrix, plots, _ = site_species_matrix(df)
+    n = len(plots)
+    if n < 2:
+        st.warning("At least two plots are needed for between-plot comparison.")
+        return
+
+    full = output == "Full matrix"
+    key = make_key(df_key, metric, int(k), full)
+    out_path = scratch_path(f"beta_{key}.npy") if full else None
+    # Small surveys are faster in-process than paying the pool start-up
+    pool_workers = int(workers) if n > 2000 else 1
+    with st.spinner(f"Computing {metric} dissimilarity for {n:,} plots..."):
+        distances, neighbours = memoize("beta_diversity", key, lambda: pairwise_beta(
+            matrix, metric, nearest_k=int(k), out_path=out_path, workers=pool_workers
+        ))
+
+    table = nearest_plots_table(plots, neighbours)
+    st.markdown(f"#### 🧭 {int(k)} Most Similar Plots per Plot")
+    st.dataframe(table.head(5000).round(4), use_container_width=True, hide_index=True)
+    # Download files are built once per result, not on every rerun
+    st.download_button("📄 Download Nearest Plots as CSV",
+                       memoize("beta_downloads", make_key(key, "nearest"), lambda: table.to_csv(index=False).encode(),
+                               max_bytes=BETA_DOWNLOAD_CACHE_BYTES),
+                       file_name=f"nearest_plots_{metric.lower()}.csv")
+
+    if distances is None:
+        return
+
+    shown = min(n, BETA_HEATMAP_PLOTS)
+
+    def build():
+        fig, ax = plt.subplots(figsize=(6, 5))
+        im = ax.imshow(distances[:shown, :shown], cmap="viridis", vmin=0, vmax=1, interpolation="nearest")
+        fig.colorbar(im, ax=ax, label=f"{metric} dissimilarity")
+        ax.set_title(f"{metric} Dissimilarity" + (f" (first {shown} plots)" if shown < n else ""))
+        return fig
+
+    show_figure(make_key("beta_heatmap", key), build, file_name=f"beta_{metric.lower()}_heatmap.png",
+                label="📥 Download Heatmap as PNG")
+
+    if distances.nbytes <= BETA_DOWNLOAD_BYTES:
+        if n <= BETA_HEATMAP_PLOTS:
+            st.download_button("📄 Download Distance Matrix as CSV",
+                               memoize("beta_downloads", make_key(key, "csv"),
+                                       lambda: pd.DataFrame(distances, index=plots, columns=plots).to_csv().encode(),
+                                       max_bytes=BETA_DOWNLOAD_CACHE_BYTES),
+                               file_name=f"beta_{metric.lower()}.csv")
+        st.download_button("📥 Download Distance Matrix (.npy, float32)",
+                           memoize("beta_downloads", make_key(key, "npy"), lambda: read_file_bytes(distances.filename),
+                                   max_bytes=BETA_DOWNLOAD_CACHE_BYTES),
+                           file_name=f"beta_{metric.lower()}.npy")
+    else:
+        st.info(f"💾 The {n:,} x {n:,} matrix ({distances.nbytes / 1e9:.1f} GB) is memory-mapped at `{distances.filename}`.")
+
+# --- Rarefaction & accumulation ---
+
+def effort_grid(total, points=RAREFACTION_POINTS):
+    # Integer effort levels 1..total (every level when small, evenly spaced otherwise)
+    total = int(total)
+    if total <= points:
+        return np.arange(1, total + 1)
+    return np.unique(np.rint(np.linspace(1, total, points)).astype(np.int64))
+
+def _absent_probability(remaining, total, n):
+    # C(remaining, n) / C(total, n) via log-gamma; 0 where fewer than n are left
+    valid = remaining >= n
+    r = np.where(valid, remaining, n)
+    log_ratio = gammaln(r + 1) - gammaln(r - n + 1) - gammaln(total + 1) + gammaln(total - n + 1)
+    return np.where(valid, np.exp(log_ratio), 0.0)
+
+def hurlbert_rarefaction(matrix, sizes, budget=RAREFACTION_BUDGET):
+    # Expected richness E[S_n] = sum_i 1 - C(N - N_i, n) / C(N, n) for every plot (row) and every
+    # sample size n. Returns a (plots, sizes) array, NaN where n exceeds a plot's total N.
+    matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+    matrix.data = np.rint(matrix.data)
+    matrix.eliminate_zeros()
+    sizes = np.asarray(sizes, dtype=np.float64)
+    totals = np.asarray(matrix.sum(axis=1)).ravel()
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    # Sums the per-species terms of each plot with one sparse product
+    by_plot = sparse.csr_matrix((np.ones(len(rows)), (rows, np.arange(len(rows)))), shape=(matrix.shape[0], len(rows)))
+
+    expected = np.empty((matrix.shape[0], len(sizes)))
+    chunk = max(1, int(budget // (max(len(rows), 1) * 8 * 4)))
+    for start in range(0, len(sizes), chunk):
+        n = sizes[None, start:start + chunk]
+        total = np.maximum(totals[rows, None], n)
+        terms = 1 - _absent_probability(totals[rows, None] - matrix.data[:, None], total, n)
+        expected[:, start:start + chunk] = by_plot @ terms
+    expected[totals[:, None] < sizes[None, :]] = np.nan
+    return expected
+
+def mao_tau(matrix, sizes=None):
+    # Sample-based accumulation (Colwell et al. 2004): expected species after t of T plots and its
+    # analytical standard deviation, from the counts s_j of species found in exactly j plots.
+    presence = sparse.csc_matrix(matrix) > 0
+    T = presence.shape[0]
+    frequency = np.asarray(presence.sum(axis=0)).ravel()
+    frequency = frequency[frequency > 0]
+    s_obs = len(frequency)
+    j, s_j = np.unique(frequency, return_counts=True)
+
+    t = np.arange(1, T + 1) if sizes is None else np.asarray(sizes)
+    alpha = _absent_probability(T - j[None, :], np.full((1, len(j)), T), t[:, None])
+    tau = s_obs - alpha @ s_j
+
+    # Richness estimate for the variance term: Chao2 from uniques (q1) and duplicates (q2)
+    q1 = s_j[j == 1].sum()
+    q2 = s_j[j == 2].sum()
+    chao2 = s_obs + (q1 * q1 / (2 * q2) if q2 > 0 else q1 * (q1 - 1) / 2)
+    variance = ((1 - alpha) ** 2) @ s_j - (tau ** 2 / chao2 if chao2 > 0 else 0)
+    return pd.DataFrame({"Plots": t, "Expected Species": tau, "SD": np.sqrt(np.maximum(variance, 0))})
+
+def rarefaction_table(df):
+    # Everything the rarefaction sliders need, computed once per dataset
+    matrix, plots, _ = site_species_matrix(df)
+    totals = np.asarray(matrix.sum(axis=1)).ravel()
+    sizes = effort_grid(totals.max() if len(totals) else 0)
+    curves = pd.DataFrame(hurlbert_rarefaction(matrix, sizes), index=plots, columns=sizes)
+    return curves, mao_tau(matrix)
+
+def _plot_rarefaction(curves):
+    fig, ax = plt.subplots(figsize=(8, 4))
+    shown = curves.iloc[:MAX_CURVES_PLOTTED]
+    for _, curve in shown.iterrows():
+        ax.plot(curves.columns, curve.to_numpy(), color="forestgreen", alpha=0.6 if len(shown) > 1 else 1.0, lw=1)
+    ax.set_title("Rarefaction Curves" + (f" (first {len(shown)} plots)" if len(shown) < len(curves) else ""))
+    ax.set_xlabel("Individuals sampled (n)")
+    ax.set_ylabel("Expected species E[Sₙ]")
+    return fig
+
+def show_rarefaction(df, df_key, single=False):
+    st.markdown("### 📉 Rarefaction" if single else "### 📉 Rarefaction & Species Accumulation")
+    if single:
+        df = df.assign(Plot="Sample")
+    with st.spinner("Computing rarefaction curves..."):
+        curves, accumulation = memoize("rarefaction", make_key(df_key, single), lambda: rarefaction_table(df))
+    if curves.empty or len(curves.columns) < 2:
+        st.info("Not enough individuals for a rarefaction curve.")
+        return
+
+    # Curves are drawn once per dataset; the slider only indexes precomputed columns
+    sizes = list(curves.columns)
+    totals = curves.notna().sum(axis=1)
+    default = sizes[max(int(totals.min()) - 1, 0)]
+    n = st.select_slider("Sample size n (individuals)", options=sizes, value=default, key=f"rarefy_n_{int(single)}")
+    at_n = curves[n]
+
+    if single:
+        st.metric(f"Expected species in {n:,} individuals", f"{at_n.iloc[0]:.2f}")
+    else:
+        table = pd.DataFrame({curves.index.name: curves.index, f"E[S] at n={n}": at_n.to_numpy()})
+        st.caption(f"{int(at_n.notna().sum()):,} of {len(at_n):,} plots have at least {n:,} individuals.")
+        st.dataframe(table.round(3), use_container_width=True, hide_index=True)
+
+    show_figure(make_key("rarefaction", df_key, single), lambda: _plot_rarefaction(curves),
+                file_name="rarefaction_curves.png" if not single else "rarefaction_curve.png")
+
+    if single or len(accumulation) < 2:
+        return
+
+    st.markdown("#### 🧮 Species Accumulation (Mao Tau)")
+    t = st.select_slider("Number of plots", options=list(accumulation["Plots"]), value=int(accumulation["Plots"].iloc[-1]),
+                         key="accumulation_t")
+    row = accumulation.set_index("Plots").loc[t]
+    st.metric(f"Expected species in {t:,} plots", f"{row['Expected Species']:.2f}", f"± {1.96 * row['SD']:.2f} (95% CI)",
+              delta_color="off")
+
+    def build():
+        fig, ax = plt.subplots(figsize=(8, 4))
+        x, y, sd = accumulation["Plots"], accumulation["Expected Species"], accumulation["SD"]
+        ax.fill_between(x, y - 1.96 * sd, y + 1.96 * sd, color="forestgreen", alpha=0.2, label="95% CI")
+        ax.plot(x, y, color="forestgreen", label="Mao Tau")
+        ax.set_xlabel("Plots sampled")
+        ax.set_ylabel("Expected species")
+        ax.legend()
+        return fig
+
+    show_figure(make_key("accumulation", df_key), build, file_name="species_accumulation.png")
+
+    csv_buf = io.StringIO()
+    accumulation.to_csv(csv_buf, index=False)
+    st.download_button("📄 Download Accumulation Curve as CSV", csv_buf.getvalue(), file_name="species_accumulation.csv")
+
+def diversity_indices(df):
+    df = df.dropna().copy()
+    df["Count"] = df["Count"].astype(int)
+
+    N = df["Count"].sum()
+    if N == 0:
+        return df, None
+
+    p = df["Count"].to_numpy(dtype=float) / N
+    H, D, _, J = _indices_from_proportions(p)
+    return df, (float(H), float(D), float(J))
+
+def batch_biodiversity():
+    st.markdown("### 📚 Batch Plots")
+    uploaded = st.file_uploader("Upload CSV/Excel with 'Plot', 'Species' and 'Count' columns (one row per species per plot)",
+                                type=["csv", "xlsx"], key="biodiv_batch_upload")
+    if not uploaded:
+        st.info("Upload a long-format survey table to proceed.")
+        return
+
+    try:
+        df = read_upload(uploaded)
+    except Exception as e:
+        st.error(f"❌ File Error: {e}")
+        return
+
+    col1, col2 = st.columns(2)
+    with col1:
+        replicates = st.select_slider("Bootstrap replicates", [0, 200, 500, 1000, 2000], value=BOOTSTRAP_REPLICATES)
+    with col2:
+        ci = st.select_slider("Confidence level (%)", [80, 90, 95, 99], value=95)
+
+    try:
+        df_key = hash_frame(df)
+        with st.spinner("Computing indices for all plots..."):
+            table = memoize("biodiversity_batch", make_key(df_key, replicates, ci),
+                            lambda: batch_diversity_table(df, replicates, ci))
+    except Exception as e:
+        st.error(f"⚠️ Calculation error: {e}")
+        return
+
+    st.markdown(f"#### 📊 Biodiversity Metrics ({len(table):,} plots)")
+    st.dataframe(table.round(4), use_container_width=True, hide_index=True)
+
+    csv_buf = io.StringIO()
+    table.to_csv(csv_buf, index=False)
+    st.download_button("📄 Download Plot Metrics as CSV", csv_buf.getvalue(), file_name="biodiversity_plots.csv")
+
+    try:
+        show_rarefaction(df, df_key)
+    except Exception as e:
+        st.error(f"⚠️ Rarefaction error: {e}")
+
+    try:
+        show_beta_diversity(df, df_key)
+    except Exception as e:
+        st.error(f"⚠️ Beta diversity error: {e}")
 
 def biodiversity_index_calculator():
     st.subheader("🌿 Biodiversity Index Calculator")
@@ -26,12 +517,24 @@ def biodiversity_index_calculator():
         - Click ✅ Apply.
         - Tool calculates Shannon Index, Simpson Index, Evenness.
         - See bar chart & export PNG/CSV.
+        - Drag the rarefaction slider to compare richness at equal sample size.
+
+        #### 📚 Many Plots at Once:
+        Choose `📚 Batch Plots` and upload a long table with `Plot`, `Species`, `Count`
+        columns. H', 1-D and J are computed for every plot, with bootstrap confidence intervals.
+        Rarefaction curves for every plot and a Mao Tau species-accumulation curve
+        (with 95% CI) are shown below the table. Tick `🔀 Beta Diversity` to compare plots by Bray-Curtis or Jaccard dissimilarity
+        (nearest plots per plot, or the full distance matrix).
 
         #### 💡 Use For:
         - Vegetation studies, habitat richness, ecological research.
         """)
 
-    input_method = st.radio("Select Input Method:", ["📤 Upload CSV", "✍️ Manual Entry"], key="biodiv_input_method")
+    input_method = st.radio("Select Input Method:", ["📤 Upload CSV", "📚 Batch Plots (Plot, Species, Count)", "✍️ Manual Entry"], key="biodiv_input_method")
+
+    if input_method == "📚 Batch Plots (Plot, Species, Count)":
+        batch_biodiversity()
+        return
 
     default_df = pd.DataFrame({
         "Species": [f"Species {i+1}" for i in range(5)],
@@ -68,7 +571,7 @@ def biodiversity_index_calculator():
 
         if uploaded:
             try:
-                df = pd.read_csv(uploaded)
+                df = read_upload(uploaded)
                 st.write("📄 Uploaded Data", df)
 
                 if st.button("🧹 Clear Uploaded File"):
@@ -84,22 +587,12 @@ def biodiversity_index_calculator():
 
     # --- Calculation Section ---
     try:
-        df.dropna(inplace=True)
-        df["Count"] = df["Count"].astype(int)
-
-        N = df["Count"].sum()
-        if N == 0:
+        df_key = hash_frame(df)
+        df, indices = memoize("biodiversity", df_key, lambda: diversity_indices(df))
+        if indices is None:
             st.warning("Total count is zero. Please enter valid species counts.")
             return
-
-        df["pi"] = df["Count"] / N
-        df["pi_ln_pi"] = df["pi"] * np.log(df["pi"])
-        df["pi_sq"] = df["pi"] ** 2
-
-        H = -df["pi_ln_pi"].sum()
-        D = 1 - df["pi_sq"].sum()
-        S = len(df)
-        J = H / np.log(S) if S > 1 else 0
+        H, D, J = indices
 
         st.markdown(f"""
         ### 📊 Biodiversity Metrics
@@ -108,24 +601,24 @@ def biodiversity_index_calculator():
         - **Evenness (J)**: `{J:.3f}`
         """)
 
-        # Plotting Chart
-        fig, ax = plt.subplots(figsize=(8, 4))
-        ax.bar(df["Species"], df["Count"], color="forestgreen")
-        ax.set_title("Species Abundance")
-        ax.set_xlabel("Species")
-        ax.set_ylabel("Count")
-        plt.xticks(rotation=30)
-        st.pyplot(fig)
-
-        # PNG Export
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png")
-        st.download_button("📥 Download Chart as PNG", buf.getvalue(), file_name="biodiversity_chart.png")
+        # Plotting Chart (rendered once; the same PNG feeds the page and the download)
+        def build():
+            fig, ax = plt.subplots(figsize=(8, 4))
+            ax.bar(df["Species"], df["Count"], color="forestgreen")
+            ax.set_title("Species Abundance")
+            ax.set_xlabel("Species")
+            ax.set_ylabel("Count")
+            ax.tick_params(axis="x", rotation=30)
+            return fig
+
+        show_figure(make_key("biodiversity_chart", df_key), build, file_name="biodiversity_chart.png")
 
         # CSV Export
         csv_buf = io.StringIO()
         df[["Species", "Count"]].to_csv(csv_buf, index=False)
         st.download_button("📄 Download Table as CSV", csv_buf.getvalue(), file_name="biodiversity_data.csv")
 
+        show_rarefaction(df[["Species", "Count"]], df_key, single=True)
+
     except Exception as e:
         st.error(f"⚠️ Calculation error: {e}")
@@ -0,0 +1,390 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Module-level state survives Streamlit reruns (the script re-executes, imported modules don't),
+# so every session on the server shares these caches.
+DEFAULT_MAX_ENTRIES = 32
+SCRATCH_DIR = os.path.join(tempfile.gettempdir(), "ecogeo_lab")
+UPLOAD_CACHE_DIR = os.path.join(SCRATCH_DIR, "uploads")
+UPLOAD_CACHE_MAX_BYTES = 1024 ** 3  # total size of the on-disk upload cache before LRU eviction
+UPLOAD_MEMORY_MAX_BYTES = 256 * 1024 ** 2  # parsed uploads kept in process memory; the rest reload from disk
+DATA_DIR_ENV = "ECOGEO_DATA_DIR"  # the only directory server-side file paths may point into
+
+# Feather needs pyarrow; without it uploads are cached as one .npy file per column
+try:
+    import pyarrow  # noqa: F401
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+_MISSING = object()
+
+
+def value_nbytes(value):
+    # Approximate in-memory size of a cached value (bytes, arrays, frames and containers of them)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, np.ndarray):
+        return 0 if isinstance(value, np.memmap) else value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(index=True, deep=True)))
+    if isinstance(value, dict):
+        return sum(value_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(value_nbytes(v) for v in value)
+    return 0
+
+
+class LRUCache:
+    # Bounded by entry count and, when max_bytes is set, by the total size of the cached values
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = value_nbytes(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # larger than the whole budget: evicting everything else would not make room
+        with self._lock:
+            self.nbytes += size - self._sizes.get(key, 0)
+            self._sizes[key] = size
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries or (self.max_bytes is not None and self.nbytes > self.max_bytes):
+                old, _ = self._data.popitem(last=False)
+                self.nbytes -= self._sizes.pop(old)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.nbytes = 0
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "Entries": len(self._data),
+            "Max Entries": self.max_entries,
+            "Size (MB)": self.nbytes / 1e6 if self.max_bytes is not None else np.nan,
+            "Max MB": self.max_bytes / 1e6 if self.max_bytes is not None else np.nan,
+            "Hits": self.hits,
+            "Misses": self.misses,
+            "Evictions": self.evictions,
+            "Hit Rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(namespace, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=None):
+    with _caches_lock:
+        if namespace not in _caches:
+            _caches[namespace] = LRUCache(max_entries, max_bytes)
+        return _caches[namespace]
+
+
+# --- Content hashing ---
+
+def hash_bytes(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def hash_array(arr):
+    arr = np.ascontiguousarray(arr)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{arr.dtype.str}{arr.shape}".encode())
+    h.update(arr.view(np.uint8).ravel() if arr.dtype != object else repr(arr.tolist()).encode())
+    return h.hexdigest()
+
+
+def hash_frame(df):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def make_key(*parts):
+    return hash_bytes(repr(parts).encode())
+
+
+def hash_file_identity(path):
+    # Cheap identity for large server-side files: path, size and modification time
+    stat = os.stat(path)
+    return make_key(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def scratch_path(name):
+    # On-disk location for large intermediate results (memory-mapped rasters, exports, ...)
+    os.makedirs(SCRATCH_DIR, exist_ok=True)
+    return os.path.join(SCRATCH_DIR, name)
+
+
+# --- Server-side data files ---
+# Path inputs are opt-in: without ECOGEO_DATA_DIR they are disabled, and with it every path is
+# resolved (symlinks included) and must stay inside that directory.
+
+def data_dir():
+    root = os.environ.get(DATA_DIR_ENV, "").strip()
+    return os.path.realpath(root) if root else None
+
+
+def resolve_data_path(path, extensions=None):
+    root = data_dir()
+    if root is None:
+        raise PermissionError(f"Server file paths are disabled; set {DATA_DIR_ENV} to a data directory to enable them.")
+    full = os.path.realpath(os.path.join(root, os.path.expanduser(path.strip())))
+    if os.path.commonpath([root, full]) != root:
+        raise PermissionError(f"Only files inside {root} can be opened.")
+    if extensions and not full.lower().endswith(tuple(extensions)):
+        raise PermissionError(f"Only {', '.join(extensions)} files can be opened.")
+    if not os.path.isfile(full):
+        raise FileNotFoundError(f"File not found: {path}")
+    return full
+
+
+def data_path_input(label, key, extensions=None):
+    # Text box for a file under the data directory; returns the resolved path or None
+    root = data_dir()
+    if root is None:
+        st.info(f"📁 Server file paths are disabled. Set `{DATA_DIR_ENV}` on the server to a data directory to enable them.")
+        return None
+    path = st.text_input(f"{label} — relative to {root}", key=key)
+    if not path:
+        st.info("Enter a file path to continue.")
+        return None
+    try:
+        return resolve_data_path(path, extensions)
+    except (PermissionError, FileNotFoundError) as e:
+        st.error(f"❌ {e}")
+        return None
+
+
+# --- Memoization ---
+
+def memoize(namespace, key, compute, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=None):
+    # Return the cached value for key, running compute() only on a miss
+    cache = get_cache(namespace, max_entries, max_bytes)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = compute()
+        cache.put(key, value)
+    return value
+
+
+def _parse_upload(data, name, read_kwargs):
+    if name.lower().endswith((".xlsx", ".xls")):
+        return pd.read_excel(io.BytesIO(data), **read_kwargs)
+    return pd.read_csv(io.BytesIO(data), **read_kwargs)
+
+
+def upload_key(uploaded_file):
+    return hash_bytes(uploaded_file.getvalue())
+
+
+# --- Columnar upload cache ---
+# Each parsed upload is stored once under UPLOAD_CACHE_DIR/<key>/ as data.feather (pyarrow) or
+# col_<i>.npy files, plus meta.json with columns, dtypes and timings. The directory mtime marks
+# last use for LRU eviction. The scratch directory is shared, so nothing is ever pickled: object
+# columns are stored as fixed-width strings with a missing-value mask, and uploads whose object
+# columns hold anything but strings are simply not cached on disk.
+
+_upload_timings = {}
+_upload_lock = threading.Lock()
+
+
+def _entry_dir(key):
+    return os.path.join(UPLOAD_CACHE_DIR, key)
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def _write_columns(df, path):
+    # Feather for string-named, default-indexed frames when pyarrow is present; .npy per column otherwise
+    plain = isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1
+    if HAS_ARROW and plain and all(isinstance(c, str) for c in df.columns) and df.columns.is_unique:
+        try:
+            df.to_feather(os.path.join(path, "data.feather"))
+            return "feather"
+        except Exception:
+            pass  # e.g. mixed-type object columns; fall back to .npy
+    for i, column in enumerate(df.columns):
+        values = df[column].to_numpy()
+        if values.dtype == object:
+            missing = pd.isna(values)
+            if not all(isinstance(v, str) for v in values[~missing]):
+                raise ValueError(f"column {column!r} holds non-string objects")
+            np.save(os.path.join(path, f"col_{i}_na.npy"), missing, allow_pickle=False)
+            values = np.where(missing, "", values).astype(str)
+        np.save(os.path.join(path, f"col_{i}.npy"), values, allow_pickle=False)
+    return "npy"
+
+
+def _read_columns(path, meta):
+    if meta["format"] == "feather":
+        return pd.read_feather(os.path.join(path, "data.feather"))
+    columns = {}
+    for i, (column, dtype) in enumerate(zip(meta["columns"], meta["dtypes"])):
+        values = np.load(os.path.join(path, f"col_{i}.npy"), allow_pickle=False)
+        if values.dtype.kind == "U":  # text column written with its missing-value mask
+            values = values.astype(object)
+            values[np.load(os.path.join(path, f"col_{i}_na.npy"), allow_pickle=False)] = np.nan
+        series = pd.Series(values, copy=False)
+        columns[i] = series if str(series.dtype) == dtype else series.astype(dtype)
+    df = pd.DataFrame(columns)
+    df.columns = pd.Index(meta["columns"], tupleize_cols=False)
+    return df
+
+
+def _evict_uploads(keep=None, max_bytes=UPLOAD_CACHE_MAX_BYTES):
+    # Drop least recently used entries until the cache fits in max_bytes
+    if not os.path.isdir(UPLOAD_CACHE_DIR):
+        return
+    entries = []
+    for name in os.listdir(UPLOAD_CACHE_DIR):
+        path = _entry_dir(name)
+        if os.path.isdir(path):
+            entries.append((os.path.getmtime(path), _dir_size(path), name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        if name != keep:
+            shutil.rmtree(_entry_dir(name), ignore_errors=True)
+            total -= size
+
+
+def load_cached_upload(key, data, name, read_kwargs):
+    # Columnar disk cache in front of the CSV/Excel parser; records parse vs. cache-load timings
+    path = _entry_dir(key)
+    meta_path = os.path.join(path, "meta.json")
+    if os.path.exists(meta_path):
+        try:
+            start = time.perf_counter()
+            with open(meta_path) as f:
+                meta = json.load(f)
+            df = _read_columns(path, meta)
+            os.utime(path)
+            with _upload_lock:
+                timing = _upload_timings.setdefault(key, dict(meta["timing"]))
+                timing["Cache Load (s)"] = time.perf_counter() - start
+            return df
+        except Exception:
+            shutil.rmtree(path, ignore_errors=True)  # unreadable entry: rebuild it
+
+    start = time.perf_counter()
+    df = _parse_upload(data, name, read_kwargs)
+    parse_seconds = time.perf_counter() - start
+
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        os.makedirs(tmp, exist_ok=True)
+        fmt = _write_columns(df, tmp)
+        timing = {"File": name, "Rows": len(df), "Columns": df.shape[1], "Format": fmt,
+                  "Parse (s)": parse_seconds, "Cache Size (MB)": _dir_size(tmp) / 1e6}
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({"format": fmt, "columns": [c if isinstance(c, (int, float)) else str(c) for c in df.columns],
+                       "dtypes": [str(t) for t in df.dtypes], "timing": timing}, f)
+        os.replace(tmp, path)
+        with _upload_lock:
+            _upload_timings[key] = dict(timing)
+        _evict_uploads(keep=key)
+    except (OSError, ValueError):
+        # another process got there first, the disk is full, or a column can't be stored without pickle
+        shutil.rmtree(tmp, ignore_errors=True)
+    return df
+
+
+def read_upload(uploaded_file, **read_kwargs):
+    # Parse a CSV/Excel upload once per content hash; later reruns and other modules load the
+    # columnar disk copy (or the in-memory one). Callers get their own copy. The key is the content
+    # and the parser options only, so the same file uploaded under another name is a hit.
+    data = uploaded_file.getvalue()
+    key = make_key(hash_bytes(data), sorted(read_kwargs.items()))
+    df = memoize("uploads", key, lambda: load_cached_upload(key, data, uploaded_file.name, read_kwargs),
+                 max_bytes=UPLOAD_MEMORY_MAX_BYTES)
+    return df.copy()
+
+
+def upload_cache_report():
+    # One row per upload seen by this server process: parse time vs. columnar cache load time
+    with _upload_lock:
+        rows = [dict(timing) for timing in _upload_timings.values()]
+    report = pd.DataFrame(rows, columns=["File", "Rows", "Columns", "Format", "Parse (s)", "Cache Load (s)", "Cache Size (MB)"])
+    report["Speed-up"] = report["Parse (s)"] / report["Cache Load (s)"]
+    return report
+
+
+# --- Diagnostics ---
+
+def cache_stats():
+    with _caches_lock:
+        items = list(_caches.items())
+    rows = [dict(Cache=name, **cache.stats()) for name, cache in sorted(items)]
+    return pd.DataFrame(rows)
+
+
+def show_cache_diagnostics():
+    with st.expander("🧰 Cache Diagnostics", expanded=False):
+        stats = cache_stats()
+        if stats.empty:
+            st.caption("No cached results yet.")
+        else:
+            st.dataframe(stats.style.format({"Hit Rate": "{:.0%}", "Size (MB)": "{:.1f}", "Max MB": "{:.0f}"}, na_rep="-"),
+                         use_container_width=True, hide_index=True)
+
+        report = upload_cache_report()
+        if not report.empty:
+            on_disk = _dir_size(UPLOAD_CACHE_DIR) if os.path.isdir(UPLOAD_CACHE_DIR) else 0
+            st.caption(f"Upload cache: {on_disk / 1e6:,.1f} of {UPLOAD_CACHE_MAX_BYTES / 1e6:,.0f} MB on disk "
+                       f"({'Feather' if HAS_ARROW else '.npy columns'})")
+            st.dataframe(report.style.format({"Parse (s)": "{:.3f}", "Cache Load (s)": "{:.3f}", "Cache Size (MB)": "{:.2f}",
+                                              "Speed-up": "{:.1f}x"}, na_rep="-"),
+                         use_container_width=True, hide_index=True)
+
+        if st.button("🧹 Clear Caches", key="clear_caches"):
+            with _caches_lock:
+                for cache in _caches.values():
+                    cache.clear()
+            shutil.rmtree(UPLOAD_CACHE_DIR, ignore_errors=True)
+            with _upload_lock:
+                _upload_timings.clear()
+            st.rerun()
@@ -3,7 +3,675 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import io
+import os
+import json
+import math
 import random
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from cache_utils import data_dir, data_path_input, hash_array, hash_bytes, hash_file_identity, make_key, memoize, read_upload, scratch_path
+from plot_utils import show_figure
+
+NDWI_TILE = 1024  # block edge (pixels) for tiled NDWI; peak memory is a few float32 tiles
+PREVIEW_PIXELS = 1000  # longest edge of the on-page NDWI preview
+BINARY_BAND_TYPES = ["npy", "raw", "bin", "dat"]
+EXPORT_BLOCK_ROWS = 256  # rows per block when streaming exports
+MAX_DOWNLOAD_BYTES = 200 * 1024 * 1024  # larger exports are served from their server path
+TILED_MAGIC = b"NDWT"
+WATER_THRESHOLD = 0.0  # NDWI above this is treated as water
+STACK_MEMORY_BUDGET = 64 * 1024 * 1024  # bytes of block buffers for multi-date stacks
+CHANGE_CLASSES = ["No Water", "Permanent Water", "Water Gain", "Water Loss", "Intermittent Water"]
+CHANGE_COLORS = ["#f0e6d2", "#08519c", "#31a354", "#de2d26", "#9ecae1"]
+
+def _sidecar_path(path):
+    for candidate in (path + ".json", os.path.splitext(path)[0] + ".json"):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+def open_band(path, header=None, ndim=2):
+    # Memory-map a band: .npy directly, raw binary via a small JSON header sidecar
+    # ({"shape": [rows, cols], "dtype": "uint16", "offset": 0, "byteorder": "little"}).
+    if path.lower().endswith(".npy"):
+        band = np.load(path, mmap_mode="r")
+    else:
+        if header is None:
+            sidecar = _sidecar_path(path)
+            if sidecar is None:
+                raise ValueError(f"No JSON header found for raw band '{os.path.basename(path)}'.")
+            with open(sidecar) as f:
+                header = json.load(f)
+        dtype = np.dtype(header.get("dtype", "float32"))
+        if header.get("byteorder"):
+            dtype = dtype.newbyteorder("<" if header["byteorder"] == "little" else ">")
+        band = np.memmap(path, dtype=dtype, mode="r", offset=int(header.get("offset", 0)),
+                         shape=tuple(header["shape"]))
+    if band.ndim != ndim:
+        expected = "(rows, cols)" if ndim == 2 else "(time, rows, cols)"
+        raise ValueError(f"Band must be {ndim}-D {expected}, got shape {band.shape}.")
+    return band
+
+def compute_ndwi_tiled(green, nir, out=None, tile=NDWI_TILE):
+    # NDWI = (G - N) / (G + N) block by block in float32. Inputs may be memory-mapped;
+    # out may be None (in-memory result), an array, or a path for a memory-mapped .npy result.
+    if green.shape != nir.shape:
+        raise ValueError(f"Green {green.shape} and NIR {nir.shape} bands must have the same shape.")
+    rows, cols = green.shape
+    if out is None:
+        out = np.empty((rows, cols), dtype=np.float32)
+    elif isinstance(out, str):
+        out = np.lib.format.open_memmap(out, mode="w+", dtype=np.float32, shape=(rows, cols))
+
+    th, tw = min(tile, rows), min(tile, cols)
+    g_buf = np.empty((th, tw), dtype=np.float32)
+    n_buf = np.empty((th, tw), dtype=np.float32)
+    num_buf = np.empty((th, tw), dtype=np.float32)
+    den_buf = np.empty((th, tw), dtype=np.float32)
+
+    for r0 in range(0, rows, th):
+        h = min(th, rows - r0)
+        for c0 in range(0, cols, tw):
+            w = min(tw, cols - c0)
+            g, n, num, den = g_buf[:h, :w], n_buf[:h, :w], num_buf[:h, :w], den_buf[:h, :w]
+            g[...] = green[r0:r0 + h, c0:c0 + w]
+            n[...] = nir[r0:r0 + h, c0:c0 + w]
+            np.subtract(g, n, out=num)
+            np.add(g, n, out=den)
+            np.copyto(den, 0.0001, where=(den == 0))  # avoid division by zero
+            np.divide(num, den, out=out[r0:r0 + h, c0:c0 + w])
+
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
+
+def _save_upload(uploaded_file, suffix):
+    data = uploaded_file.getvalue()
+    path = scratch_path(f"band_{hash_bytes(data)}{suffix}")
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(data)
+    return path
+
+def binary_band_inputs(prefix="ndwi", kind="band"):
+    # Returns (green_path, nir_path, header) for binary bands, or None while inputs are incomplete
+    source = st.radio("Band Source:", ["📁 Server File Paths", "📤 Upload Files"], horizontal=True, key=f"{prefix}_binary_source")
+    header = None
+    if source == "📁 Server File Paths":
+        if data_dir() is None:
+            data_path_input(f"Green {kind} path", f"{prefix}_green_path")  # explains how to enable paths
+            return None
+        extensions = [f".{t}" for t in BINARY_BAND_TYPES]
+        green_path = data_path_input(f"Green {kind} path (.npy, or raw binary with a .json header next to it)", f"{prefix}_green_path", extensions)
+        nir_path = data_path_input(f"NIR {kind} path (.npy, or raw binary with a .json header next to it)", f"{prefix}_nir_path", extensions)
+        if green_path is None or nir_path is None:
+            return None
+    else:
+        green_file = st.file_uploader(f"📤 Upload Green {kind.title()}", type=BINARY_BAND_TYPES, key=f"{prefix}_green_bin")
+        nir_file = st.file_uploader(f"📤 Upload NIR {kind.title()}", type=BINARY_BAND_TYPES, key=f"{prefix}_nir_bin")
+        if not green_file or not nir_file:
+            st.warning(f"Upload both Green and NIR {kind}s to continue.")
+            return None
+        if not (green_file.name.lower().endswith(".npy") and nir_file.name.lower().endswith(".npy")):
+            header_file = st.file_uploader(f"📤 Upload JSON header for raw {kind}s (shape, dtype, offset)", type=["json"], key=f"{prefix}_header")
+            if not header_file:
+                st.warning(f"Raw {kind}s need a JSON header with their shape and dtype.")
+                return None
+            header = json.loads(header_file.getvalue())
+        green_path = _save_upload(green_file, os.path.splitext(green_file.name)[1])
+        nir_path = _save_upload(nir_file, os.path.splitext(nir_file.name)[1])
+    return green_path, nir_path, header
+
+def compute_ndwi_files(green_path, nir_path, header=None):
+    # Memory-mapped NDWI for a pair of band files; returns the path of the .npy result
+    key = make_key(hash_file_identity(green_path), hash_file_identity(nir_path), header)
+    out_path = scratch_path(f"ndwi_{key}.npy")
+
+    def compute():
+        if not os.path.exists(out_path):
+            compute_ndwi_tiled(open_band(green_path, header), open_band(nir_path, header), out=out_path + ".part")
+            os.replace(out_path + ".part", out_path)
+        return out_path
+
+    return memoize("ndwi", key, compute)
+
+def _decimate_2x(block, method):
+    # 2x2 block reduction; block has even height and width
+    h, w = block.shape[0] // 2, block.shape[1] // 2
+    quads = block.reshape(h, 2, w, 2)
+    if method == "mean":
+        return quads.mean(axis=(1, 3), dtype=np.float32)
+    # mode: most frequent of the four values (ties -> first in scan order)
+    values = quads.transpose(0, 2, 1, 3).reshape(h, w, 4)
+    counts = (values[..., :, None] == values[..., None, :]).sum(axis=-1)
+    return np.take_along_axis(values, counts.argmax(axis=-1)[..., None], axis=-1)[..., 0]
+
+def _overview_level(source, method, tile, out_path=None):
+    rows, cols = source.shape
+    shape = (math.ceil(rows / 2), math.ceil(cols / 2))
+    dtype = np.float32 if method == "mean" else source.dtype
+    if out_path is None:
+        out = np.empty(shape, dtype=dtype)
+    else:
+        out = np.lib.format.open_memmap(out_path + ".part", mode="w+", dtype=dtype, shape=shape)
+
+    step = 2 * tile
+    for r0 in range(0, rows, step):
+        for c0 in range(0, cols, step):
+            block = np.asarray(source[r0:r0 + step, c0:c0 + step])
+            pad = ((0, block.shape[0] % 2), (0, block.shape[1] % 2))
+            if any(p for _, p in pad):
+                block = np.pad(block, pad, mode="edge")
+            reduced = _decimate_2x(block, method)
+            out[r0 // 2:r0 // 2 + reduced.shape[0], c0 // 2:c0 // 2 + reduced.shape[1]] = reduced
+
+    if out_path is not None:
+        out.flush()
+        del out
+        os.replace(out_path + ".part", out_path)
+        return np.load(out_path, mmap_mode="r")
+    return out
+
+def build_pyramid(raster, method="mean", min_size=256, tile=NDWI_TILE, path_prefix=None):
+    # Overview levels halving the resolution each time, built tile by tile; level 0 is the raster.
+    # With path_prefix, levels are memory-mapped .npy files reused if they already exist.
+    levels = [raster]
+    while max(levels[-1].shape) > min_size:
+        level_path = f"{path_prefix}_ovr{len(levels)}.npy" if path_prefix else None
+        if level_path and os.path.exists(level_path):
+            levels.append(np.load(level_path, mmap_mode="r"))
+        else:
+            levels.append(_overview_level(levels[-1], method, tile, level_path))
+    return levels
+
+def ndwi_pyramid(ndwi, key, method="mean"):
+    # Cached alongside the NDWI result: next to the .npy for memory-mapped scenes, in memory otherwise
+    if isinstance(ndwi, np.memmap):
+        prefix = os.path.splitext(ndwi.filename)[0]
+        paths = memoize("ndwi_pyramid", make_key(key, method), lambda: [
+            level.filename for level in build_pyramid(ndwi, method, path_prefix=prefix)[1:]
+        ])
+        return [ndwi] + [np.load(p, mmap_mode="r") for p in paths]
+    return memoize("ndwi_pyramid", make_key(key, method), lambda: build_pyramid(ndwi, method))
+
+# --- Exports ---
+
+def export_npy(raster, path):
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=raster.dtype, shape=raster.shape)
+    for r0 in range(0, raster.shape[0], EXPORT_BLOCK_ROWS):
+        out[r0:r0 + EXPORT_BLOCK_ROWS] = raster[r0:r0 + EXPORT_BLOCK_ROWS]
+    out.flush()
+    del out
+
+def export_npz(raster, path):
+    # numpy streams arrays into the zip entry in buffered chunks, so memory-mapped input stays paged
+    np.savez_compressed(path, ndwi=raster)
+
+def export_tiled(raster, path, tile=NDWI_TILE):
+    # Layout: b"NDWT" | uint32 header length | JSON header | tiles, each row-major float32.
+    # The header lists [row, col, height, width, byte offset] per tile so readers can seek to one tile.
+    rows, cols = raster.shape
+    dtype = np.dtype(raster.dtype).newbyteorder("<")
+    tiles, offset = [], 0
+    for r0 in range(0, rows, tile):
+        for c0 in range(0, cols, tile):
+            h, w = min(tile, rows - r0), min(tile, cols - c0)
+            tiles.append([r0, c0, h, w, offset])
+            offset += h * w * dtype.itemsize
+    header = json.dumps({"shape": [rows, cols], "dtype": dtype.str, "tile": tile, "tiles": tiles}).encode()
+    data_start = len(TILED_MAGIC) + 4 + len(header)
+    with open(path, "wb") as f:
+        f.write(TILED_MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for r0, c0, h, w, tile_offset in tiles:
+            assert f.tell() == data_start + tile_offset
+            f.write(np.ascontiguousarray(raster[r0:r0 + h, c0:c0 + w], dtype=dtype).tobytes())
+
+def read_tiled_tile(path, index):
+    with open(path, "rb") as f:
+        if f.read(4) != TILED_MAGIC:
+            raise ValueError("Not a tiled NDWI file.")
+        (length,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length))
+        r0, c0, h, w, offset = header["tiles"][index]
+        f.seek(8 + length + offset)
+        return np.frombuffer(f.read(h * w * np.dtype(header["dtype"]).itemsize), dtype=header["dtype"]).reshape(h, w)
+
+def export_csv(raster, path, decimals=3):
+    # Formats and writes row blocks directly; no DataFrame or full text copy in memory
+    with open(path, "w", newline="") as f:
+        f.write(",".join(str(c) for c in range(raster.shape[1])) + "\n")
+        for r0 in range(0, raster.shape[0], EXPORT_BLOCK_ROWS):
+            np.savetxt(f, raster[r0:r0 + EXPORT_BLOCK_ROWS], fmt=f"%.{decimals}f", delimiter=",")
+
+EXPORT_FORMATS = {
+    "NumPy (.npy)": (export_npy, "npy"),
+    "Compressed NumPy (.npz)": (export_npz, "npz"),
+    "Tiled Binary (.ndwt)": (export_tiled, "ndwt"),
+    "CSV (streamed)": (export_csv, "csv"),
+}
+
+def estimate_export_bytes(raster, fmt):
+    values = raster.shape[0] * raster.shape[1]
+    if fmt == "CSV (streamed)":
+        return values * 7  # "-0.123," on average
+    if fmt == "Compressed NumPy (.npz)":
+        return None
+    return values * raster.dtype.itemsize
+
+def export_raster(raster, key, fmt):
+    # Returns (path, size in bytes, seconds); each format is exported once per result
+    writer, ext = EXPORT_FORMATS[fmt]
+    path = scratch_path(f"ndwi_{key}_export.{ext}")
+    partial = scratch_path(f"ndwi_{key}_export.part.{ext}")  # keeps the extension np.savez expects
+
+    def run():
+        start = time.perf_counter()
+        writer(raster, partial)
+        os.replace(partial, path)
+        return path, os.path.getsize(path), time.perf_counter() - start
+
+    return memoize("ndwi_export", make_key(key, fmt), run)
+
+def show_export_panel(ndwi, ndwi_key):
+    st.markdown("### 📦 Export NDWI Values")
+    fmt = st.selectbox("Export format", list(EXPORT_FORMATS), key="ndwi_export_format")
+    reports = st.session_state.setdefault("ndwi_exports", {}).setdefault(ndwi_key, {})
+    if st.button("⚙️ Prepare Export"):
+        with st.spinner(f"Writing {fmt}..."):
+            reports[fmt] = export_raster(ndwi, ndwi_key, fmt)
+
+    rows = []
+    for name in EXPORT_FORMATS:
+        if name in reports:
+            _, size, seconds = reports[name]
+            rows.append({"Format": name, "Size (MB)": size / 1e6, "Export Time (s)": seconds, "Status": "Ready"})
+        else:
+            estimate = estimate_export_bytes(ndwi, name)
+            rows.append({"Format": name, "Size (MB)": estimate / 1e6 if estimate else None,
+                         "Export Time (s)": None, "Status": "Estimate" if estimate else "—"})
+    st.dataframe(pd.DataFrame(rows).round(3), use_container_width=True, hide_index=True)
+
+    if fmt in reports:
+        path, size, _ = reports[fmt]
+        if size <= MAX_DOWNLOAD_BYTES and os.path.exists(path):
+            with open(path, "rb") as f:
+                st.download_button(f"📄 Download NDWI Values ({fmt})", f, file_name=f"ndwi_values.{EXPORT_FORMATS[fmt][1]}")
+        else:
+            st.info(f"💾 Export is {size / 1e6:.0f} MB; it is available on the server at `{path}`.")
+
+# --- Water body extraction (tiled connected-component labelling) ---
+
+def _open_raster(raster, mode="r"):
+    return np.load(raster, mmap_mode=mode) if isinstance(raster, str) else raster
+
+def _tile_grid(shape, tile):
+    rows, cols = shape
+    return [(r0, c0, min(tile, rows - r0), min(tile, cols - c0))
+            for r0 in range(0, rows, tile) for c0 in range(0, cols, tile)]
+
+def _label_tile(source, labels, r0, c0, h, w, threshold, connectivity):
+    # Label one tile with tile-local ids (1..n) and return its per-label stats and border strips
+    from scipy import ndimage  # only needed for water-body labelling
+    source, labels = _open_raster(source), _open_raster(labels, "r+")
+    mask = np.asarray(source[r0:r0 + h, c0:c0 + w]) > threshold
+    structure = np.ones((3, 3), dtype=bool) if connectivity == 8 else None
+    local, n = ndimage.label(mask, structure=structure)
+    local = local.astype(np.int32, copy=False)
+    labels[r0:r0 + h, c0:c0 + w] = local
+
+    rr, cc = np.nonzero(local)
+    ids = local[rr, cc]
+    counts = np.bincount(ids, minlength=n + 1)[1:]
+    row_min = np.full(n + 1, h, dtype=np.int64)
+    col_min = np.full(n + 1, w, dtype=np.int64)
+    row_max = np.full(n + 1, -1, dtype=np.int64)
+    col_max = np.full(n + 1, -1, dtype=np.int64)
+    np.minimum.at(row_min, ids, rr)
+    np.maximum.at(row_max, ids, rr)
+    np.minimum.at(col_min, ids, cc)
+    np.maximum.at(col_max, ids, cc)
+    bbox = np.stack([row_min[1:] + r0, row_max[1:] + r0, col_min[1:] + c0, col_max[1:] + c0], axis=1)
+
+    edges = {"top": local[0].copy(), "bottom": local[-1].copy(), "left": local[:, 0].copy(), "right": local[:, -1].copy()}
+    return n, counts, bbox, edges
+
+def _relabel_tile(labels, r0, c0, h, w, lut):
+    labels = _open_raster(labels, "r+")
+    labels[r0:r0 + h, c0:c0 + w] = lut[np.asarray(labels[r0:r0 + h, c0:c0 + w])]
+
+class UnionFind:
+    def __init__(self, size):
+        self.parent = np.arange(size, dtype=np.int64)
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+    def roots(self):
+        # Vectorized pointer jumping until every label points at its root
+        parent = self.parent
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                return parent
+            parent = jumped
+
+def _border_pairs(a, b, connectivity):
+    # Pairs of global labels touching across a tile border (a and b are facing edge strips)
+    pairs = [(a, b)]
+    if connectivity == 8:
+        pairs += [(a[:-1], b[1:]), (a[1:], b[:-1])]
+    out = []
+    for x, y in pairs:
+        touching = (x > 0) & (y > 0)
+        out.append(np.stack([x[touching], y[touching]], axis=1))
+    return out
+
+def _run_tiles(fn, jobs, workers):
+    if workers <= 1:
+        return [fn(*job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, *zip(*jobs)))
+
+def label_water_bodies(ndwi, threshold=WATER_THRESHOLD, connectivity=4, tile=NDWI_TILE, workers=1, labels_path=None):
+    # Threshold NDWI into a water mask and label connected water bodies tile by tile.
+    # Labels are merged across tile borders with a union-find; with workers > 1 tiles run in a
+    # process pool against memory-mapped files. Returns (per-body stats DataFrame, label raster).
+    rows, cols = ndwi.shape
+    if workers > 1 and not isinstance(ndwi, np.memmap):
+        source = scratch_path(f"ndwi_{hash_array(ndwi)}.npy")
+        if not os.path.exists(source):
+            np.save(source, ndwi)
+    else:
+        source = ndwi.filename if workers > 1 else ndwi
+
+    if workers > 1 and labels_path is None:
+        labels_path = scratch_path(f"labels_{make_key(source, threshold, connectivity)}.npy")
+    if labels_path is not None:
+        labels = np.lib.format.open_memmap(labels_path, mode="w+", dtype=np.int32, shape=(rows, cols))
+        target = labels_path if workers > 1 else labels
+    else:
+        labels = np.zeros((rows, cols), dtype=np.int32)
+        target = labels
+
+    grid = _tile_grid((rows, cols), tile)
+    results = _run_tiles(_label_tile, [(source, target, *cell, threshold, connectivity) for cell in grid], workers)
+
+    n_per_tile = np.array([r[0] for r in results], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(n_per_tile)[:-1]])
+    total = int(n_per_tile.sum())
+
+    # Merge labels that touch across tile borders
+    index = {(r0, c0): i for i, (r0, c0, _, _) in enumerate(grid)}
+    glob = lambda i, strip: np.where(strip > 0, strip + offsets[i], 0)
+    pairs = []
+    for i, (r0, c0, h, w) in enumerate(grid):
+        edges = results[i][3]
+        right = index.get((r0, c0 + w))
+        below = index.get((r0 + h, c0))
+        if right is not None:
+            pairs += _border_pairs(glob(i, edges["right"]), glob(right, results[right][3]["left"]), connectivity)
+        if below is not None:
+            pairs += _border_pairs(glob(i, edges["bottom"]), glob(below, results[below][3]["top"]), connectivity)
+        if connectivity == 8:
+            diag = index.get((r0 + h, c0 + w))
+            if diag is not None:
+                pairs += _border_pairs(glob(i, edges["bottom"][-1:]), glob(diag, results[diag][3]["top"][:1]), 4)
+            anti = index.get((r0 + h, c0 - tile))
+            if anti is not None:
+                j = anti
+                pairs += _border_pairs(glob(i, edges["bottom"][:1]), glob(j, results[j][3]["top"][-1:]), 4)
+
+    uf = UnionFind(total + 1)
+    if pairs:
+        for a, b in np.unique(np.concatenate(pairs), axis=0):
+            uf.union(a, b)
+    roots = uf.roots()
+    _, final = np.unique(roots[1:], return_inverse=True)
+    final = np.concatenate([[0], final + 1]).astype(np.int32)
+    n_bodies = int(final.max())
+
+    # Per-body stats
+    counts = np.concatenate([r[1] for r in results])
+    bbox = np.concatenate([r[2] for r in results])
+    body = final[1:] - 1
+    pixels = np.bincount(body, weights=counts, minlength=n_bodies).astype(np.int64)
+    row_min = np.full(n_bodies, rows, dtype=np.int64)
+    col_min = np.full(n_bodies, cols, dtype=np.int64)
+    row_max = np.zeros(n_bodies, dtype=np.int64)
+    col_max = np.zeros(n_bodies, dtype=np.int64)
+    np.minimum.at(row_min, body, bbox[:, 0].astype(np.int64))
+    np.maximum.at(row_max, body, bbox[:, 1].astype(np.int64))
+    np.minimum.at(col_min, body, bbox[:, 2].astype(np.int64))
+    np.maximum.at(col_max, body, bbox[:, 3].astype(np.int64))
+
+    # Rewrite tile-local ids as final body ids
+    jobs = []
+    for i, cell in enumerate(grid):
+        lut = np.concatenate([[0], final[offsets[i] + 1:offsets[i] + n_per_tile[i] + 1]]).astype(np.int32)
+        jobs.append((target, *cell, lut))
+    _run_tiles(_relabel_tile, jobs, workers)
+    if isinstance(labels, np.memmap):
+        labels.flush()
+        labels = np.load(labels_path, mmap_mode="r")
+
+    bodies = pd.DataFrame({
+        "Body ID": np.arange(1, n_bodies + 1),
+        "Pixels": pixels,
+        "Row Min": row_min, "Row Max": row_max,
+        "Col Min": col_min, "Col Max": col_max,
+    })
+    return bodies, labels
+
+def show_water_bodies(ndwi, ndwi_key):
+    st.markdown("### 💧 Water Body Extraction")
+    if not st.checkbox("Extract water bodies (threshold + connected components)", key="ndwi_water_bodies"):
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        threshold = st.slider("NDWI water threshold", -1.0, 1.0, WATER_THRESHOLD, 0.05)
+    with col2:
+        connectivity = st.radio("Connectivity", [4, 8], horizontal=True)
+    with col3:
+        pixel_size = st.number_input("Pixel size (m)", min_value=0.01, value=10.0)
+    with col4:
+        workers = st.number_input("Worker processes", min_value=1, max_value=os.cpu_count() or 1, value=os.cpu_count() or 1)
+
+    key = make_key(ndwi_key, threshold, connectivity)
+    large = ndwi.size > NDWI_TILE * NDWI_TILE
+    with st.spinner("Labelling water bodies tile by tile..."):
+        bodies, labels = memoize("water_bodies", key, lambda: label_water_bodies(
+            ndwi, threshold, connectivity, workers=int(workers) if large else 1,
+            labels_path=scratch_path(f"labels_{key}.npy") if isinstance(ndwi, np.memmap) else None
+        ))
+
+    bodies = bodies.copy()
+    bodies.insert(2, "Area (m²)", bodies["Pixels"] * pixel_size ** 2)
+    st.success(f"✅ {len(bodies):,} water bodies · total area {bodies['Area (m²)'].sum() / 1e6:.3f} km²")
+    st.dataframe(bodies.sort_values("Pixels", ascending=False).head(1000), use_container_width=True, hide_index=True)
+
+    csv_buf = io.StringIO()
+    bodies.to_csv(csv_buf, index=False)
+    st.download_button("📄 Download Water Bodies (CSV)", csv_buf.getvalue(), file_name="water_bodies.csv")
+
+    prefix = os.path.splitext(labels.filename)[0] if isinstance(labels, np.memmap) else None
+    levels = memoize("water_label_pyramid", key, lambda: build_pyramid(labels, method="mode", path_prefix=prefix))
+    preview, _ = read_window(levels, (0, labels.shape[0]), (0, labels.shape[1]), PREVIEW_PIXELS)
+
+    def build():
+        fig, ax = plt.subplots(figsize=(6, 5))
+        ax.imshow(np.ma.masked_equal(preview % 20 + (preview > 0), 0), cmap="tab20", interpolation="nearest",
+                  extent=(0, labels.shape[1], labels.shape[0], 0))
+        ax.set_title("Water Bodies")
+        return fig
+
+    show_figure(make_key("water_bodies", key), build, file_name="water_bodies.png", label="📥 Download Water Body Map (PNG)")
+
+    if isinstance(labels, np.memmap):
+        st.info(f"💾 Label raster (int32) is memory-mapped at `{labels.filename}`.")
+    else:
+        buf = io.BytesIO()
+        np.save(buf, labels)
+        st.download_button("📥 Download Label Raster (.npy)", buf.getvalue(), file_name="water_body_labels.npy")
+
+# --- Multi-date stacks ---
+
+def stack_tile_size(n_dates, budget=STACK_MEMORY_BUDGET):
+    # Square block edge so that the (time, h, w) float32 buffers fit in the memory budget
+    edge = int(math.sqrt(budget / (n_dates * 4 * 4)))
+    return max(32, min(NDWI_TILE, edge))
+
+def stack_change_detection(green, nir, threshold=WATER_THRESHOLD, out_prefix=None, ndwi_out=None, budget=STACK_MEMORY_BUDGET):
+    # green/nir: (time, rows, cols) cubes, typically memory-mapped. NDWI is computed for every
+    # date one spatial block at a time; water persistence, gain (dry on the first date, water on
+    # the last), loss and a change class are reduced along the time axis without Python loops
+    # over pixels or dates. Returns (persistence, change classes, water pixels per date, class counts).
+    if green.shape != nir.shape:
+        raise ValueError(f"Green {green.shape} and NIR {nir.shape} stacks must have the same shape.")
+    n_dates, rows, cols = green.shape
+    if n_dates < 2:
+        raise ValueError("A time stack needs at least two dates.")
+
+    if out_prefix is None:
+        persistence = np.empty((rows, cols), dtype=np.float32)
+        change = np.empty((rows, cols), dtype=np.uint8)
+    else:
+        persistence = np.lib.format.open_memmap(f"{out_prefix}_persistence.npy", mode="w+", dtype=np.float32, shape=(rows, cols))
+        change = np.lib.format.open_memmap(f"{out_prefix}_change.npy", mode="w+", dtype=np.uint8, shape=(rows, cols))
+    if isinstance(ndwi_out, str):
+        ndwi_out = np.lib.format.open_memmap(ndwi_out, mode="w+", dtype=np.float32, shape=green.shape)
+
+    tile = stack_tile_size(n_dates, budget)
+    shape = (n_dates, min(tile, rows), min(tile, cols))
+    g_buf = np.empty(shape, dtype=np.float32)
+    n_buf = np.empty(shape, dtype=np.float32)
+    den_buf = np.empty(shape, dtype=np.float32)
+    water_buf = np.empty(shape, dtype=bool)
+
+    water_pixels = np.zeros(n_dates, dtype=np.int64)
+    class_counts = np.zeros(len(CHANGE_CLASSES), dtype=np.int64)
+
+    for r0, c0, h, w in _tile_grid((rows, cols), tile):
+        g, n, den, water = (buf[:, :h, :w] for buf in (g_buf, n_buf, den_buf, water_buf))
+        g[...] = green[:, r0:r0 + h, c0:c0 + w]
+        n[...] = nir[:, r0:r0 + h, c0:c0 + w]
+        np.add(g, n, out=den)
+        np.copyto(den, 0.0001, where=(den == 0))
+        np.subtract(g, n, out=g)
+        ndwi = np.divide(g, den, out=g)
+        if ndwi_out is not None:
+            ndwi_out[:, r0:r0 + h, c0:c0 + w] = ndwi
+        np.greater(ndwi, threshold, out=water)
+
+        first, last = water[0], water[-1]
+        codes = np.select(
+            [water.all(axis=0), ~first & last, first & ~last, water.any(axis=0)],
+            [1, 2, 3, 4], default=0
+        ).astype(np.uint8)
+        persistence[r0:r0 + h, c0:c0 + w] = water.mean(axis=0, dtype=np.float32)
+        change[r0:r0 + h, c0:c0 + w] = codes
+        water_pixels += water.sum(axis=(1, 2))
+        class_counts += np.bincount(codes.ravel(), minlength=len(CHANGE_CLASSES))
+
+    for out in (persistence, change, ndwi_out):
+        if isinstance(out, np.memmap):
+            out.flush()
+    return persistence, change, water_pixels, class_counts
+
+def show_time_stack():
+    st.markdown("### 🗓️ Multi-Date NDWI Stack")
+    st.caption("Give Green and NIR cubes shaped (time, rows, cols), one layer per acquisition date.")
+    cubes = binary_band_inputs(prefix="stack", kind="cube")
+    if cubes is None:
+        return
+    green_path, nir_path, header = cubes
+
+    col1, col2 = st.columns(2)
+    with col1:
+        threshold = st.slider("NDWI water threshold", -1.0, 1.0, WATER_THRESHOLD, 0.05, key="stack_threshold")
+    with col2:
+        pixel_size = st.number_input("Pixel size (m)", min_value=0.01, value=10.0, key="stack_pixel_size")
+
+    try:
+        green, nir = open_band(green_path, header, ndim=3), open_band(nir_path, header, ndim=3)
+        key = make_key(hash_file_identity(green_path), hash_file_identity(nir_path), header, threshold)
+        prefix = scratch_path(f"stack_{key}")
+
+        def compute():
+            persistence, change, water_pixels, class_counts = stack_change_detection(green, nir, threshold, out_prefix=prefix)
+            return persistence.filename, change.filename, water_pixels, class_counts
+
+        with st.spinner(f"Computing NDWI for {green.shape[0]} dates block by block..."):
+            persistence_path, change_path, water_pixels, class_counts = memoize("ndwi_stack", key, compute)
+        persistence = np.load(persistence_path, mmap_mode="r")
+        change = np.load(change_path, mmap_mode="r")
+    except Exception as e:
+        st.error(f"⚠️ Stack processing failed: {e}")
+        return
+
+    n_dates = len(water_pixels)
+    dates = st.text_input("Date labels (comma-separated, optional)", key="stack_dates")
+    labels = [d.strip() for d in dates.split(",")] if dates else []
+    if len(labels) != n_dates:
+        labels = [f"Date {i + 1}" for i in range(n_dates)]
+
+    area = pd.DataFrame({"Date": labels, "Water Area (km²)": water_pixels * pixel_size ** 2 / 1e6})
+    st.markdown("#### 📈 Water Area per Date")
+    st.line_chart(area.set_index("Date"))
+
+    summary = pd.DataFrame({
+        "Change Class": CHANGE_CLASSES,
+        "Pixels": class_counts,
+        "Area (km²)": class_counts * pixel_size ** 2 / 1e6,
+    })
+    st.markdown("#### 🔁 Change Summary (first vs. last date)")
+    st.dataframe(summary.round(4), use_container_width=True, hide_index=True)
+
+    persistence_levels = ndwi_pyramid(persistence, persistence_path)
+    change_levels = memoize("ndwi_pyramid", make_key(change_path, "mode"), lambda: build_pyramid(
+        change, method="mode", path_prefix=os.path.splitext(change_path)[0]))
+    full = ((0, change.shape[0]), (0, change.shape[1]))
+
+    def build():
+        from matplotlib.colors import ListedColormap
+        from matplotlib.patches import Patch
+        fig, axes = plt.subplots(1, 2, figsize=(11, 5))
+        extent = (0, change.shape[1], change.shape[0], 0)
+        im = axes[0].imshow(read_window(persistence_levels, *full, PREVIEW_PIXELS)[0], cmap="Blues", vmin=0, vmax=1, extent=extent)
+        fig.colorbar(im, ax=axes[0], label="Fraction of dates with water")
+        axes[0].set_title("Water Persistence")
+        axes[1].imshow(read_window(change_levels, *full, PREVIEW_PIXELS)[0], cmap=ListedColormap(CHANGE_COLORS),
+                       vmin=0, vmax=len(CHANGE_CLASSES) - 1, interpolation="nearest", extent=extent)
+        axes[1].legend(handles=[Patch(color=c, label=l) for c, l in zip(CHANGE_COLORS, CHANGE_CLASSES)],
+                       loc="lower right", fontsize=8)
+        axes[1].set_title("Water Change")
+        return fig
+
+    show_figure(make_key("ndwi_change", key), build, file_name="ndwi_change_maps.png", label="📥 Download Change Maps (PNG)")
+    st.info(f"💾 Persistence (float32) and change class (uint8) rasters are at `{persistence_path}` and `{change_path}`.")
+
+def read_window(levels, row_range, col_range, display_pixels):
+    # Window in full-resolution pixel coordinates, read from the coarsest adequate level
+    # so only the tiles under the window are touched.
+    (r0, r1), (c0, c1) = row_range, col_range
+    index = 0
+    while index + 1 < len(levels) and max(r1 - r0, c1 - c0) / 2 ** (index + 1) >= display_pixels:
+        index += 1
+    f = 2 ** index
+    window = np.asarray(levels[index][r0 // f:math.ceil(r1 / f), c0 // f:math.ceil(c1 / f)])
+    return window, index
 
 def coastal_ndwi_viewer():
     st.subheader("🌊 NDWI Viewer (Normalized Difference Water Index)")
@@ -26,13 +694,32 @@ def coastal_ndwi_viewer():
         - Tool calculates NDWI = (Green - NIR) / (Green + NIR)
         - Displays NDWI map + export options
 
+        #### 🛰️ Full Satellite Scenes:
+        - Choose `🛰️ Binary Bands` and give `.npy` bands, or raw binary bands with a JSON
+          header (`{"shape": [rows, cols], "dtype": "uint16", "offset": 0}`).
+        - Bands are memory-mapped and NDWI is computed tile by tile into a memory-mapped
+          float32 result, so a full Sentinel-2 tile never has to fit in memory.
+
+        - The preview is drawn from overview levels built once per result; zoom into a
+          window to read only the tiles under it.
+
+        #### 🗓️ Shoreline Monitoring:
+        - Choose `🗓️ Multi-Date Stack` with Green and NIR cubes shaped (time, rows, cols).
+        - Get water persistence, gain, loss and water area per date across all acquisitions.
+
+        #### 💧 Water Bodies:
+        - Tick **Extract water bodies** to threshold NDWI and list every connected water
+          body with its pixel count, area and bounding box, plus a label raster.
+
         #### 💡 Use For:
         - Water surface mapping
         - Flood analysis
         - Wetland or irrigation detection
         """)
 
-    input_method = st.radio("Select Input Method:", ["📤 Upload Green & NIR CSV", "✍️ Manual Entry"], key="ndwi_input_method")
+    ndwi = None
+    ndwi_key = None
+    input_method = st.radio("Select Input Method:", ["📤 Upload Green & NIR CSV", "🛰️ Binary Bands (.npy / raw)", "🗓️ Multi-Date Stack", "✍️ Manual Entry"], key="ndwi_input_method")
 
     default_green = pd.DataFrame(np.random.randint(50, 100, size=(5, 5)), columns=[f"C{i}" for i in range(1, 6)])
     default_nir = pd.DataFrame(np.random.randint(50, 100, size=(5, 5)), columns=[f"C{i}" for i in range(1, 6)])
@@ -71,6 +758,23 @@ def coastal_ndwi_viewer():
         green = st.session_state.ndwi_green.to_numpy().astype(float)
         nir = st.session_state.ndwi_nir.to_numpy().astype(float)
 
+    elif input_method == "🗓️ Multi-Date Stack":
+        show_time_stack()
+        return
+
+    elif input_method == "🛰️ Binary Bands (.npy / raw)":
+        bands = binary_band_inputs()
+        if bands is None:
+            return
+        try:
+            with st.spinner("Computing NDWI tile by tile..."):
+                ndwi_path = compute_ndwi_files(*bands)
+                ndwi = np.load(ndwi_path, mmap_mode="r")
+                ndwi_key = make_key(ndwi_path)  # the path itself cannot be embedded in scratch file names
+        except Exception as e:
+            st.error(f"❌ Error loading bands: {e}")
+            return
+
     else:
         green_file = st.file_uploader("📤 Upload Green Band CSV", type=["csv"], key="green_csv")
         nir_file = st.file_uploader("📤 Upload NIR Band CSV", type=["csv"], key="nir_csv")
@@ -80,33 +784,46 @@ def coastal_ndwi_viewer():
             return
 
         try:
-            green = pd.read_csv(green_file).to_numpy().astype(float)
-            nir = pd.read_csv(nir_file).to_numpy().astype(float)
+            green = read_upload(green_file).to_numpy().astype(float)
+            nir = read_upload(nir_file).to_numpy().astype(float)
         except Exception as e:
             st.error(f"❌ Error loading files: {e}")
             return
 
     # NDWI Calculation
     try:
-        denominator = (green + nir)
-        denominator[denominator == 0] = 0.0001  # avoid division by zero
-        ndwi = (green - nir) / denominator
+        if ndwi is None:
+            ndwi_key = make_key(hash_array(green), hash_array(nir))
+            ndwi = memoize("ndwi", ndwi_key, lambda: compute_ndwi_tiled(green, nir))
+        levels = ndwi_pyramid(ndwi, ndwi_key)
+        rows, cols = ndwi.shape
 
         st.markdown("### 🖼️ NDWI Map Preview")
-        fig, ax = plt.subplots(figsize=(6, 5))
-        cax = ax.imshow(ndwi, cmap="BrBG", vmin=-1, vmax=1)
-        fig.colorbar(cax, ax=ax, label="NDWI Value")
-        ax.set_title("NDWI Map")
-        st.pyplot(fig)
+        display_pixels = st.select_slider("Preview resolution (pixels)", [256, 512, 1000, 2000], value=PREVIEW_PIXELS)
+        row_range, col_range = (0, rows), (0, cols)
+        if max(rows, cols) > 1 and st.checkbox("🔍 Zoom into a window"):
+            row_range = st.slider("Rows", 0, rows, (0, rows))
+            col_range = st.slider("Columns", 0, cols, (0, cols))
+        if row_range[1] <= row_range[0] or col_range[1] <= col_range[0]:
+            st.warning("Select a non-empty window.")
+            return
+        preview, level = read_window(levels, row_range, col_range, display_pixels)
+        if level:
+            st.caption(f"Overview level {level} (1:{2 ** level}) — {preview.shape[0]}×{preview.shape[1]} of a {rows}×{cols} raster.")
 
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png")
-        st.download_button("📥 Download NDWI Map (PNG)", buf.getvalue(), file_name="ndwi_map.png")
+        def build():
+            fig, ax = plt.subplots(figsize=(6, 5))
+            cax = ax.imshow(preview, cmap="BrBG", vmin=-1, vmax=1,
+                            extent=(col_range[0], col_range[1], row_range[1], row_range[0]))
+            fig.colorbar(cax, ax=ax, label="NDWI Value")
+            ax.set_title("NDWI Map")
+            return fig
+
+        show_figure(make_key("ndwi_map", ndwi_key, level, row_range, col_range), build, file_name="ndwi_map.png",
+                    label="📥 Download NDWI Map (PNG)")
 
-        ndwi_df = pd.DataFrame(ndwi.round(3))
-        csv_buf = io.StringIO()
-        ndwi_df.to_csv(csv_buf, index=False)
-        st.download_button("📄 Download NDWI Values (CSV)", csv_buf.getvalue(), file_name="ndwi_values.csv")
+        show_export_panel(ndwi, ndwi_key)
+        show_water_bodies(ndwi, ndwi_key)
 
     except Exception as e:
         st.error(f"⚠️ NDWI calculation failed: {e}")
@@ -1,9 +1,232 @@
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
+import numpy as np
 import io
+import os
 import random
 
+from cache_utils import data_path_input, hash_file_identity, hash_frame, make_key, memoize, read_upload
+from plot_utils import show_figure
+from stream_stats import (SUMMARY_CHUNK_ROWS, SUMMARY_QUANTILES, column_plan, read_excel_chunks, summarize_file,
+                          summary_table)
+
+PREVIEW_ROWS = 100
+LARGE_FILE_TYPES = [".csv", ".txt", ".xlsx", ".xlsm"]
+MAX_ROW_BARS = 50  # one bar per row only for small tables
+MAX_HIST_BINS = 200
+MAX_CATEGORY_BARS = 30
+LINE_BUCKETS = 1000
+BIN_RULES = ["auto", "fd", "sturges", "doane", "scott", "rice", "sqrt"]
+AGGREGATIONS = ["count", "sum", "mean"]
+
+# --- Binned charts: aggregate on the server so drawing cost depends on bins, not rows ---
+
+def _rule_bin_width(values, rule="auto"):
+    # numpy's bin-width estimators (see np.histogram_bin_edges), without building the edges:
+    # a narrow width over a wide range (e.g. "fd" with outliers) would allocate millions of them
+    n, ptp = len(values), np.ptp(values)
+    if rule == "sqrt":
+        return ptp / np.sqrt(n)
+    if rule == "sturges":
+        return ptp / (np.log2(n) + 1.0)
+    if rule == "rice":
+        return ptp / (2.0 * n ** (1.0 / 3))
+    if rule == "scott":
+        return (24.0 * np.pi ** 0.5 / n) ** (1.0 / 3.0) * np.std(values)
+    if rule == "doane":
+        sigma = np.std(values)
+        if n <= 2 or sigma == 0:
+            return 0.0
+        sg1 = np.sqrt(6.0 * (n - 2) / ((n + 1.0) * (n + 3)))
+        g1 = np.mean(((values - values.mean()) / sigma) ** 3)
+        return ptp / (1.0 + np.log2(n) + np.log2(1.0 + abs(g1) / sg1))
+    fd = 2.0 * np.subtract(*np.percentile(values, [75, 25])) * n ** (-1.0 / 3.0)
+    if rule == "fd":
+        return fd
+    # "auto": Freedman-Diaconis limited to half the sqrt width, or Sturges if that is narrower
+    return min(max(fd, ptp / np.sqrt(n) / 2), ptp / (np.log2(n) + 1.0))
+
+def histogram_bins(values, rule="auto"):
+    values = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return np.zeros(0), np.zeros(1)
+    lo, hi = values.min(), values.max()
+    if lo == hi:
+        lo, hi = lo - 0.5, hi + 0.5
+    # The bin count is capped before any edges exist
+    width = _rule_bin_width(values, rule)
+    bins = int(min(np.ceil((hi - lo) / width), MAX_HIST_BINS)) if width else 1
+    counts, edges = np.histogram(values, bins=np.linspace(lo, hi, bins + 1))
+    return counts, edges
+
+def grouped_totals(categories, values=None, agg="count", top=MAX_CATEGORY_BARS):
+    # Aggregate per category; categories beyond the top ones are pooled into "Other"
+    frame = pd.DataFrame({"key": categories.fillna("(missing)").astype(str),
+                          "value": 1.0 if values is None else pd.to_numeric(values, errors="coerce")})
+    grouped = frame.groupby("key")["value"].agg(["sum", "count"])
+    score = grouped["count"] if agg == "count" else grouped["sum"] if agg == "sum" else grouped["sum"] / grouped["count"]
+    order = score.sort_values(ascending=False).index
+    if len(order) > top:
+        rest = grouped.loc[order[top - 1:]].sum()
+        grouped = pd.concat([grouped.loc[order[:top - 1]], pd.DataFrame([rest], index=["Other"])])
+    if agg == "count":
+        return grouped["count"]
+    return grouped["sum"] if agg == "sum" else grouped["sum"] / grouped["count"].replace(0, np.nan)
+
+def minmax_decimate(y, x=None, buckets=LINE_BUCKETS):
+    # Keep the min and max of each of `buckets` equal-width runs of ordered data (in order), so
+    # peaks survive while at most 2 * buckets points are drawn
+    y = pd.to_numeric(y, errors="coerce").to_numpy(dtype=float)
+    x = np.arange(len(y)) if x is None else np.asarray(x)
+    if len(y) <= 2 * buckets:
+        return x, y
+    size = int(np.ceil(len(y) / buckets))
+    padded = np.full(size * int(np.ceil(len(y) / size)), np.nan)
+    padded[:len(y)] = y
+    blocks = padded.reshape(-1, size)
+    valid = ~np.isnan(blocks).all(axis=1)
+    starts = np.arange(len(blocks)) * size
+    lo = starts + np.argmin(np.where(np.isnan(blocks), np.inf, blocks), axis=1)
+    hi = starts + np.argmax(np.where(np.isnan(blocks), -np.inf, blocks), axis=1)
+    keep = np.sort(np.concatenate([lo[valid], hi[valid]]))
+    keep = keep[np.concatenate([[True], keep[1:] != keep[:-1]])]
+    return x[keep], y[keep]
+
+def quick_chart(df, df_key):
+    st.markdown("### 📊 Quick Chart")
+    numeric_cols = df.select_dtypes(include='number').columns.tolist()
+    if not numeric_cols:
+        st.info("No numeric columns to chart.")
+        return
+
+    modes = ["📊 Histogram", "📦 Grouped Bar", "📈 Line (min/max decimated)"]
+    if len(df) <= MAX_ROW_BARS:
+        modes.insert(0, "📊 Bar per Row")
+    mode = st.radio("Chart type", modes, horizontal=True, key="general_chart_mode")
+
+    # Each chart type picks its data (binned on the server) and a draw function; the figure is
+    # rendered once per data + settings and the same PNG feeds the page and the download
+    if mode == "📊 Bar per Row":
+        col_to_plot = st.selectbox("Select Column to Plot", numeric_cols)
+        settings = ("rows", col_to_plot)
+
+        def draw(ax):
+            df[col_to_plot].plot(kind="bar", ax=ax, color="cornflowerblue")
+            ax.set_title(f"{col_to_plot} Chart")
+
+    elif mode == "📊 Histogram":
+        col1, col2 = st.columns(2)
+        col_to_plot = col1.selectbox("Select Column to Plot", numeric_cols)
+        rule = col2.selectbox("Bin rule", BIN_RULES, key="general_bin_rule")
+        settings = ("hist", col_to_plot, rule)
+        counts, edges = memoize("general_chart", make_key(df_key, *settings), lambda: histogram_bins(df[col_to_plot], rule))
+
+        def draw(ax):
+            ax.bar(edges[:-1], counts, width=np.diff(edges), align="edge", color="cornflowerblue", edgecolor="white")
+            ax.set_title(f"{col_to_plot} Histogram ({len(counts)} bins, {rule})")
+            ax.set_xlabel(col_to_plot)
+            ax.set_ylabel("Count")
+
+    elif mode == "📦 Grouped Bar":
+        col1, col2, col3 = st.columns(3)
+        category = col1.selectbox("Category column", df.columns.tolist(), key="general_category")
+        agg = col2.selectbox("Aggregation", AGGREGATIONS, key="general_agg")
+        value = col3.selectbox("Value column", numeric_cols, key="general_value", disabled=agg == "count")
+        settings = ("bar", category, agg, None if agg == "count" else value)
+        totals = memoize("general_chart", make_key(df_key, *settings),
+                         lambda: grouped_totals(df[category], None if agg == "count" else df[value], agg))
+
+        def draw(ax):
+            ax.bar(totals.index.astype(str), totals.to_numpy(), color="cornflowerblue")
+            ax.set_title(f"{'Rows' if agg == 'count' else f'{agg.title()} of {value}'} by {category}")
+            ax.tick_params(axis="x", rotation=45)
+            for label in ax.get_xticklabels():
+                label.set_horizontalalignment("right")
+
+    else:
+        col1, col2 = st.columns(2)
+        col_to_plot = col1.selectbox("Select Column to Plot", numeric_cols)
+        order_by = col2.selectbox("Order by", ["(row order)"] + [c for c in df.columns if c != col_to_plot], key="general_order_by")
+        settings = ("line", col_to_plot, order_by)
+
+        def decimate():
+            data = df if order_by == "(row order)" else df.sort_values(order_by, kind="stable")
+            x = None if order_by == "(row order)" else data[order_by].to_numpy()
+            return minmax_decimate(data[col_to_plot], x)
+
+        x, y = memoize("general_chart", make_key(df_key, *settings), decimate)
+
+        def draw(ax):
+            ax.plot(x, y, color="cornflowerblue", lw=1)
+            ax.set_title(f"{col_to_plot}" + (f" ({len(y):,} of {len(df):,} points)" if len(y) < len(df) else ""))
+            ax.set_xlabel("Row" if order_by == "(row order)" else order_by)
+
+    def build():
+        fig, ax = plt.subplots(figsize=(6, 4))
+        draw(ax)
+        fig.tight_layout()
+        return fig
+
+    show_figure(make_key("general_chart", df_key, *settings), build, file_name="chart.png")
+
+def frame_summary(df):
+    # Exact statistics for a table already in memory, in the same layout as the streamed summary
+    rows = {}
+    plan = column_plan(df)
+    for column in df.columns:
+        series = df[column]
+        row = {"count": int(series.notna().sum()), "missing": int(series.isna().sum()), "distinct": int(series.nunique())}
+        if plan[str(column)]:
+            values = series.dropna().astype(float)
+            row.update({"mean": values.mean(), "std": values.std(), "min": values.min()})
+            row.update({f"{q:.0%}": values.quantile(q) for q in SUMMARY_QUANTILES})
+            row["max"] = values.max()
+        rows[str(column)] = row
+    order = ["count", "missing", "distinct", "mean", "std", "min"] + [f"{q:.0%}" for q in SUMMARY_QUANTILES] + ["max"]
+    table = pd.DataFrame(rows)
+    return table.reindex([r for r in order if r in table.index])
+
+def show_summary(table, estimated=False):
+    st.markdown("### 📈 Data Summary")
+    st.dataframe(table.style.format(precision=4, na_rep="-"), use_container_width=True)
+    if estimated:
+        st.caption("Quantiles are sketch estimates (±1% relative); distinct counts are HyperLogLog estimates.")
+
+def large_file_summary():
+    # Server-side file summarised in one streamed pass; never loaded whole
+    path = data_path_input("File path on the server (.csv or .xlsx)", "general_large_path", LARGE_FILE_TYPES)
+    if path is None:
+        return
+
+    col1, col2 = st.columns(2)
+    with col1:
+        chunk_rows = st.number_input("Rows per chunk", min_value=10_000, max_value=2_000_000, value=SUMMARY_CHUNK_ROWS,
+                                     step=50_000, key="general_chunk_rows")
+    with col2:
+        workers = st.number_input("Worker processes (CSV)", min_value=1, max_value=os.cpu_count() or 1,
+                                  value=os.cpu_count() or 1, key="general_workers")
+
+    try:
+        if path.lower().endswith((".xlsx", ".xlsm")):
+            chunks = read_excel_chunks(path, PREVIEW_ROWS)
+            try:
+                preview = next(chunks, pd.DataFrame())
+            finally:
+                chunks.close()  # closes the workbook now rather than at garbage collection
+        else:
+            preview = pd.read_csv(path, nrows=PREVIEW_ROWS)
+        st.write(f"📄 First {len(preview)} rows", preview)
+
+        with st.spinner(f"Streaming {os.path.getsize(path) / 1e6:,.0f} MB..."):
+            table = memoize("general_summary", hash_file_identity(path),
+                            lambda: summary_table(summarize_file(path, int(chunk_rows), int(workers))))
+    except Exception as e:
+        st.error(f"❌ Error reading file: {e}")
+        return
+    show_summary(table, estimated=True)
+
 def general_data_tools():
     st.subheader("📊 General Data Tools")
 
@@ -42,7 +265,8 @@ def general_data_tools():
 
         #### 🎁 Features
         - Auto summary of numbers ✅  
-        - Charts 📊  
+        - Multi-GB CSV/Excel files summarised in one streamed pass (`📁 Large File`, files under the server's `ECOGEO_DATA_DIR`) 🚀  
+        - Charts 📊 (histogram, grouped bar, decimated line — fast on 100k+ rows)  
         - Export CSV and PNG 📥  
         - Clear with one click 🧹  
 
@@ -51,7 +275,12 @@ def general_data_tools():
         """)
 
     # --- Input Method ---
-    input_method = st.radio("Choose Data Input Method:", ["📤 Upload CSV/Excel", "✍️ Manual Entry"], key="general_input_method")
+    input_method = st.radio("Choose Data Input Method:", ["📤 Upload CSV/Excel", "📁 Large File (server path)", "✍️ Manual Entry"],
+                            key="general_input_method")
+
+    if input_method == "📁 Large File (server path)":
+        large_file_summary()
+        return
 
     # Default manual table
     default_df = pd.DataFrame({
@@ -90,10 +319,7 @@ def general_data_tools():
 
         if file:
             try:
-                if file.name.endswith('.csv'):
-                    df = pd.read_csv(file)
-                else:
-                    df = pd.read_excel(file)
+                df = read_upload(file)
                 st.write("📄 Uploaded Data", df)
 
                 if st.button("🧹 Clear Uploaded File"):
@@ -107,25 +333,15 @@ def general_data_tools():
             st.info("Upload a file to proceed.")
             return
 
-    # Data Summary
-    st.markdown("### 📈 Data Summary")
-    st.write(df.describe(include='all').fillna("-"))
-
-    # Chart for numeric columns
-    numeric_cols = df.select_dtypes(include='number').columns.tolist()
-
-    if numeric_cols:
-        st.markdown("### 📊 Quick Chart")
-        col_to_plot = st.selectbox("Select Column to Plot", numeric_cols)
-
-        fig, ax = plt.subplots(figsize=(6, 4))
-        df[col_to_plot].plot(kind="bar", ax=ax, color="cornflowerblue")
-        ax.set_title(f"{col_to_plot} Chart")
-        st.pyplot(fig)
+    # Data Summary: exact for tables in memory (sketches are only for streamed large files)
+    df_key = hash_frame(df)
+    show_summary(memoize("general_summary", df_key, lambda: frame_summary(df)))
 
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png")
-        st.download_button("📥 Download Chart as PNG", buf.getvalue(), file_name="chart.png")
+    # Charts are binned server-side and cached per column
+    try:
+        quick_chart(df, df_key)
+    except Exception as e:
+        st.error(f"❌ Chart Error: {e}")
 
     # Download Table
     csv_buf = io.StringIO()
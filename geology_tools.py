@@ -5,6 +5,131 @@ import matplotlib.pyplot as plt
 import io
 import random
 
+from cache_utils import hash_frame, make_key, memoize, read_upload
+from plot_utils import show_figure
+
+# Folk & Ward graphic percentiles (phi), searched for every sample at once
+FW_PERCENTILES = np.array([5, 16, 25, 50, 75, 84, 95], dtype=float)
+
+SAMPLE_ALIASES = ["sample_id", "sample id", "sample", "station"]
+SIZE_ALIASES = ["size_mm", "grain size (mm)", "size (mm)", "grain size"]
+WEIGHT_ALIASES = ["weight", "weight (%)", "weight_pct", "% retained"]
+
+def _find_column(df, aliases):
+    lookup = {str(c).strip().lower(): c for c in df.columns}
+    for alias in aliases:
+        if alias in lookup:
+            return lookup[alias]
+    return None
+
+def batch_phi_percentiles(phi, cumulative, percentiles=FW_PERCENTILES):
+    # phi: (n_sizes,) ascending; cumulative: (n_samples, n_sizes) non-decreasing %.
+    # Same result as np.interp(p, cumulative[i], phi) but for all samples and percentiles in one pass.
+    n = phi.size
+    if n < 2:
+        raise ValueError("At least two grain size classes are needed.")
+    pct = np.asarray(percentiles, dtype=float)
+    idx = (cumulative[:, None, :] < pct[None, :, None]).sum(axis=2)
+    hi = np.clip(idx, 1, n - 1)
+    lo = hi - 1
+    c_lo = np.take_along_axis(cumulative, lo, axis=1)
+    c_hi = np.take_along_axis(cumulative, hi, axis=1)
+    span = c_hi - c_lo
+    t = np.divide(pct[None, :] - c_lo, span, out=np.zeros_like(span), where=span > 0)
+    t = np.clip(t, 0, 1)
+    return phi[lo] + t * (phi[hi] - phi[lo])
+
+def folk_ward_from_matrix(sizes_mm, weights, sample_ids=None):
+    # sizes_mm: (n_sizes,), weights: (n_samples, n_sizes) -> one row of parameters per sample
+    sizes_mm = np.asarray(sizes_mm, dtype=float)
+    weights = np.atleast_2d(np.asarray(weights, dtype=float))
+    if weights.shape[1] != sizes_mm.size:
+        raise ValueError("Weight matrix must have one column per grain size.")
+
+    phi = -np.log2(sizes_mm)
+    order = np.argsort(phi)
+    phi_sorted = phi[order]
+    weights = np.nan_to_num(weights[:, order])
+    totals = weights.sum(axis=1)
+    valid = totals > 0
+    cumulative = np.cumsum(weights, axis=1) / np.where(valid, totals, 1)[:, None] * 100
+
+    p5, p16, p25, p50, p75, p84, p95 = batch_phi_percentiles(phi_sorted, cumulative).T
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = (p16 + p50 + p84) / 3
+        sorting = (p84 - p16) / 4 + (p95 - p5) / 6.6
+        skewness = ((p16 + p84 - 2 * p50) / (2 * (p84 - p16))) + ((p5 + p95 - 2 * p50) / (2 * (p95 - p5)))
+        kurtosis = (p95 - p5) / (2.44 * (p75 - p25))
+
+    if sample_ids is None:
+        sample_ids = np.arange(1, weights.shape[0] + 1)
+
+    results = pd.DataFrame({
+        "Sample ID": sample_ids,
+        "Mean (Mz)": mean,
+        "Sorting (σ)": sorting,
+        "Skewness (Sk)": skewness,
+        "Kurtosis (KG)": kurtosis,
+    })
+    results.loc[~valid, ["Mean (Mz)", "Sorting (σ)", "Skewness (Sk)", "Kurtosis (KG)"]] = np.nan
+    return results
+
+def grain_size_matrix_from_long(df, sample_col=None, size_col=None, weight_col=None):
+    # Long format (sample_id, size_mm, weight) -> (sample_ids, sizes_mm, weights matrix)
+    sample_col = sample_col or _find_column(df, SAMPLE_ALIASES)
+    size_col = size_col or _find_column(df, SIZE_ALIASES)
+    weight_col = weight_col or _find_column(df, WEIGHT_ALIASES)
+    if sample_col is None or size_col is None or weight_col is None:
+        raise ValueError("Long format needs sample_id, size_mm and weight columns.")
+
+    sizes = pd.to_numeric(df[size_col], errors="coerce").to_numpy(dtype=float)
+    weights = pd.to_numeric(df[weight_col], errors="coerce").to_numpy(dtype=float)
+    keep = np.isfinite(sizes) & (sizes > 0) & np.isfinite(weights) & df[sample_col].notna().to_numpy()
+
+    sample_codes, sample_ids = pd.factorize(df[sample_col][keep])
+    size_codes, size_values = pd.factorize(sizes[keep], sort=True)
+    n_samples, n_sizes = len(sample_ids), len(size_values)
+
+    flat = sample_codes * n_sizes + size_codes
+    matrix = np.bincount(flat, weights=weights[keep], minlength=n_samples * n_sizes).reshape(n_samples, n_sizes)
+    return np.asarray(sample_ids), np.asarray(size_values, dtype=float), matrix
+
+def wide_weight_columns(df, size_col):
+    # Wide format: numeric columns other than the size column are samples; the rest
+    # (notes, IDs, ...) are skipped
+    weight_cols, skipped = [], []
+    for c in df.columns:
+        if c == size_col:
+            continue
+        numeric = pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])
+        (weight_cols if numeric else skipped).append(c)
+    return weight_cols, skipped
+
+def folk_ward_batch(df):
+    # Accepts long format (sample_id, size_mm, weight) or wide format
+    # ('Grain Size (mm)' plus one weight column per sample).
+    if _find_column(df, SAMPLE_ALIASES) is not None:
+        sample_ids, sizes, matrix = grain_size_matrix_from_long(df)
+        return folk_ward_from_matrix(sizes, matrix, sample_ids)
+
+    size_col = _find_column(df, SIZE_ALIASES)
+    if size_col is None:
+        raise ValueError("No 'Grain Size (mm)' or 'size_mm' column found.")
+    weight_cols, _ = wide_weight_columns(df, size_col)
+    if not weight_cols:
+        raise ValueError("No numeric weight columns found next to the grain size column.")
+    sizes = pd.to_numeric(df[size_col], errors="coerce").to_numpy(dtype=float)
+    keep = np.isfinite(sizes) & (sizes > 0)
+    matrix = df.loc[keep, weight_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float).T
+    return folk_ward_from_matrix(sizes[keep], matrix, weight_cols)
+
+def is_multi_sample(df):
+    if _find_column(df, SAMPLE_ALIASES) is not None:
+        return True
+    size_col = _find_column(df, SIZE_ALIASES)
+    return size_col is not None and len(wide_weight_columns(df, size_col)[0]) > 1
+
 def grain_size_analysis():
     st.subheader("🪨 Grain Size Analysis (Folk & Ward Method)")
 
@@ -29,6 +154,11 @@ def grain_size_analysis():
         - View grain size statistics (mean, sorting, skewness).
         - Export chart or CSV.
 
+        #### 📚 Many Samples at Once:
+        Upload a **long** table with `sample_id`, `size_mm`, `weight` columns,
+        or a **wide** table with `Grain Size (mm)` plus one weight column per sample.
+        Every sample is processed in one pass and listed in a results table.
+
         #### 💡 Use For:
         - Soil mechanics, sedimentology, coastal deposits.
         """)
@@ -66,14 +196,11 @@ def grain_size_analysis():
         df = st.session_state.manual_data.copy()
 
     else:
-        uploaded_file = st.file_uploader("Upload CSV or Excel with 'Grain Size (mm)' and 'Weight (%)'", type=['csv', 'xlsx'], key="upload_file")
+        uploaded_file = st.file_uploader("Upload CSV or Excel with 'Grain Size (mm)' and 'Weight (%)' (or sample_id, size_mm, weight)", type=['csv', 'xlsx'], key="upload_file")
 
         if uploaded_file:
             try:
-                if uploaded_file.name.endswith('.csv'):
-                    df = pd.read_csv(uploaded_file)
-                else:
-                    df = pd.read_excel(uploaded_file)
+                df = read_upload(uploaded_file)
                 st.write("### 📄 Uploaded Data", df)
 
                 if st.button("🧹 Clear Uploaded File"):
@@ -87,6 +214,29 @@ def grain_size_analysis():
             st.info("Upload a file to continue.")
             return
 
+    data_key = hash_frame(df)
+
+    # --- MULTI-SAMPLE (BATCH) ANALYSIS ---
+    if is_multi_sample(df):
+        try:
+            results = memoize("grain_size", make_key("batch", data_key), lambda: folk_ward_batch(df))
+        except Exception as e:
+            st.error(f"⚠️ Processing Error: {e}")
+            return
+
+        st.markdown(f"### 📌 Folk & Ward Parameters ({len(results)} samples)")
+        size_col = _find_column(df, SIZE_ALIASES)
+        if _find_column(df, SAMPLE_ALIASES) is None and size_col is not None:
+            skipped = wide_weight_columns(df, size_col)[1]
+            if skipped:
+                st.caption(f"Skipped non-numeric columns: {', '.join(map(str, skipped))}")
+        st.dataframe(results.round(3), use_container_width=True)
+
+        csv_buf = io.StringIO()
+        results.to_csv(csv_buf, index=False)
+        st.download_button("📄 Download Results as CSV", csv_buf.getvalue(), file_name="grain_size_results.csv")
+        return
+
     # --- GRAIN SIZE ANALYSIS ---
     try:
         size = df["Grain Size (mm)"].astype(float).values
@@ -97,37 +247,31 @@ def grain_size_analysis():
         weight_sorted = weight[np.argsort(phi)]
         cumulative_weight = np.cumsum(weight_sorted) / np.sum(weight_sorted) * 100
 
-        def interpolate(x, y, percentile):
-            return np.interp(percentile, y, x)
-
-        phi16 = interpolate(phi_sorted, cumulative_weight, 16)
-        phi50 = interpolate(phi_sorted, cumulative_weight, 50)
-        phi84 = interpolate(phi_sorted, cumulative_weight, 84)
-        phi5 = interpolate(phi_sorted, cumulative_weight, 5)
-        phi95 = interpolate(phi_sorted, cumulative_weight, 95)
-
-        mean = (phi16 + phi50 + phi84) / 3
-        sorting = (phi84 - phi16) / 4 + (phi95 - phi5) / 6.6
-        skewness = ((phi16 + phi84 - 2 * phi50) / (2 * (phi84 - phi16))) + ((phi5 + phi95 - 2 * phi50) / (2 * (phi95 - phi5)))
+        params = memoize(
+            "grain_size", make_key("single", data_key),
+            lambda: folk_ward_from_matrix(size, weight[None, :])
+        ).iloc[0]
 
         st.markdown(f"""
         ### 📌 Folk & Ward Parameters:
-        - **Mean (Mz)**: `{mean:.2f}`
-        - **Sorting (σ)**: `{sorting:.2f}`
-        - **Skewness (Sk)**: `{skewness:.2f}`
+        - **Mean (Mz)**: `{params["Mean (Mz)"]:.2f}`
+        - **Sorting (σ)**: `{params["Sorting (σ)"]:.2f}`
+        - **Skewness (Sk)**: `{params["Skewness (Sk)"]:.2f}`
+        - **Kurtosis (KG)**: `{params["Kurtosis (KG)"]:.2f}`
         """)
 
-        fig, ax = plt.subplots(figsize=(8, 5))
-        ax.plot(phi_sorted, cumulative_weight, marker='o', linestyle='-')
-        ax.set_title("Cumulative Grain Size Curve")
-        ax.set_xlabel("Phi Scale")
-        ax.set_ylabel("Cumulative % Weight")
-        ax.grid(True)
-        st.pyplot(fig)
-
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png")
-        st.download_button("📥 Download Plot as PNG", buf.getvalue(), file_name="grain_size_curve.png")
+        def build():
+            fig, ax = plt.subplots(figsize=(8, 5))
+            ax.plot(phi_sorted, cumulative_weight, marker='o', linestyle='-')
+            ax.set_title("Cumulative Grain Size Curve")
+            ax.set_xlabel("Phi Scale")
+            ax.set_ylabel("Cumulative % Weight")
+            ax.grid(True)
+            return fig
+
+        # Rendered once per dataset; the same bytes feed the page and both downloads
+        show_figure(make_key("grain_size_curve", data_key), build, file_name="grain_size_curve.png",
+                    label="📥 Download Plot as PNG", svg=True)
 
     except Exception as e:
         st.error(f"⚠️ Processing Error: {e}")
@@ -0,0 +1,76 @@
+import io
+
+import matplotlib.pyplot as plt
+import numpy as np
+import streamlit as st
+from matplotlib.patches import Polygon
+
+from cache_utils import make_key, memoize
+
+SQRT3_OVER_2 = np.sqrt(3) / 2
+FIGURE_DPI = 150
+FIGURE_CACHE_ENTRIES = 256
+FIGURE_CACHE_MAX_BYTES = 64 * 1024 ** 2  # rendered PNG/SVG bytes kept across reruns and sessions
+MIME_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+# --- Render-once figure service ---
+# A tool passes a cache key (data hash + plot parameters) and a function that builds the figure.
+# On a miss the figure is built, written once per requested format and closed; the same bytes
+# then feed both the on-page image and the download buttons.
+
+def render_figure(fig, formats=("png",), dpi=FIGURE_DPI):
+    # {format: bytes}; the figure is always closed so pyplot's registry does not grow
+    try:
+        rendered = {}
+        for fmt in formats:
+            buf = io.BytesIO()
+            fig.savefig(buf, format=fmt, dpi=dpi, bbox_inches="tight")
+            rendered[fmt] = buf.getvalue()
+        return rendered
+    finally:
+        plt.close(fig)
+
+def cached_figure(key, build, formats=("png",), dpi=FIGURE_DPI):
+    return memoize("figures", make_key(key, tuple(formats), dpi), lambda: render_figure(build(), formats, dpi),
+                   max_entries=FIGURE_CACHE_ENTRIES, max_bytes=FIGURE_CACHE_MAX_BYTES)
+
+def show_figure(key, build, file_name=None, label="📥 Download Chart as PNG", svg=False):
+    # Draw build()'s figure from cached bytes, with PNG (and optionally SVG) downloads
+    formats = ("png", "svg") if svg else ("png",)
+    rendered = cached_figure(key, build, formats)
+    st.image(rendered["png"])
+    if file_name:
+        # Widget keys follow the figure's cache key, so two charts may share a download name
+        widget_key = make_key(key, file_name)
+        st.download_button(label, rendered["png"], file_name=file_name, mime=MIME_TYPES["png"], key=f"fig_png_{widget_key}")
+        if svg:
+            stem = file_name.rsplit(".", 1)[0]
+            st.download_button(label.replace("PNG", "SVG"), rendered["svg"], file_name=f"{stem}.svg",
+                               mime=MIME_TYPES["svg"], key=f"fig_svg_{widget_key}")
+    return rendered
+
+def normalize_ternary(values, scale=100, return_mask=False):
+    # (n, 3) raw components -> (n, 3) percentages; rows with no positive total are dropped
+    values = np.asarray(values, dtype=float)
+    total = values.sum(axis=1)
+    keep = np.isfinite(total) & (total > 0)
+    points = values[keep] / total[keep, None] * scale
+    return (points, keep) if return_mask else points
+
+def project_ternary(points):
+    # Same projection as python-ternary: x = a + b/2, y = sqrt(3)/2 * b
+    points = np.asarray(points, dtype=float)
+    x = points[:, 0] + points[:, 1] / 2
+    y = SQRT3_OVER_2 * points[:, 1]
+    return x, y
+
+def ternary_density(tax, points, scale=100, gridsize=40, cmap="viridis", label="Samples per bin"):
+    # Hex-binned point density drawn as a single collection, clipped to the triangle
+    ax = tax.get_axes()
+    x, y = project_ternary(points)
+    height = SQRT3_OVER_2 * scale
+    coll = ax.hexbin(x, y, gridsize=gridsize, extent=(0, scale, 0, height), mincnt=1, cmap=cmap, zorder=1)
+    triangle = Polygon([(0, 0), (scale, 0), (scale / 2, height)], closed=True, transform=ax.transData)
+    coll.set_clip_path(triangle)
+    ax.figure.colorbar(coll, ax=ax, label=label, shrink=0.7)
+    return coll
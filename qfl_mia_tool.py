@@ -1,8 +1,31 @@
+import os
+import numpy as np
 import pandas as pd
 import streamlit as st
 import matplotlib.pyplot as plt
 import ternary
 
+from cache_utils import hash_frame, make_key, memoize, read_upload, scratch_path, upload_key
+from plot_utils import normalize_ternary, show_figure, ternary_density
+
+# Above this many samples the QFL triangle switches from a scatter to a hex-binned density view
+QFL_DENSITY_THRESHOLD = 5000
+
+FULL_COMPONENTS = ["qm", "qp", "k", "p", "lm", "ls", "lv"]
+QFL_COMPONENTS = ["q", "f", "l"]
+COLUMN_ALIASES = {
+    "feldspar": "k",
+    "mica": "p",
+    "lithic fragment": "lv",
+}
+MIA_CATEGORIES = ["Very Low", "Low", "Moderate", "High"]
+MIA_COLORS = {
+    "Very Low": "#ff6666",
+    "Low": "#ffcc66",
+    "Moderate": "#66ccff",
+    "High": "#66ff66"
+}
+
 def inject_css():
     st.markdown("""
         <style>
@@ -22,12 +45,7 @@ def inject_css():
 
 def standardize_columns(df):
     df.columns = [c.strip().lower() for c in df.columns]
-    rename_map = {
-        "feldspar": "k",
-        "mica": "p",
-        "lithic fragment": "lv",
-    }
-    for old, new in rename_map.items():
+    for old, new in COLUMN_ALIASES.items():
         if old in df.columns and new not in df.columns:
             df = df.rename(columns={old: new})
     df = df.loc[:, ~df.columns.duplicated()]
@@ -43,6 +61,183 @@ def calculate_mia(df):
     df["mia"] = (df["q"] / (df["q"] + df["k"] + df["p"])) * 100 if "k" in df.columns and "p" in df.columns else (df["q"] / (df["q"] + df["f"])) * 100
     return df
 
+def categorize_mia(val):
+    if val > 75:
+        return "High"
+    elif val > 50:
+        return "Moderate"
+    elif val > 25:
+        return "Low"
+    else:
+        return "Very Low"
+
+def categorize_mia_array(mia):
+    # Vectorized categorize_mia for whole columns/chunks
+    mia = np.asarray(mia, dtype=float)
+    labels = np.select([mia > 75, mia > 50, mia > 25], ["High", "Moderate", "Low"], default="Very Low")
+    return pd.Categorical(labels, categories=MIA_CATEGORIES)
+
+def add_qfl_percentages(df):
+    qfl_total = df[QFL_COMPONENTS].sum(axis=1)
+    df["Q %"] = df["q"] / qfl_total * 100
+    df["F %"] = df["f"] / qfl_total * 100
+    df["L %"] = df["l"] / qfl_total * 100
+    return df
+
+def _stream_columns(source, full_components):
+    # Map raw CSV headers to standard names for the columns the calculation needs
+    if hasattr(source, "seek"):
+        source.seek(0)
+    header = pd.read_csv(source, nrows=0)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    expected = FULL_COMPONENTS if full_components else QFL_COMPONENTS
+    rename = {}
+    for col in header.columns:
+        std = col.strip().lower()
+        std = COLUMN_ALIASES.get(std, std)
+        if std in expected and std not in rename.values():
+            rename[col] = std
+    missing = [c for c in expected if c not in rename.values()]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    return rename
+
+def stream_qfl_mia(source, out_path, full_components=True, chunksize=50_000, preview_size=1000, seed=0):
+    # Chunked Q/F/L + MIA: running sums for the summary, incremental CSV output and a
+    # uniform random preview (smallest random keys), so memory is bounded by chunk size.
+    rename = _stream_columns(source, full_components)
+    try:
+        return _stream_chunks(source, rename, out_path, full_components, chunksize, preview_size, seed, typed=True)
+    except ValueError:
+        # Text in a numeric column: read again, coercing such cells to NaN (those rows are dropped)
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return _stream_chunks(source, rename, out_path, full_components, chunksize, preview_size, seed, typed=False)
+
+def _stream_chunks(source, rename, out_path, full_components, chunksize, preview_size, seed, typed):
+    rng = np.random.default_rng(seed)
+
+    totals = np.zeros(3)
+    mia_sum = 0.0
+    mia_count = 0
+    n_rows = 0
+    n_dropped = 0
+    counts = pd.Series(0, index=MIA_CATEGORIES, dtype="int64")
+    preview = None
+
+    # typed: the parser produces float32 columns directly (raises ValueError on text cells)
+    reader = pd.read_csv(source, usecols=list(rename), dtype=dict.fromkeys(rename, "float32") if typed else None,
+                         chunksize=chunksize)
+    with open(out_path, "w", newline="", encoding="utf-8") as out:
+        for i, chunk in enumerate(reader):
+            chunk = chunk.rename(columns=rename)
+            if not typed:
+                chunk = chunk.apply(pd.to_numeric, errors="coerce").astype("float32")
+            before = len(chunk)
+            chunk = chunk.dropna()
+            n_dropped += before - len(chunk)
+            if full_components:
+                chunk = calculate_qfl_components(chunk)
+            chunk = calculate_mia(chunk)
+            chunk = add_qfl_percentages(chunk)
+            chunk["category"] = categorize_mia_array(chunk["mia"])
+
+            totals += chunk[QFL_COMPONENTS].sum(axis=0).to_numpy(dtype=float)
+            mia = chunk["mia"].to_numpy(dtype=float)
+            finite = np.isfinite(mia)
+            mia_sum += mia[finite].sum()
+            mia_count += int(finite.sum())
+            counts += chunk["category"].value_counts().reindex(MIA_CATEGORIES, fill_value=0)
+            n_rows += len(chunk)
+
+            chunk.to_csv(out, header=(i == 0), index=False)
+
+            keyed = chunk.assign(_key=rng.random(len(chunk)))
+            preview = keyed if preview is None else pd.concat([preview, keyed])
+            preview = preview.nsmallest(preview_size, "_key")
+
+    if preview is not None:
+        preview = preview.drop(columns="_key").sort_index()
+
+    summary = {
+        "rows": n_rows,
+        "dropped": n_dropped,
+        "total_q": totals[0],
+        "total_f": totals[1],
+        "total_l": totals[2],
+        "average_mia": mia_sum / mia_count if mia_count else float("nan"),
+        "category_counts": counts,
+    }
+    return summary, preview
+
+def compute_full_qfl(df):
+    df = df.copy()
+    expected = FULL_COMPONENTS
+    df[expected] = df[expected].apply(pd.to_numeric, errors="coerce")
+    df.dropna(subset=expected, inplace=True)
+    df = calculate_qfl_components(df)
+    return calculate_mia(df)
+
+def compute_direct_qfl(df):
+    df = df.copy()
+    df.columns = [c.strip().lower() for c in df.columns]
+    df = df[["q", "f", "l"]].apply(pd.to_numeric, errors="coerce")
+    df.dropna(inplace=True)
+    return calculate_mia(df)
+
+def next_applied(input_key):
+    # "Next" marks the current input as applied, so later widget reruns
+    # (e.g. picking a reference diagram) keep showing cached results
+    if st.button("Next"):
+        st.session_state.qfl_applied = input_key
+    return st.session_state.get("qfl_applied") == input_key
+
+def show_streaming_results(uploaded_file, full_components, chunksize):
+    key = make_key(upload_key(uploaded_file), full_components, chunksize)
+    out_path = scratch_path(f"qfl_mia_results_{key}.csv")
+    try:
+        with st.spinner("Streaming file in chunks..."):
+            summary, preview = memoize(
+                "qfl_stream", key,
+                lambda: stream_qfl_mia(uploaded_file, out_path, full_components, chunksize)
+            )
+    except Exception as e:
+        st.error(f"Error: {e}")
+        return
+
+    st.success(f"✅ QFL & MIA Calculated for {summary['rows']:,} samples ({summary['dropped']:,} incomplete rows skipped)")
+
+    st.markdown("### 📊 Total QFL Summary")
+    st.info(f"**Total Quartz (Q):** {summary['total_q']:.2f} &nbsp;&nbsp; | &nbsp;&nbsp; **Total Feldspar (F):** {summary['total_f']:.2f} &nbsp;&nbsp; | &nbsp;&nbsp; **Total Lithics (L):** {summary['total_l']:.2f}")
+
+    st.markdown("### 🧠 Average MIA Interpretation")
+    average_mia = summary["average_mia"]
+    st.success(f"**Average MIA:** {average_mia:.2f}% → {interpret_mia(average_mia)}")
+
+    st.markdown("### 📊 MIA Category Counts")
+    counts = summary["category_counts"]
+
+    def build():
+        fig, ax = plt.subplots()
+        ax.bar(counts.index, counts.values, color=[MIA_COLORS[c] for c in counts.index])
+        ax.set_title("Samples per MIA Category")
+        ax.set_ylabel("Samples")
+        return fig
+
+    show_figure(make_key("mia_categories", key), build, file_name="mia_category_counts.png")
+
+    if preview is not None and len(preview):
+        st.markdown(f"### 🔎 Sampled Preview ({len(preview):,} random rows)")
+        st.dataframe(preview, use_container_width=True)
+
+        st.markdown("### 🔺 QFL Diagram (sampled preview)")
+        plot_qfl_triangle(preview)
+
+    if os.path.exists(out_path):
+        with open(out_path, "rb") as f:
+            st.download_button("📥 Download Results CSV", f, file_name="qfl_mia_results.csv")
+
 def interpret_mia(value):
     if value > 75:
         return "Very high MIA suggests intense chemical weathering and sediment maturity—likely humid climate."
@@ -53,7 +248,10 @@ def interpret_mia(value):
     else:
         return "Low MIA indicates immature sediments, likely arid climates or tectonically active areas."
 
-def plot_qfl_triangle(data):
+def qfl_percentages(data):
+    return normalize_ternary(data[["q", "f", "l"]].to_numpy(dtype=float))
+
+def build_qfl_figure(data, density_threshold=QFL_DENSITY_THRESHOLD, gridsize=40):
     fig, tax = ternary.figure(scale=100)
     fig.set_size_inches(6, 6)
     tax.set_title("QFL Triangle", fontsize=15)
@@ -63,17 +261,20 @@ def plot_qfl_triangle(data):
     tax.right_axis_label("L", fontsize=12)
     tax.bottom_axis_label("Q", fontsize=12)
 
-    for _, row in data.iterrows():
-        total = row["q"] + row["f"] + row["l"]
-        if total > 0:
-            q = row["q"] / total * 100
-            f = row["f"] / total * 100
-            l = row["l"] / total * 100
-            tax.scatter([(q, f, l)], marker="o", color="blue", s=30)
+    points = qfl_percentages(data)
+    if len(points) > density_threshold:
+        ternary_density(tax, points, scale=100, gridsize=gridsize)
+    elif len(points):
+        tax.scatter(points, marker="o", color="blue", s=30)
 
     tax.ticks(axis='lbr', multiple=10, linewidth=1)
     tax.clear_matplotlib_ticks()
-    st.pyplot(fig)
+    return fig
+
+def plot_qfl_triangle(data, density_threshold=QFL_DENSITY_THRESHOLD, gridsize=40):
+    key = make_key("qfl_triangle", hash_frame(data[["q", "f", "l"]]), density_threshold, gridsize)
+    show_figure(key, lambda: build_qfl_figure(data, density_threshold, gridsize), file_name="qfl_triangle.png",
+                label="📥 Download QFL Triangle as PNG", svg=True)
 
 def show_reference_diagram(selection):
     diagram_paths = {
@@ -110,6 +311,11 @@ def qfl_and_mia_tool():
     - Weathering Climate
     - Sandstone Classification
 
+    ### ⚡ Large Files:
+    Tick **Streaming mode** after uploading to process the CSV in chunks. Totals, average MIA
+    and category counts are accumulated chunk by chunk, results are written straight to the
+    download file, and only a random sample of rows is previewed.
+
     **📥 Download** results after processing, including Q, F, L and MIA.
     """)
 
@@ -121,8 +327,13 @@ def qfl_and_mia_tool():
         input_mode = st.radio("Choose Method", ["Upload CSV", "Manual Entry"])
         if input_mode == "Upload CSV":
             uploaded_file = st.file_uploader("Upload CSV file", type=["csv"])
+            if uploaded_file and st.checkbox("⚡ Streaming mode for large files", key="qfl_full_stream"):
+                chunksize = st.number_input("Rows per chunk", min_value=1000, value=50_000, step=10_000, key="qfl_full_chunk")
+                if next_applied(make_key("full_stream", upload_key(uploaded_file), chunksize)):
+                    show_streaming_results(uploaded_file, True, int(chunksize))
+                return
             if uploaded_file:
-                df = pd.read_csv(uploaded_file)
+                df = read_upload(uploaded_file)
                 df = standardize_columns(df)
                 st.dataframe(df)
         else:
@@ -133,13 +344,10 @@ def qfl_and_mia_tool():
             df = st.data_editor(sample_data, num_rows="dynamic", use_container_width=True)
             df = standardize_columns(df)
 
-        if df is not None and st.button("Next"):
+        input_key = make_key("full", hash_frame(df)) if df is not None else None
+        if df is not None and next_applied(input_key):
             try:
-                expected = ["qm", "qp", "k", "p", "lm", "ls", "lv"]
-                df[expected] = df[expected].apply(pd.to_numeric, errors="coerce")
-                df.dropna(subset=expected, inplace=True)
-                df = calculate_qfl_components(df)
-                df = calculate_mia(df)
+                df = memoize("qfl_mia", input_key, lambda: compute_full_qfl(df)).copy()
             except Exception as e:
                 st.error(f"Error: {e}")
                 return
@@ -149,26 +357,28 @@ def qfl_and_mia_tool():
         input_mode = st.radio("Choose Method", ["Upload CSV", "Manual Entry"])
         if input_mode == "Upload CSV":
             uploaded_file = st.file_uploader("Upload CSV with Q, F, L", type=["csv"])
+            if uploaded_file and st.checkbox("⚡ Streaming mode for large files", key="qfl_direct_stream"):
+                chunksize = st.number_input("Rows per chunk", min_value=1000, value=50_000, step=10_000, key="qfl_direct_chunk")
+                if next_applied(make_key("direct_stream", upload_key(uploaded_file), chunksize)):
+                    show_streaming_results(uploaded_file, False, int(chunksize))
+                return
             if uploaded_file:
-                df = pd.read_csv(uploaded_file)
+                df = read_upload(uploaded_file)
                 df.columns = [c.strip().lower() for c in df.columns]
                 st.dataframe(df)
         else:
             sample_data = pd.DataFrame({"Q": [60], "F": [30], "L": [10]})
             df = st.data_editor(sample_data, num_rows="dynamic", use_container_width=True)
 
-        if df is not None and st.button("Next"):
+        input_key = make_key("direct", hash_frame(df)) if df is not None else None
+        if df is not None and next_applied(input_key):
             try:
-                df.columns = [c.strip().lower() for c in df.columns]
-                df = df.rename(columns={"q": "q", "f": "f", "l": "l"})
-                df = df[["q", "f", "l"]].apply(pd.to_numeric, errors="coerce")
-                df.dropna(inplace=True)
-                df = calculate_mia(df)
+                df = memoize("qfl_mia", input_key, lambda: compute_direct_qfl(df)).copy()
             except Exception as e:
                 st.error(f"Error: {e}")
                 return
 
-    if df is not None and "q" in df.columns and "f" in df.columns and "l" in df.columns:
+    if df is not None and all(c in df.columns for c in ["q", "f", "l", "mia"]):
         st.success("✅ QFL & MIA Calculated")
         st.dataframe(df, use_container_width=True)
 
@@ -186,43 +396,28 @@ def qfl_and_mia_tool():
 
         # 🔸 Q, F, L Percent per Sample
         st.markdown("### 📌 QFL Percentage Breakdown")
-        qfl_total = df[["q", "f", "l"]].sum(axis=1)
-        df["Q %"] = df["q"] / qfl_total * 100
-        df["F %"] = df["f"] / qfl_total * 100
-        df["L %"] = df["l"] / qfl_total * 100
+        df = add_qfl_percentages(df)
         st.dataframe(df[["Q %", "F %", "L %"]])
 
         # 🔸 MIA Bar Chart with Visual Grade
         st.markdown("### 📊 MIA Values by Sample")
 
-        def categorize_mia(val):
-            if val > 75:
-                return "High"
-            elif val > 50:
-                return "Moderate"
-            elif val > 25:
-                return "Low"
-            else:
-                return "Very Low"
-
         df["category"] = df["mia"].apply(categorize_mia)
-        colors = df["category"].map({
-            "Very Low": "#ff6666",
-            "Low": "#ffcc66",
-            "Moderate": "#66ccff",
-            "High": "#66ff66"
-        })
-
-        fig, ax = plt.subplots()
-        ax.bar(df.index + 1, df["mia"], color=colors)
-        ax.set_title("MIA Index by Sample")
-        ax.set_xlabel("Sample")
-        ax.set_ylabel("MIA (%)")
-        ax.set_xticks(df.index + 1)
-        ax.set_ylim(0, 100)
-        for i, val in enumerate(df["mia"]):
-            ax.text(i + 1, val + 2, f"{val:.1f}%", ha='center', fontsize=8)
-        st.pyplot(fig)
+        colors = df["category"].map(MIA_COLORS)
+
+        def build():
+            fig, ax = plt.subplots()
+            ax.bar(df.index + 1, df["mia"], color=colors)
+            ax.set_title("MIA Index by Sample")
+            ax.set_xlabel("Sample")
+            ax.set_ylabel("MIA (%)")
+            ax.set_xticks(df.index + 1)
+            ax.set_ylim(0, 100)
+            for i, val in enumerate(df["mia"]):
+                ax.text(i + 1, val + 2, f"{val:.1f}%", ha='center', fontsize=8)
+            return fig
+
+        show_figure(make_key("mia_bars", hash_frame(df[["mia"]])), build, file_name="mia_by_sample.png")
 
         st.info("""
         **MIA Chart Interpretation:**
@@ -236,7 +431,11 @@ def qfl_and_mia_tool():
         st.download_button("📥 Download Results CSV", csv, file_name="qfl_mia_results.csv")
 
         st.markdown("### 🔺 QFL Diagram")
-        plot_qfl_triangle(df)
+        density_threshold = st.number_input(
+            "Switch to density view above this many samples",
+            min_value=1, value=QFL_DENSITY_THRESHOLD, step=500
+        )
+        plot_qfl_triangle(df, density_threshold=density_threshold)
 
         st.markdown("### 📊 View Reference Diagram")
         diagram_choice = st.selectbox("Choose a diagram", [
@@ -1,10 +1,150 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
 import io
 import random
+from functools import lru_cache
 import ternary  # You must have 'python-ternary' installed
 
+from matplotlib.colors import to_rgba
+from matplotlib.lines import Line2D
+
+from cache_utils import hash_frame, make_key, memoize, read_upload
+from plot_utils import normalize_ternary, project_ternary, show_figure, ternary_density
+
+TEXTURE_CLASSES = [
+    "Sand", "Loamy Sand", "Sandy Loam", "Loam", "Silt Loam", "Silt",
+    "Sandy Clay Loam", "Clay Loam", "Silty Clay Loam", "Sandy Clay", "Silty Clay", "Clay",
+]
+UNCLASSIFIED = 255
+LATTICE_STEPS_PER_PERCENT = 10  # lookup resolution: 0.1 %
+TOTAL_TOLERANCE = 2.0  # % deviation from 100 before a row is renormalised/flagged
+SOIL_DENSITY_THRESHOLD = 5000  # above this many samples the triangle shows point density
+MAX_LEGEND_ENTRIES = 12
+OTHER_COLOR = "#bbbbbb"
+
+def usda_texture_codes(sand, silt, clay, unit=1):
+    # USDA texture triangle rules; inputs in percent * unit so lattice values stay exact
+    t = lambda pct: pct * unit
+    conditions = [
+        silt + 1.5 * clay < t(15),
+        silt + 2 * clay < t(30),
+        ((clay >= t(7)) & (clay < t(20)) & (sand > t(52))) | ((clay < t(7)) & (silt < t(50))),
+        (clay >= t(7)) & (clay < t(27)) & (silt >= t(28)) & (silt < t(50)) & (sand <= t(52)),
+        ((silt >= t(50)) & (clay >= t(12)) & (clay < t(27))) | ((silt >= t(50)) & (silt < t(80)) & (clay < t(12))),
+        (silt >= t(80)) & (clay < t(12)),
+        (clay >= t(20)) & (clay < t(35)) & (silt < t(28)) & (sand > t(45)),
+        (clay >= t(27)) & (clay < t(40)) & (sand > t(20)) & (sand <= t(45)),
+        (clay >= t(27)) & (clay < t(40)) & (sand <= t(20)),
+        (clay >= t(35)) & (sand > t(45)),
+        (clay >= t(40)) & (silt >= t(40)),
+        (clay >= t(40)) & (sand <= t(45)) & (silt < t(40)),
+    ]
+    return np.select(conditions, np.arange(len(TEXTURE_CLASSES)), default=UNCLASSIFIED).astype(np.uint8)
+
+@lru_cache(maxsize=None)
+def texture_lattice(steps=LATTICE_STEPS_PER_PERCENT):
+    # (sand, clay) lattice of class codes, built once; silt is implied by 100 - sand - clay
+    n = 100 * steps + 1
+    sand, clay = np.meshgrid(np.arange(n, dtype=float), np.arange(n, dtype=float), indexing="ij")
+    silt = 100 * steps - sand - clay
+    codes = usda_texture_codes(sand, silt, clay, unit=steps)
+    codes[silt < 0] = UNCLASSIFIED
+    codes.setflags(write=False)
+    return codes
+
+def _column(df, name):
+    lookup = {str(c).strip().lower(): c for c in df.columns}
+    if name.lower() not in lookup:
+        raise ValueError(f"Missing '{name}' column.")
+    return lookup[name.lower()]
+
+def classify_soil_texture(df, tolerance=TOTAL_TOLERANCE, renormalise=True):
+    # Returns (rows with 'Total (%)', 'Texture Class', 'Check' columns, per-class count summary).
+    # Each row is an O(1) lookup into the precomputed lattice.
+    cols = [_column(df, name) for name in ("Sand", "Silt", "Clay")]
+    values = df[cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    total = values.sum(axis=1)
+
+    valid = np.isfinite(total) & (total > 0) & (values >= 0).all(axis=1)
+    off_total = valid & (np.abs(total - 100) > tolerance)
+    usable = valid & (renormalise | ~off_total)
+
+    steps = LATTICE_STEPS_PER_PERCENT
+    safe_total = np.where(valid, total, 1.0)
+    sand_idx = np.rint(values[:, 0] / safe_total * 100 * steps)
+    clay_idx = np.rint(values[:, 2] / safe_total * 100 * steps)
+    sand_idx = np.clip(np.nan_to_num(sand_idx), 0, 100 * steps).astype(np.intp)
+    clay_idx = np.clip(np.nan_to_num(clay_idx), 0, 100 * steps - sand_idx).astype(np.intp)
+
+    codes = texture_lattice(steps)[sand_idx, clay_idx].astype(np.int16)
+    codes[~usable | (codes == UNCLASSIFIED)] = -1
+
+    check = np.where(~valid, "Invalid", np.where(off_total, "Renormalised" if renormalise else "Off Total", "OK"))
+
+    result = df.copy()
+    result["Total (%)"] = total
+    result["Texture Class"] = pd.Categorical.from_codes(codes, categories=TEXTURE_CLASSES)
+    result["Check"] = check
+
+    counts = result["Texture Class"].value_counts().reindex(TEXTURE_CLASSES, fill_value=0)
+    summary = pd.DataFrame({"Texture Class": TEXTURE_CLASSES, "Samples": counts.to_numpy()})
+    summary = summary[summary["Samples"] > 0].reset_index(drop=True)
+    summary["Share (%)"] = summary["Samples"] / max(len(result), 1) * 100
+    return result, summary
+
+def _category_colors(labels, max_legend):
+    # One RGBA colour per point; only the most frequent categories get their own legend entry
+    labels = pd.Series(labels).astype("object").fillna("Unclassified").astype(str)
+    order = labels.value_counts().index.tolist()
+    if labels.name == "Texture Class":
+        order = [c for c in TEXTURE_CLASSES if c in order] + [c for c in order if c not in TEXTURE_CLASSES]
+    shown = order[:max_legend]
+    cmap = plt.get_cmap("tab20")
+    palette = {cat: cmap(i % cmap.N) for i, cat in enumerate(shown)}
+    colors = np.array([palette.get(cat, to_rgba(OTHER_COLOR)) for cat in labels])
+
+    handles = [Line2D([], [], marker="o", linestyle="", color=palette[cat], label=cat) for cat in shown]
+    hidden = len(order) - len(shown)
+    if hidden > 0:
+        handles.append(Line2D([], [], marker="o", linestyle="", color=OTHER_COLOR, label=f"Other ({hidden} more)"))
+    return colors, handles
+
+def build_soil_figure(classified, color_by="Texture Class", density_threshold=SOIL_DENSITY_THRESHOLD, max_legend=MAX_LEGEND_ENTRIES):
+    fig, tax = ternary.figure(scale=100)
+    fig.set_size_inches(6, 6)
+
+    cols = [_column(classified, name) for name in ("Sand", "Clay", "Silt")]
+    values = classified[cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    points, keep = normalize_ternary(values, return_mask=True)
+
+    if len(points) > density_threshold:
+        ternary_density(tax, points, scale=100, label="Samples per bin")
+    elif len(points):
+        ax = tax.get_axes()
+        x, y = project_ternary(points)
+        column = classified[color_by][keep]
+        if pd.api.types.is_numeric_dtype(column) and not isinstance(column.dtype, pd.CategoricalDtype):
+            plot = ax.scatter(x, y, marker="o", s=25, c=column.to_numpy(dtype=float), cmap="viridis", edgecolors="none", zorder=3)
+            fig.colorbar(plot, ax=ax, label=color_by, shrink=0.7)
+        else:
+            colors, handles = _category_colors(column.rename(color_by), max_legend)
+            ax.scatter(x, y, marker="o", s=25, c=colors, edgecolors="none", zorder=3)
+            ax.legend(handles=handles, loc="upper right", fontsize=8, title=color_by)
+
+    tax.boundary(linewidth=1.5)
+    tax.gridlines(color="gray", multiple=10)
+    tax.left_axis_label("Clay %", offset=0.14)
+    tax.right_axis_label("Silt %", offset=0.14)
+    tax.bottom_axis_label("Sand %", offset=0.10)
+    tax.ticks(axis='lbr', linewidth=1, multiple=10)
+
+    tax.clear_matplotlib_ticks()
+    tax._redraw_labels()
+    tax.set_title("Soil Texture Triangle")
+    return fig
+
 def soil_texture_triangle():
     st.subheader("🧪 Soil Texture Triangle Tool")
 
@@ -63,7 +203,7 @@ def soil_texture_triangle():
         uploaded = st.file_uploader("Upload a CSV with Sand, Silt, and Clay columns", type=["csv"])
         if uploaded:
             try:
-                df = pd.read_csv(uploaded)
+                df = read_upload(uploaded)
                 st.write("📄 Uploaded Data", df)
                 if st.button("🧹 Clear Uploaded File"):
                     del st.session_state["soil_input_method"]
@@ -75,31 +215,47 @@ def soil_texture_triangle():
             st.info("Upload your CSV to proceed.")
             return
 
+    # --- Texture Classification ---
+    try:
+        renormalise = st.checkbox(f"Renormalise rows whose Sand + Silt + Clay is not within ±{TOTAL_TOLERANCE:g}% of 100", value=True)
+        classify_key = make_key(hash_frame(df), renormalise)
+        classified, summary = memoize(
+            "soil_texture", classify_key,
+            lambda: classify_soil_texture(df, renormalise=renormalise)
+        )
+
+        st.markdown("### 🏷️ Predicted Texture Class")
+        st.dataframe(classified, use_container_width=True)
+        flagged = (classified["Check"] != "OK").sum()
+        if flagged:
+            st.warning(f"⚠️ {flagged} row(s) did not sum to ~100% (see the 'Check' column).")
+
+        st.markdown("### 📊 Texture Class Summary")
+        st.dataframe(summary.round(1), use_container_width=True, hide_index=True)
+
+        csv_buf = io.StringIO()
+        classified.to_csv(csv_buf, index=False)
+        st.download_button("📄 Download Classified Table (CSV)", csv_buf.getvalue(), file_name="soil_texture_classes.csv")
+    except Exception as e:
+        st.error(f"❌ Classification Error: {e}")
+        return
+
     try:
-        fig, tax = ternary.figure(scale=100)
-        fig.set_size_inches(6, 6)
-
-        for index, row in df.iterrows():
-            point = (row["Sand"], row["Clay"], row["Silt"])
-            tax.plot([point], marker='o', label=f"Sample {index+1}")
-
-        tax.boundary(linewidth=1.5)
-        tax.gridlines(color="gray", multiple=10)
-        tax.left_axis_label("Clay %", offset=0.14)
-        tax.right_axis_label("Silt %", offset=0.14)
-        tax.bottom_axis_label("Sand %", offset=0.10)
-        tax.ticks(axis='lbr', linewidth=1, multiple=10)
-
-        tax.clear_matplotlib_ticks()
-        tax._redraw_labels()
-        tax.legend()
-        tax.set_title("Soil Texture Triangle")
-
-        st.pyplot(fig)
-
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png")
-        st.download_button("📥 Download Triangle as PNG", buf.getvalue(), file_name="soil_texture_triangle.png")
+        st.markdown("### 🔺 Soil Texture Triangle")
+        col1, col2 = st.columns(2)
+        with col1:
+            color_options = ["Texture Class"] + [c for c in classified.columns if c not in ("Texture Class", "Check")]
+            color_by = st.selectbox("Colour points by", color_options)
+        with col2:
+            density_threshold = st.number_input(
+                "Switch to density view above this many samples",
+                min_value=1, value=SOIL_DENSITY_THRESHOLD, step=500
+            )
+
+        # Rendered once per data + settings; the same bytes feed the page and the downloads
+        key = make_key("soil_triangle", classify_key, color_by, density_threshold)
+        show_figure(key, lambda: build_soil_figure(classified, color_by, density_threshold),
+                    file_name="soil_texture_triangle.png", label="📥 Download Triangle as PNG", svg=True)
 
     except Exception as e:
         st.error(f"❌ Error: {e}")
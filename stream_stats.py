@@ -0,0 +1,303 @@
+import io
+import math
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# One-pass, mergeable column summaries: every piece of state below can be built from any
+# slice of the rows and combined later, so chunks (and worker processes) summarise
+# independently and merge into the same result as a single pass over the whole file.
+
+SUMMARY_CHUNK_ROWS = 200_000
+SKETCH_ACCURACY = 0.01  # relative error of sketch quantiles
+SKETCH_MAX_BINS = 2048
+HLL_PRECISION = 14  # 2^14 registers, ~0.8% standard error
+SUMMARY_QUANTILES = [0.01, 0.25, 0.5, 0.75, 0.99]
+MIN_PARALLEL_BYTES = 64 * 1024 * 1024
+
+
+class QuantileSketch:
+    # DDSketch-style log-bucketed histogram: any quantile within SKETCH_ACCURACY relative error
+    def __init__(self, accuracy=SKETCH_ACCURACY, max_bins=SKETCH_MAX_BINS):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_bins = max_bins
+        self.positive = Counter()
+        self.negative = Counter()
+        self.zeros = 0
+        self.count = 0
+
+    def _bucket_counts(self, values):
+        keys, counts = np.unique(np.ceil(np.log(values) / self.log_gamma).astype(np.int64), return_counts=True)
+        return dict(zip(keys.tolist(), counts.tolist()))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        self.count += len(values)
+        self.zeros += int(np.count_nonzero(values == 0))
+        if (values > 0).any():
+            self.positive.update(self._bucket_counts(values[values > 0]))
+        if (values < 0).any():
+            self.negative.update(self._bucket_counts(-values[values < 0]))
+        self._collapse()
+
+    def merge(self, other):
+        self.positive.update(other.positive)
+        self.negative.update(other.negative)
+        self.zeros += other.zeros
+        self.count += other.count
+        self._collapse()
+
+    def _collapse(self):
+        # Fold the buckets nearest zero together once there are too many (keeps the tails exact)
+        for store in (self.positive, self.negative):
+            if len(store) > self.max_bins:
+                keys = sorted(store)
+                excess = keys[:len(keys) - self.max_bins + 1]
+                store[excess[-1]] += sum(store.pop(k) for k in excess[:-1])
+
+    def _value(self, key, sign):
+        return sign * 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantiles(self, qs):
+        if self.count == 0:
+            return [np.nan] * len(qs)
+        # Ascending order: most negative (largest magnitude) first, then zeros, then positives
+        keys = [(-k, -1) for k in sorted(self.negative, reverse=True)] + [(None, 0)] + [(k, 1) for k in sorted(self.positive)]
+        counts = np.array([self.negative[-k] if s < 0 else self.positive[k] if s > 0 else self.zeros for k, s in keys])
+        cumulative = np.cumsum(counts)
+        result = []
+        for q in qs:
+            i = int(np.searchsorted(cumulative, q * (self.count - 1), side="right"))
+            key, sign = keys[min(i, len(keys) - 1)]
+            result.append(0.0 if sign == 0 else self._value(-key if sign < 0 else key, sign))
+        return result
+
+
+class HyperLogLog:
+    # Distinct-count estimate from 64-bit hashes; merging is an element-wise max of registers
+    def __init__(self, precision=HLL_PRECISION):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def update(self, values):
+        if len(values) == 0:
+            return
+        hashes = pd.util.hash_array(np.asarray(values))
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        # Rank = leading zeros in the remaining (64 - p) bits + 1; float64 holds them exactly
+        with np.errstate(divide="ignore"):
+            top_bit = np.floor(np.log2(rest.astype(np.float64)))
+        rank = np.where(rest > 0, (64 - self.p) - 1 - top_bit, 64 - self.p) + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / np.sum(2.0 ** -self.registers.astype(float))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and empty:
+            estimate = self.m * math.log(self.m / empty)  # linear counting for small cardinalities
+        return estimate
+
+
+class ColumnSummary:
+    def __init__(self, numeric):
+        self.numeric = numeric
+        self.count = 0
+        self.missing = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared deviations from the mean
+        self.min = np.inf
+        self.max = -np.inf
+        self.sketch = QuantileSketch() if numeric else None
+        self.distinct = HyperLogLog()
+
+    def update(self, series):
+        values = series.to_numpy()
+        present = series.notna().to_numpy()
+        if self.numeric:
+            values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=float)
+            present = np.isfinite(values)
+        values = values[present]
+        self.missing += int(len(present) - present.sum())
+        self.distinct.update(values)
+        if not self.numeric or len(values) == 0:
+            self.count += len(values)
+            return
+        # The chunk's own mean and M2, folded in with the same rule as merging two summaries
+        chunk = ColumnSummary(True)
+        chunk.count = len(values)
+        chunk.mean = float(values.mean())
+        chunk.m2 = float(((values - chunk.mean) ** 2).sum())
+        chunk.min, chunk.max = float(values.min()), float(values.max())
+        self._combine_moments(chunk)
+        self.sketch.update(values)
+
+    def _combine_moments(self, other):
+        # Chan et al. pairwise update: exact for any split of the data
+        n = self.count + other.count
+        if n == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / n
+        self.m2 += other.m2 + delta * delta * self.count * other.count / n
+        self.count = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def merge(self, other):
+        self.missing += other.missing
+        self.distinct.merge(other.distinct)
+        if self.numeric and other.numeric:
+            self._combine_moments(other)
+            self.sketch.merge(other.sketch)
+        else:
+            self.count += other.count
+
+    def result(self):
+        row = {"count": self.count, "missing": self.missing, "distinct (≈)": round(self.distinct.estimate())}
+        if self.numeric:
+            row["mean"] = self.mean if self.count else np.nan
+            row["std"] = math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+            row["min"] = self.min if self.count else np.nan
+            quantiles = np.clip(self.sketch.quantiles(SUMMARY_QUANTILES), self.min, self.max)
+            row.update({f"{q:.0%}": v for q, v in zip(SUMMARY_QUANTILES, quantiles)})
+            row["max"] = self.max if self.count else np.nan
+        return row
+
+
+def column_plan(frame):
+    # Which columns are summarised as numbers; decided once (from the first chunk) for all workers
+    return {str(c): pd.api.types.is_numeric_dtype(frame[c]) and not pd.api.types.is_bool_dtype(frame[c])
+            for c in frame.columns}
+
+
+def summarize_chunks(chunks, plan=None):
+    summaries = None
+    for chunk in chunks:
+        chunk.columns = [str(c) for c in chunk.columns]
+        if summaries is None:
+            plan = plan or column_plan(chunk)
+            summaries = {c: ColumnSummary(numeric) for c, numeric in plan.items()}
+        for c, summary in summaries.items():
+            summary.update(chunk[c])
+    return summaries or {}
+
+
+def merge_summaries(parts):
+    parts = [p for p in parts if p]
+    if not parts:
+        return {}
+    merged = parts[0]
+    for part in parts[1:]:
+        for c, summary in part.items():
+            merged[c].merge(summary)
+    return merged
+
+
+def summarize_frame(df, chunk_rows=SUMMARY_CHUNK_ROWS):
+    return summarize_chunks(df.iloc[i:i + chunk_rows] for i in range(0, max(len(df), 1), chunk_rows))
+
+
+def summary_table(summaries):
+    # describe()-style table: statistics as rows, columns as columns
+    table = pd.DataFrame({c: s.result() for c, s in summaries.items()})
+    order = ["count", "missing", "distinct (≈)", "mean", "std", "min"] + [f"{q:.0%}" for q in SUMMARY_QUANTILES] + ["max"]
+    return table.reindex([r for r in order if r in table.index])
+
+
+# --- Chunked readers ---
+
+def read_excel_chunks(path, chunk_rows=SUMMARY_CHUNK_ROWS):
+    # openpyxl read-only mode streams rows instead of loading the workbook into memory
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_rows:
+                yield pd.DataFrame(batch, columns=columns).infer_objects()
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns).infer_objects()
+    finally:
+        workbook.close()
+
+
+class _ByteRange(io.RawIOBase):
+    # File-like view of bytes [start, stop) so each worker parses only its share of a CSV
+    def __init__(self, path, start, stop):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = stop - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), self._remaining)
+        data = self._file.read(n)
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def csv_byte_ranges(path, parts):
+    # Split a CSV body into about `parts` ranges that start and end on line boundaries
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        f.readline()  # header
+        body = f.tell()
+        bounds = [body]
+        for k in range(1, parts):
+            f.seek(max(body, size * k // parts))
+            f.readline()
+            bounds.append(max(f.tell(), bounds[-1]))
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def _summarize_csv_range(path, start, stop, columns, plan, chunk_rows, read_kwargs):
+    with io.BufferedReader(_ByteRange(path, start, stop)) as stream:
+        chunks = pd.read_csv(stream, header=None, names=columns, chunksize=chunk_rows, **read_kwargs)
+        return summarize_chunks(chunks, plan)
+
+
+def summarize_csv(path, chunk_rows=SUMMARY_CHUNK_ROWS, workers=1, **read_kwargs):
+    # Stream a CSV in chunks; with workers > 1 the file is split into line-aligned byte ranges
+    # summarised in a process pool and merged. (Byte ranges assume no newlines inside quoted fields.)
+    head = pd.read_csv(path, nrows=1000, **read_kwargs)
+    columns = list(head.columns)
+    plan = column_plan(head)
+    if workers <= 1 or os.path.getsize(path) < MIN_PARALLEL_BYTES:
+        return summarize_chunks(pd.read_csv(path, chunksize=chunk_rows, **read_kwargs), plan)
+
+    ranges = csv_byte_ranges(path, workers * 4)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = pool.map(_summarize_csv_range, *zip(*[(path, a, b, columns, plan, chunk_rows, read_kwargs) for a, b in ranges]))
+        return merge_summaries(list(parts))
+
+
+def summarize_file(path, chunk_rows=SUMMARY_CHUNK_ROWS, workers=1):
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        return summarize_chunks(read_excel_chunks(path, chunk_rows))
+    return summarize_csv(path, chunk_rows, workers)
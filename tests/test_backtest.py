@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from ai_tools import (FORECAST_MODELS, backtest, backtest_series, best_model_forecasts, best_models,
+                      rolling_origin_splits)
+
+
+def _panel(n_series=9, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for s in range(n_series):
+        years = np.arange(2000, 2000 + int(rng.integers(6, 16)))
+        values = rng.normal(10, 2) + rng.normal(0, 0.5) * (years - 2000) + rng.normal(0, 0.3, len(years))
+        rows += [{"Site": f"S{s}", "Year": y, "Value": v} for y, v in zip(years, values)]
+    return pd.DataFrame(rows)
+
+
+def test_rolling_origin_splits():
+    assert rolling_origin_splits(8, min_train=5) == [(5, 6), (6, 7), (7, 8)]
+    assert rolling_origin_splits(8, min_train=5, horizon=2) == [(5, 7), (6, 8), (7, 8)]
+    assert rolling_origin_splits(5, min_train=5) == []
+
+
+def test_backtest_series_matches_explicit_folds():
+    rng = np.random.default_rng(1)
+    x = np.arange(1990.0, 2002.0)
+    y = 0.4 * (x - 1990) + rng.normal(0, 0.2, len(x))
+    shuffled = rng.permutation(len(x))
+    rows = {r["Model"]: r for r in backtest_series(x[shuffled], y[shuffled], ["Linear"], horizon=2)}
+    errors = np.concatenate([np.polyval(np.polyfit(x[:o], y[:o], 1), x[o:s]) - y[o:s]
+                             for o, s in rolling_origin_splits(len(x), horizon=2)])
+    np.testing.assert_allclose(rows["Linear"]["RMSE"], np.sqrt(np.mean(errors ** 2)), rtol=1e-9)
+    np.testing.assert_allclose(rows["Linear"]["MAE"], np.mean(np.abs(errors)), rtol=1e-9)
+
+
+def test_theil_sen_matches_scipy():
+    rng = np.random.default_rng(2)
+    x, y = np.arange(12.0), rng.normal(0, 1, 12).cumsum()
+    slope, intercept = stats.theilslopes(y, x)[:2]
+    np.testing.assert_allclose(FORECAST_MODELS["Theil-Sen"](x, y, np.array([12.0, 13.0])),
+                               intercept + slope * np.array([12.0, 13.0]), rtol=1e-12)
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_process_pool_chunks_match_serial(workers):
+    # Series are dealt round-robin into chunks; the merged table must not depend on the split
+    df = _panel()
+    serial = backtest(df, "Site", "Year", "Value", horizon=2)
+    pooled = backtest(df, "Site", "Year", "Value", horizon=2, workers=workers)
+    pd.testing.assert_frame_equal(pooled, serial)
+    assert set(serial["Series"]) == set(df["Site"])
+    assert len(serial) == df["Site"].nunique() * len(FORECAST_MODELS)
+
+
+def test_short_series_are_skipped_and_single_series_runs():
+    df = pd.concat([_panel(2), pd.DataFrame({"Site": "short", "Year": [2000, 2001, 2002], "Value": [1.0, 2.0, 3.0]})])
+    metrics = backtest(df, "Site", "Year", "Value", models=["Linear"], workers=2)
+    assert "short" not in set(metrics["Series"])
+    single = backtest(df[df["Site"] == "S0"], None, "Year", "Value", models=["Linear"])
+    assert list(single["Series"]) == ["Series"]
+
+
+def test_best_models_and_forecasts():
+    df = _panel(4)
+    metrics = backtest(df, "Site", "Year", "Value")
+    best = best_models(metrics)
+    for sid, g in metrics.groupby("Series"):
+        assert best.set_index("Series").loc[sid, "Model"] == g.loc[g["RMSE"].idxmin(), "Model"]
+    forecasts = best_model_forecasts(df, "Site", "Year", "Value", best, steps=3)
+    assert list(forecasts.columns[-3:]) == ["Forecast +1", "Forecast +2", "Forecast +3"]
+    first = forecasts.iloc[0]
+    g = df[df["Site"] == first["Series"]]
+    x, y = g["Year"].to_numpy(float), g["Value"].to_numpy(float)
+    expected = FORECAST_MODELS[first["Model"]](x, y, x[-1] + np.arange(1, 4))
+    np.testing.assert_allclose(first[["Forecast +1", "Forecast +2", "Forecast +3"]].to_numpy(float), expected)
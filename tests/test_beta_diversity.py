@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from scipy import sparse
+from scipy.spatial.distance import pdist, squareform
+
+import cache_utils
+from botany_tools import pairwise_beta
+
+SCIPY_METRIC = {"Bray-Curtis": "braycurtis", "Jaccard": "jaccard"}
+
+
+def _counts(seed=0, plots=60, species=40):
+    rng = np.random.default_rng(seed)
+    counts = rng.poisson(2, (plots, species)) * (rng.random((plots, species)) < 0.3)
+    counts[5] = 0  # an empty plot
+    counts[6] = counts[7]  # two identical plots
+    return counts.astype(float)
+
+
+def _reference(counts, metric):
+    dense = counts > 0 if metric == "Jaccard" else counts
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dist = squareform(pdist(dense, SCIPY_METRIC[metric]))
+    return np.nan_to_num(dist)  # scipy gives NaN between two empty plots; the tool treats them as identical
+
+
+@pytest.mark.parametrize("metric", ["Bray-Curtis", "Jaccard"])
+def test_full_matrix_matches_scipy_pdist(tmp_path, metric):
+    counts = _counts()
+    # A small budget forces many row blocks
+    distances, _ = pairwise_beta(sparse.csr_matrix(counts), metric, nearest_k=0,
+                                 out_path=str(tmp_path / "beta.npy"), budget=60 * 8 * 3 * 7)
+    np.testing.assert_allclose(np.asarray(distances), _reference(counts, metric), atol=1e-6)
+
+
+@pytest.mark.parametrize("metric", ["Bray-Curtis", "Jaccard"])
+def test_nearest_plots_match_sorted_reference(metric):
+    counts = _counts(1)
+    reference = _reference(counts, metric)
+    np.fill_diagonal(reference, np.inf)
+    _, (index, dist) = pairwise_beta(sparse.csr_matrix(counts), metric, nearest_k=4, budget=60 * 8 * 3 * 9)
+    np.testing.assert_allclose(dist, np.sort(reference, axis=1)[:, :4], atol=1e-12)
+    np.testing.assert_allclose(np.take_along_axis(reference, index, axis=1), dist, atol=1e-12)
+    assert not (index == np.arange(len(counts))[:, None]).any()
+
+
+def test_process_pool_matches_serial(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_utils, "SCRATCH_DIR", str(tmp_path / "scratch"))
+    matrix = sparse.csr_matrix(_counts(2))
+    serial, (serial_index, serial_dist) = pairwise_beta(matrix, out_path=str(tmp_path / "a.npy"), budget=60 * 8 * 3 * 10)
+    pooled, (pool_index, pool_dist) = pairwise_beta(matrix, out_path=str(tmp_path / "b.npy"), workers=2,
+                                                    budget=60 * 8 * 3 * 10)
+    np.testing.assert_array_equal(np.asarray(pooled), np.asarray(serial))
+    np.testing.assert_array_equal(pool_dist, serial_dist)
+    assert not [f for f in (tmp_path / "scratch").iterdir() if f.name.startswith("beta_matrix_")]
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from botany_tools import (batch_diversity_table, bootstrap_diversity, diversity_from_matrix, diversity_indices,
+                          site_species_matrix)
+
+
+def _survey(seed=0, plots=30, species=12):
+    rng = np.random.default_rng(seed)
+    rows = [{"Plot": f"P{p:02d}", "Species": f"sp{s}", "Count": int(rng.integers(1, 40))}
+            for p in range(plots) for s in range(species) if rng.random() < 0.6]
+    return pd.DataFrame(rows)
+
+
+def test_site_species_matrix_sums_duplicates_and_drops_bad_rows():
+    df = pd.DataFrame({"plot": ["A", "A", "B", "B", None], "species": ["x", "x", "y", None, "x"],
+                       "count": [2, 3, "4", 1, 5]})
+    matrix, plots, species = site_species_matrix(df)
+    assert list(plots) == ["A", "B"] and list(species) == ["x", "y"]
+    np.testing.assert_array_equal(matrix.toarray(), [[5, 0], [0, 4]])
+
+
+def test_grouped_indices_match_single_plot_calculator():
+    df = _survey()
+    table = batch_diversity_table(df, replicates=0)
+    for plot, group in df.groupby("Plot"):
+        _, (H, D, J) = diversity_indices(group[["Species", "Count"]])
+        row = table.set_index("Plot").loc[plot]
+        np.testing.assert_allclose([row["Shannon (H')"], row["Simpson (1-D)"], row["Evenness (J)"]], [H, D, J], rtol=1e-12)
+        assert row["Richness (S)"] == len(group)
+        assert row["N"] == group["Count"].sum()
+
+
+def test_empty_plot_has_no_indices():
+    matrix = sparse.csr_matrix(np.array([[3.0, 1.0], [0.0, 0.0]]))
+    result = diversity_from_matrix(matrix)
+    assert result.iloc[0].notna().all()
+    assert result.iloc[1][["Shannon (H')", "Simpson (1-D)", "Evenness (J)"]].isna().all()
+    assert bootstrap_diversity(matrix, replicates=50).iloc[1].isna().all()
+
+
+def _bootstrap_reference(counts, replicates, seed):
+    # Plain per-plot multinomial resampling
+    rng = np.random.default_rng(seed)
+    n = int(counts.sum())
+    p = rng.multinomial(n, counts / n, size=replicates) / n
+    H = -np.sum(p * np.log(np.where(p > 0, p, 1)), axis=1)
+    return np.percentile(H, [2.5, 97.5])
+
+
+def test_bootstrap_matches_per_plot_resampling_and_is_chunk_independent():
+    matrix, _, _ = site_species_matrix(_survey(1, plots=8))
+    estimate = diversity_from_matrix(matrix)["Shannon (H')"].to_numpy()
+    whole = bootstrap_diversity(matrix, replicates=4000, seed=0)
+    chunked = bootstrap_diversity(matrix, replicates=4000, seed=1, budget=1)  # one plot per chunk
+    for i, counts in enumerate(matrix.toarray()):
+        reference = _bootstrap_reference(counts[counts > 0], 4000, seed=2 + i)
+        for result in (whole, chunked):
+            low, high = result.loc[i, ["Shannon (H') Low", "Shannon (H') High"]]
+            np.testing.assert_allclose([low, high], reference, atol=0.03)
+            assert low <= estimate[i] + 0.05 and high >= estimate[i] - 0.2  # resampled H' is biased low
+
+
+def test_single_species_plot_has_zero_width_interval():
+    result = bootstrap_diversity(sparse.csr_matrix(np.array([[25.0, 0.0]])), replicates=100)
+    assert (result.to_numpy() == 0).all()
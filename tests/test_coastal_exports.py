@@ -0,0 +1,55 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+
+import cache_utils
+import coastal_tools
+from cache_utils import make_key
+
+
+@pytest.fixture
+def scratch(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_utils, "SCRATCH_DIR", str(tmp_path / "scratch"))
+    for namespace in ("ndwi", "ndwi_export"):
+        cache_utils.get_cache(namespace).clear()
+    return tmp_path
+
+
+def _read_tiled(path):
+    with open(path, "rb") as f:
+        assert f.read(4) == coastal_tools.TILED_MAGIC
+        (length,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length))
+    out = np.empty(header["shape"], dtype=header["dtype"])
+    for i, (r0, c0, h, w, _) in enumerate(header["tiles"]):
+        out[r0:r0 + h, c0:c0 + w] = coastal_tools.read_tiled_tile(path, i)
+    return out
+
+
+READERS = {
+    "NumPy (.npy)": lambda path: np.load(path),
+    "Compressed NumPy (.npz)": lambda path: np.load(path)["ndwi"],
+    "Tiled Binary (.ndwt)": _read_tiled,
+    "CSV (streamed)": lambda path: np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2),
+}
+
+
+@pytest.mark.parametrize("fmt", list(coastal_tools.EXPORT_FORMATS))
+def test_binary_band_export_round_trip(scratch, fmt):
+    rng = np.random.default_rng(0)
+    green_path, nir_path = scratch / "green.npy", scratch / "nir.npy"
+    np.save(green_path, rng.random((300, 270)).astype(np.float32))
+    np.save(nir_path, rng.random((300, 270)).astype(np.float32))
+
+    # Same key derivation as the binary-band branch of the viewer
+    ndwi_path = coastal_tools.compute_ndwi_files(str(green_path), str(nir_path))
+    ndwi = np.load(ndwi_path, mmap_mode="r")
+    path, size, _ = coastal_tools.export_raster(ndwi, make_key(ndwi_path), fmt)
+
+    assert size > 0
+    restored = READERS[fmt](path)
+    assert restored.shape == ndwi.shape
+    atol = 0.5e-3 if fmt == "CSV (streamed)" else 0
+    np.testing.assert_allclose(restored, ndwi, atol=atol, rtol=0)
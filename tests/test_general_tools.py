@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from general_tools import BIN_RULES, MAX_HIST_BINS, frame_summary, histogram_bins
+
+
+def test_in_memory_summary_is_exact():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"site": rng.choice(["A", "B", "C", None], 1000), "depth": rng.lognormal(2, 1, 1000),
+                       "count": rng.integers(0, 30, 1000)})
+    df.loc[::7, "depth"] = np.nan
+    table = frame_summary(df)
+    described = df.describe()
+    for column in ("depth", "count"):
+        for stat in ("count", "mean", "std", "min", "25%", "50%", "75%", "max"):
+            assert table.loc[stat, column] == described.loc[stat, column]
+        assert table.loc["distinct", column] == df[column].nunique()
+        assert table.loc["99%", column] == df[column].quantile(0.99)
+    assert table.loc["missing", "depth"] == df["depth"].isna().sum()
+    assert table.loc["distinct", "site"] == 3 and np.isnan(table.loc["mean", "site"])
+
+
+def test_histogram_bins_follow_numpy_rules():
+    values = np.random.default_rng(1).gamma(2.0, 3.0, 5000)
+    for rule in BIN_RULES:
+        counts, edges = histogram_bins(pd.Series(values), rule)
+        expected_counts, expected_edges = np.histogram(values, bins=rule)
+        assert len(edges) == len(expected_edges), rule
+        np.testing.assert_allclose(edges, expected_edges)
+        np.testing.assert_array_equal(counts, expected_counts)
+
+
+def test_histogram_bins_are_capped_before_the_edges_are_built():
+    # A tight cluster plus one far outlier asks "fd" for about 10^11 bins
+    values = np.append(np.random.default_rng(2).normal(0, 1e-3, 10_000), 1e6)
+    counts, edges = histogram_bins(pd.Series(values), "fd")
+    assert len(counts) == MAX_HIST_BINS and counts.sum() == len(values)
+    counts, edges = histogram_bins(pd.Series(["1", 1, "x", None, 1]), "auto")
+    assert counts.sum() == 3 and len(edges) == 2
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from geology_tools import FW_PERCENTILES, batch_phi_percentiles, folk_ward_batch, folk_ward_from_matrix
+
+SIZES_MM = np.array([2.0, 1.0, 0.5, 0.25, 0.125, 0.0625, 0.03125, 0.015])
+
+
+def _reference(sizes_mm, weights):
+    # Per-sample Folk & Ward with np.interp, as the single-sample tool computes it
+    phi = -np.log2(sizes_mm)
+    order = np.argsort(phi)
+    cumulative = np.cumsum(weights[order]) / weights.sum() * 100
+    p5, p16, p25, p50, p75, p84, p95 = (np.interp(p, cumulative, phi[order]) for p in FW_PERCENTILES)
+    return [
+        (p16 + p50 + p84) / 3,
+        (p84 - p16) / 4 + (p95 - p5) / 6.6,
+        (p16 + p84 - 2 * p50) / (2 * (p84 - p16)) + (p5 + p95 - 2 * p50) / (2 * (p95 - p5)),
+        (p95 - p5) / (2.44 * (p75 - p25)),
+    ]
+
+
+def test_batch_percentiles_match_np_interp():
+    rng = np.random.default_rng(0)
+    phi = np.sort(rng.uniform(-2, 8, 12))
+    cumulative = np.cumsum(rng.uniform(0.1, 5, (50, 12)), axis=1)
+    cumulative = cumulative / cumulative[:, -1:] * 100
+    expected = np.array([[np.interp(p, row, phi) for p in FW_PERCENTILES] for row in cumulative])
+    np.testing.assert_allclose(batch_phi_percentiles(phi, cumulative), expected, rtol=0, atol=1e-12)
+
+
+def test_folk_ward_matrix_matches_per_sample_reference():
+    rng = np.random.default_rng(1)
+    weights = rng.uniform(0.5, 40, (25, SIZES_MM.size))
+    results = folk_ward_from_matrix(SIZES_MM, weights)
+    expected = np.array([_reference(SIZES_MM, w) for w in weights])
+    np.testing.assert_allclose(results.iloc[:, 1:].to_numpy(dtype=float), expected, rtol=1e-12)
+
+
+def test_empty_sample_gives_nan_row():
+    weights = np.vstack([np.ones(SIZES_MM.size), np.zeros(SIZES_MM.size)])
+    results = folk_ward_from_matrix(SIZES_MM, weights)
+    assert results.iloc[0, 1:].notna().all()
+    assert results.iloc[1, 1:].isna().all()
+
+
+def test_long_and_wide_formats_agree():
+    rng = np.random.default_rng(2)
+    weights = rng.uniform(1, 30, (3, SIZES_MM.size))
+    wide = pd.DataFrame({"Grain Size (mm)": SIZES_MM, **{f"S{i}": w for i, w in enumerate(weights)}})
+    wide["Notes"] = "sieve"
+    long = pd.DataFrame([{"sample_id": f"S{i}", "size_mm": s, "weight": w}
+                         for i, row in enumerate(weights) for s, w in zip(SIZES_MM, row)])
+    from_wide = folk_ward_batch(wide)
+    from_long = folk_ward_batch(long)
+    assert list(from_wide["Sample ID"]) == ["S0", "S1", "S2"]
+    np.testing.assert_allclose(from_wide.iloc[:, 1:].to_numpy(dtype=float),
+                               from_long.iloc[:, 1:].to_numpy(dtype=float), rtol=1e-12)
+
+
+def test_single_size_class_is_rejected():
+    with pytest.raises(ValueError):
+        batch_phi_percentiles(np.array([1.0]), np.array([[100.0]]))
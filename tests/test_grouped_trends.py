@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from ai_tools import fit_grouped_trends, forecast_grouped, grouped_trends_from_frame
+
+
+def _panel(seed=0, n_series=40):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for s in range(n_series):
+        years = rng.choice(np.arange(1950, 2030), size=int(rng.integers(3, 30)), replace=False)
+        values = rng.normal(0, 5) + rng.normal(0, 0.3) * (years - 1990) + rng.normal(0, 1, len(years))
+        rows += [{"station": f"S{s:03d}", "year": y, "value": v} for y, v in zip(years, values)]
+    return pd.DataFrame(rows).sample(frac=1, random_state=seed)  # rows of a series are not contiguous
+
+
+def test_grouped_ols_matches_polyfit_per_series():
+    df = _panel()
+    series, trends = grouped_trends_from_frame(df)
+    for i, sid in enumerate(series):
+        g = df[df["station"] == sid]
+        slope, intercept = np.polyfit(g["year"], g["value"], 1)
+        np.testing.assert_allclose([trends["slope"][i], trends["intercept"][i]], [slope, intercept], rtol=1e-9, atol=1e-7)
+        r = np.corrcoef(g["year"], g["value"])[0, 1]
+        np.testing.assert_allclose(trends["r2"][i], r * r, rtol=1e-9)
+        assert trends["n"][i] == len(g)
+        assert trends["last_year"][i] == g["year"].max()
+
+
+def test_large_year_values_keep_precision():
+    # A tiny slope on top of huge x values: the naive sum-of-products form loses it
+    years = np.arange(1_000_000, 1_000_020, dtype=float)
+    values = 3.0 + 1e-6 * (years - years[0])
+    trends = fit_grouped_trends(np.zeros(len(years), dtype=int), years, values)
+    np.testing.assert_allclose(trends["slope"][0], 1e-6, rtol=1e-6)
+    np.testing.assert_allclose(trends["r2"][0], 1.0, rtol=1e-9)
+
+
+def test_degenerate_series():
+    codes = np.array([0, 0, 1, 1, 1])
+    years = np.array([2000, 2000, 2001, 2002, 2003], dtype=float)
+    values = np.array([1.0, 2.0, 5.0, 5.0, 5.0])
+    trends = fit_grouped_trends(codes, years, values, n_series=3)
+    assert np.isnan(trends["slope"][0]) and np.isnan(trends["r2"][0])  # one distinct year
+    assert trends["slope"][1] == 0 and trends["r2"][1] == 1  # flat series is a perfect fit
+    assert trends["n"][2] == 0
+
+
+def test_forecast_continues_each_series_from_its_last_year():
+    trends = fit_grouped_trends([0, 0, 1, 1], [2000, 2001, 1990, 1995], [1.0, 2.0, 10.0, 0.0])
+    years, predictions = forecast_grouped(trends, 2)
+    np.testing.assert_array_equal(years, [[2002, 2003], [1996, 1997]])
+    np.testing.assert_allclose(predictions, [[3, 4], [-2, -4]])
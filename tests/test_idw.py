@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from scipy.spatial import cKDTree
+
+from visual_3d_tools import grid_axes, idw_grid
+
+
+def _brute_force(xy, z, gx, gy, k, power, radius):
+    cx, cy = np.meshgrid(gx, gy)
+    cells = np.column_stack([cx.ravel(), cy.ravel()])
+    out = np.full(len(cells), np.nan)
+    for i, cell in enumerate(cells):
+        dist = np.hypot(*(xy - cell).T)
+        nearest = np.argsort(dist)[:k]
+        nearest = nearest[dist[nearest] <= radius] if radius else nearest
+        if not len(nearest):
+            continue
+        d = dist[nearest]
+        if (d == 0).any():
+            out[i] = z[nearest[d == 0]].mean()
+            continue
+        w = 1 / d ** power
+        out[i] = (w * z[nearest]).sum() / w.sum()
+    return out.reshape(len(gy), len(gx))
+
+
+@pytest.mark.parametrize("k,power,radius", [(1, 2.0, None), (6, 2.0, None), (8, 1.0, 6.0), (4, 3.0, 2.5)])
+def test_idw_matches_brute_force(k, power, radius):
+    rng = np.random.default_rng(k)
+    xy = rng.uniform(0, 50, (400, 2))
+    xy[-1] = [10.5, 10.5]  # a point exactly on a cell centre takes that cell
+    z = np.sin(xy[:, 0] / 7) * 20 + xy[:, 1]
+    gx, gy = grid_axes(np.zeros(3), np.array([50.0, 40.0, 0.0]), 1.0)
+    # Small tiles spread the rows over several thread-pool tasks
+    grid = idw_grid(cKDTree(xy), z, gx, gy, k=k, power=power, radius=radius, tile=8, workers=3)
+    expected = _brute_force(xy, z, gx, gy, k, power, radius)
+    np.testing.assert_array_equal(np.isnan(grid), np.isnan(expected))
+    np.testing.assert_allclose(grid, expected, rtol=1e-5, equal_nan=True)
+    assert grid[10, 10] == np.float32(z[-1])
+
+
+def test_grid_axes_cover_the_extent():
+    gx, gy = grid_axes(np.array([100.0, 200.0]), np.array([103.0, 200.5]), 1.0)
+    np.testing.assert_allclose(gx, [100.5, 101.5, 102.5])
+    np.testing.assert_allclose(gy, [200.5])
+
+
+def test_fewer_points_than_neighbours():
+    xy = np.array([[0.0, 0.0], [2.0, 0.0]])
+    grid = idw_grid(cKDTree(xy), np.array([1.0, 3.0]), np.array([1.0]), np.array([0.0]), k=8)
+    np.testing.assert_allclose(grid, [[2.0]])
@@ -0,0 +1,38 @@
+import numpy as np
+
+from cache_utils import value_nbytes
+from visual_3d_tools import build_octree, gather_points, lod_select, open_las, reduce_points, write_las
+
+
+def _las_cloud(tmp_path, n=60_000):
+    xyz = np.random.default_rng(0).uniform([0, 0, 0], [200, 100, 30], (n, 3))
+    path = str(tmp_path / "cloud.las")
+    write_las(path, xyz, scale=0.001)
+    return open_las(path)["xyz"]
+
+
+def test_tree_keeps_no_copy_of_the_points(tmp_path):
+    xyz = _las_cloud(tmp_path)
+    tree = build_octree(xyz)
+    assert tree["xyz"] is xyz  # still the memory-mapped columns
+    assert value_nbytes(tree) == sum(tree[k].nbytes for k in ("codes", "order", "lo", "hi"))
+    assert tree["order"].dtype == np.int32
+    np.testing.assert_array_equal(np.diff(tree["codes"].astype(np.float64)) >= 0, True)
+
+
+def test_lod_points_match_a_dense_reference(tmp_path):
+    xyz = _las_cloud(tmp_path)
+    tree = build_octree(xyz)
+    dense = xyz[:][tree["order"]]
+    box = (np.array([20.0, 10.0, 0.0]), np.array([150.0, 80.0, 25.0]))
+    rows, starts, level = lod_select(tree, 2000, box)
+    inside = np.flatnonzero(np.all((dense >= box[0]) & (dense <= box[1]), axis=1))
+    np.testing.assert_array_equal(rows, inside)
+    assert level is not None and len(starts) <= 2000
+
+    counts = np.diff(np.append(starts, len(rows)))
+    expected = np.add.reduceat(dense[rows], starts, axis=0) / counts[:, None]
+    # Small chunks put cell boundaries in the middle of chunks
+    np.testing.assert_allclose(reduce_points(tree, rows, starts, chunk_rows=777), expected, rtol=1e-12)
+    np.testing.assert_allclose(reduce_points(tree, rows, None), dense[rows])
+    np.testing.assert_allclose(gather_points(tree, rows[:5]), dense[rows[:5]])
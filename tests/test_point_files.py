@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from visual_3d_tools import (ScaledXYZ, attribute_values, convert_xyz_text, open_las, open_point_npy,
+                             open_point_records, point_bounds, read_las_header, write_las)
+
+
+def _cloud(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform([500_000, 4_200_000, 10], [501_000, 4_201_000, 250], (n, 3))
+
+
+def test_las_round_trip(tmp_path):
+    xyz = _cloud()
+    intensity = np.arange(len(xyz)) % 65535
+    classification = np.arange(len(xyz)) % 7
+    path = str(tmp_path / "cloud.las")
+    write_las(path, xyz, intensity=intensity, classification=classification, scale=0.01)
+
+    header = read_las_header(path)
+    assert header["version"] == "1.2" and header["point_format"] == 0
+    assert header["record_length"] == 20 and header["count"] == len(xyz)
+    np.testing.assert_array_equal(header["scale"], [0.01] * 3)
+    np.testing.assert_array_equal(header["offset"], np.floor(xyz.min(axis=0)))
+    np.testing.assert_allclose(header["min"], xyz.min(axis=0))
+    np.testing.assert_allclose(header["max"], xyz.max(axis=0))
+
+    cloud = open_las(path)
+    assert isinstance(cloud["xyz"], ScaledXYZ) and cloud["xyz"].shape == xyz.shape
+    np.testing.assert_allclose(cloud["xyz"][:], xyz, atol=0.005 + 1e-9)
+    np.testing.assert_allclose(cloud["xyz"][10:20, 2], xyz[10:20, 2], atol=0.005 + 1e-9)
+    lo, hi = point_bounds(cloud["xyz"])
+    np.testing.assert_allclose(lo, xyz.min(axis=0), atol=0.005)
+    np.testing.assert_allclose(hi, xyz.max(axis=0), atol=0.005)
+    rows = np.array([0, 3, 4999])
+    np.testing.assert_array_equal(attribute_values(cloud["attributes"]["Intensity"], rows), intensity[rows])
+    np.testing.assert_array_equal(attribute_values(cloud["attributes"]["Classification"], rows), classification[rows])
+    np.testing.assert_array_equal(attribute_values(cloud["attributes"]["Return Number"], rows), [1, 1, 1])
+
+
+def test_las_rejects_other_files(tmp_path):
+    path = tmp_path / "cloud.las"
+    write_las(str(path), _cloud(10))
+    data = bytearray(path.read_bytes())
+    data[104] |= 0x80  # LAZ-compressed point format flag
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="LAZ"):
+        read_las_header(str(path))
+    path.write_bytes(b"PK\x03\x04" + bytes(400))
+    with pytest.raises(ValueError, match="not a LAS file"):
+        read_las_header(str(path))
+
+
+def test_npy_inputs(tmp_path):
+    xyz = _cloud(100)
+    plain = tmp_path / "plain.npy"
+    np.save(plain, np.column_stack([xyz, np.arange(100)]))
+    cloud = open_point_npy(str(plain))
+    np.testing.assert_array_equal(cloud["xyz"][:], xyz)
+    assert list(cloud["attributes"]) == ["Column 4"]
+
+    records = np.zeros(100, dtype=[("X", "<f8"), ("Y", "<f8"), ("Z", "<f8"), ("class", "u1")])
+    records["X"], records["Y"], records["Z"] = xyz.T
+    np.save(tmp_path / "structured.npy", records)
+    cloud = open_point_npy(str(tmp_path / "structured.npy"))
+    np.testing.assert_array_equal(cloud["xyz"][:], xyz)
+    assert cloud["attributes"]["class"]["categorical"]
+
+
+@pytest.mark.parametrize("header_row", [True, False])
+def test_xyz_text_conversion_round_trip(tmp_path, header_row):
+    xyz = _cloud(2500, seed=1)
+    text = tmp_path / "cloud.xyz"
+    np.savetxt(text, np.column_stack([xyz, np.arange(2500)]), fmt="%.3f", delimiter=",",
+               header="X,Y,Z,Intensity" if header_row else "", comments="")
+    out = str(tmp_path / "cloud.f32")
+    header = convert_xyz_text(str(text), out, chunk_rows=700)  # several chunks
+    cloud = open_point_records(out, header)
+    assert header["count"] == 2500
+    # float32 records relative to the offset keep millimetres on UTM-sized coordinates
+    np.testing.assert_allclose(cloud["xyz"][:], np.round(xyz, 3), atol=2e-4)
+    name = "Intensity" if header_row else "attr_1"
+    np.testing.assert_array_equal(attribute_values(cloud["attributes"][name], slice(None)), np.arange(2500))
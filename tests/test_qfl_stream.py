@@ -0,0 +1,44 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from qfl_mia_tool import FULL_COMPONENTS, compute_full_qfl, stream_qfl_mia
+
+
+def _survey(n=2000):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.uniform(1, 50, (n, len(FULL_COMPONENTS))).round(2), columns=[c.upper() for c in FULL_COMPONENTS])
+    df.insert(0, "Sample", [f"S{i}" for i in range(n)])
+    return df
+
+
+def _check(summary, reference):
+    assert summary["rows"] == len(reference)
+    np.testing.assert_allclose([summary["total_q"], summary["total_f"], summary["total_l"]],
+                               reference[["q", "f", "l"]].sum().to_numpy(), rtol=1e-5)
+    np.testing.assert_allclose(summary["average_mia"], reference["mia"].mean(), rtol=1e-5)
+
+
+def test_stream_matches_in_memory_calculation(tmp_path):
+    df = _survey()
+    source = io.BytesIO(df.to_csv(index=False).encode())
+    source.read(100)  # an upload that was already read from must still start at the header
+    summary, preview = stream_qfl_mia(source, str(tmp_path / "out.csv"), chunksize=333)
+    reference = compute_full_qfl(df.rename(columns=str.lower).astype(dict.fromkeys(FULL_COMPONENTS, "float32")))
+    _check(summary, reference)
+    assert summary["dropped"] == 0 and len(preview) == 1000
+    assert len(pd.read_csv(tmp_path / "out.csv")) == len(df)
+
+
+def test_text_cells_drop_their_rows(tmp_path):
+    df = _survey().astype({"QM": object})
+    df.loc[[5, 1500], "QM"] = "n/a?"
+    df.loc[700, "LV"] = np.nan
+    source = io.BytesIO(df.to_csv(index=False).encode())
+    summary, _ = stream_qfl_mia(source, str(tmp_path / "out.csv"), chunksize=333)
+    kept = df.drop(index=[5, 700, 1500]).rename(columns=str.lower)
+    reference = compute_full_qfl(kept.astype(dict.fromkeys(FULL_COMPONENTS, "float32")))
+    _check(summary, reference)
+    assert summary["dropped"] == 3
+    assert len(pd.read_csv(tmp_path / "out.csv")) == len(df) - 3
@@ -0,0 +1,47 @@
+from math import comb
+
+import numpy as np
+from scipy import sparse
+
+from botany_tools import effort_grid, hurlbert_rarefaction, mao_tau
+
+
+def test_hurlbert_hand_worked_examples():
+    # Plot 1: counts (2, 1), N = 3.  E[S_2] = (1 - C(1,2)/C(3,2)) + (1 - C(2,2)/C(3,2)) = 1 + 2/3
+    # Plot 2: counts (3, 1, 1, 1), N = 6.  E[S_2] = (1 - 3/15) + 3 * (1 - 10/15) = 1.8
+    matrix = sparse.csr_matrix(np.array([[2, 1, 0, 0], [3, 1, 1, 1]], dtype=float))
+    expected = hurlbert_rarefaction(matrix, [1, 2, 3, 6])
+    np.testing.assert_allclose(expected[0, :3], [1, 5 / 3, 2], rtol=1e-12)
+    assert np.isnan(expected[0, 3])  # more individuals than the plot holds
+    np.testing.assert_allclose(expected[1], [1, 1.8, 1 - 1 / 20 + 3 * 0.5, 4], rtol=1e-12)
+
+
+def test_hurlbert_matches_exact_binomials_on_large_plots():
+    rng = np.random.default_rng(0)
+    counts = rng.integers(0, 60, (5, 30)) * (rng.random((5, 30)) < 0.5)
+    sizes = np.array([1, 7, 50, 200])
+    # A tiny budget splits the sizes into one chunk each
+    result = hurlbert_rarefaction(sparse.csr_matrix(counts.astype(float)), sizes, budget=1)
+    for i, row in enumerate(counts):
+        N = int(row.sum())
+        for k, n in enumerate(sizes):
+            reference = sum(1 - comb(N - int(c), int(n)) / comb(N, int(n)) for c in row if c > 0)
+            np.testing.assert_allclose(result[i, k], reference, rtol=1e-9)
+
+
+def test_mao_tau_hand_worked_example():
+    # Plots {a, b}, {a}, {c}: a is found in 2 plots, b and c in 1 (s_1 = 2, s_2 = 1)
+    presence = np.array([[1, 1, 0], [1, 0, 0], [0, 0, 1]])
+    curve = mao_tau(sparse.csr_matrix(presence))
+    # Averages over every subset of t plots: t = 1 -> (2 + 1 + 1) / 3, t = 2 -> (2 + 3 + 2) / 3
+    np.testing.assert_allclose(curve["Expected Species"], [4 / 3, 7 / 3, 3], rtol=1e-12)
+    # Chao2 = 3 + 2^2 / (2 * 1) = 5;  t = 1: (1/3)^2 * 2 + (2/3)^2 * 1 - (4/3)^2 / 5 = 14/45
+    np.testing.assert_allclose(curve["SD"].iloc[0], np.sqrt(14 / 45), rtol=1e-12)
+    # Unconditional variance (Colwell et al. 2004) stays open at t = T: s_obs - s_obs^2 / Chao2
+    np.testing.assert_allclose(curve["SD"].iloc[-1], np.sqrt(3 - 9 / 5), rtol=1e-12)
+
+
+def test_effort_grid():
+    np.testing.assert_array_equal(effort_grid(5), [1, 2, 3, 4, 5])
+    grid = effort_grid(10_000, points=50)
+    assert grid[0] == 1 and grid[-1] == 10_000 and len(grid) == 50 and (np.diff(grid) > 0).all()
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from soil_tools import TEXTURE_CLASSES, UNCLASSIFIED, classify_soil_texture, texture_lattice, usda_texture_codes
+
+
+def _integer_triangle():
+    sand, clay = np.meshgrid(np.arange(101), np.arange(101), indexing="ij")
+    keep = sand + clay <= 100
+    sand, clay = sand[keep].astype(float), clay[keep].astype(float)
+    return sand, 100 - sand - clay, clay
+
+
+def test_lattice_matches_per_point_rules_on_every_integer_composition():
+    # Integer percentages land exactly on every class boundary of the triangle
+    sand, silt, clay = _integer_triangle()
+    expected = usda_texture_codes(sand, silt, clay)
+    df = pd.DataFrame({"Sand": sand, "Silt": silt, "Clay": clay})
+    result, _ = classify_soil_texture(df)
+    codes = result["Texture Class"].cat.codes.to_numpy()
+    np.testing.assert_array_equal(np.where(codes < 0, UNCLASSIFIED, codes), expected)
+
+
+def test_every_composition_gets_a_class():
+    lattice = texture_lattice()
+    n = lattice.shape[0]
+    sand, clay = np.meshgrid(np.arange(n), np.arange(n), indexing="ij")
+    assert (lattice[sand + clay < n] != UNCLASSIFIED).all()
+    assert (lattice[sand + clay >= n] == UNCLASSIFIED).all()
+
+
+def test_textbook_samples():
+    df = pd.DataFrame({
+        "Sand": [40, 92, 5, 20, 60, 10, 65, 30],
+        "Silt": [40, 4, 85, 20, 30, 60, 10, 35],
+        "Clay": [20, 4, 10, 60, 10, 30, 25, 35],
+    })
+    result, summary = classify_soil_texture(df)
+    assert list(result["Texture Class"]) == [
+        "Loam", "Sand", "Silt", "Clay", "Sandy Loam", "Silty Clay Loam", "Sandy Clay Loam", "Clay Loam",
+    ]
+    assert summary["Samples"].sum() == len(df)
+
+
+def test_off_total_rows_are_renormalised_or_left_unclassified():
+    df = pd.DataFrame({"sand": [20, 20, -5, None], "silt": [20, 20, 50, 50], "clay": [10, 10, 55, 50]})
+    renormalised, _ = classify_soil_texture(df)
+    assert renormalised["Check"].tolist() == ["Renormalised", "Renormalised", "Invalid", "Invalid"]
+    # 20/20/10 scaled to 100 % is 40/40/20
+    assert renormalised["Texture Class"].iloc[0] == "Loam"
+    strict, _ = classify_soil_texture(df, renormalise=False)
+    assert strict["Check"].iloc[0] == "Off Total"
+    assert strict["Texture Class"].isna().all()
+    assert set(strict["Texture Class"].cat.categories) == set(TEXTURE_CLASSES)
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import stream_stats
+from stream_stats import (HyperLogLog, QuantileSketch, SKETCH_ACCURACY, csv_byte_ranges, merge_summaries, summarize_chunks,
+                          summarize_csv, summarize_frame)
+
+
+def _frame(n=20_000, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.lognormal(3, 1.5, n) * np.where(rng.random(n) < 0.2, -1, 1) + 1e6  # large offset tests stability
+    values[rng.random(n) < 0.05] = np.nan
+    return pd.DataFrame({"value": values, "site": rng.choice([f"S{i}" for i in range(300)], n),
+                         "count": rng.integers(0, 50, n)})
+
+
+def _assert_same_moments(summary, values):
+    values = values[np.isfinite(values)]
+    assert summary.count == len(values)
+    np.testing.assert_allclose(summary.mean, values.mean(), rtol=1e-13)
+    np.testing.assert_allclose(np.sqrt(summary.m2 / (summary.count - 1)), values.std(ddof=1), rtol=1e-9)
+    assert (summary.min, summary.max) == (values.min(), values.max())
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 37, 999, 50_000])
+def test_chunked_moments_match_numpy(chunk_rows):
+    df = _frame(500 if chunk_rows == 1 else 20_000)
+    summaries = summarize_frame(df, chunk_rows=chunk_rows)
+    _assert_same_moments(summaries["value"], df["value"].to_numpy())
+    assert summaries["value"].missing == df["value"].isna().sum()
+    assert summaries["site"].count == len(df) and not summaries["site"].numeric
+
+
+def test_merging_parts_equals_one_pass():
+    df = _frame(seed=1)
+    whole = summarize_chunks([df.copy()])
+    cuts = [0, 3, 4000, 4001, 12_345, len(df)]
+    parts = [summarize_chunks([df.iloc[a:b].copy()]) for a, b in zip(cuts[:-1], cuts[1:])]
+    merged = merge_summaries(parts)
+    for column in df.columns:
+        a, b = merged[column], whole[column]
+        assert (a.count, a.missing) == (b.count, b.missing)
+        np.testing.assert_array_equal(a.distinct.registers, b.distinct.registers)
+        if a.numeric:
+            np.testing.assert_allclose([a.mean, a.m2], [b.mean, b.m2], rtol=1e-12)
+            assert (a.min, a.max) == (b.min, b.max)
+            assert a.sketch.positive == b.sketch.positive and a.sketch.negative == b.sketch.negative
+            assert a.sketch.zeros == b.sketch.zeros
+
+
+def test_sketch_quantiles_within_relative_accuracy():
+    rng = np.random.default_rng(2)
+    values = np.concatenate([rng.lognormal(0, 2, 50_000), -rng.lognormal(1, 1, 20_000), np.zeros(500)])
+    sketch = QuantileSketch()
+    for part in np.array_split(rng.permutation(values), 9):
+        sketch.update(part)
+    qs = [0.001, 0.01, 0.25, 0.5, 0.75, 0.99, 0.999]
+    for q, estimate in zip(qs, sketch.quantiles(qs)):
+        low, high = np.quantile(values, q, method="lower"), np.quantile(values, q, method="higher")
+        tolerance = SKETCH_ACCURACY * max(abs(low), abs(high)) + 1e-12
+        assert low - tolerance <= estimate <= high + tolerance
+
+
+@pytest.mark.parametrize("distinct", [10, 1000, 200_000])
+def test_hyperloglog_estimates_and_merges(distinct):
+    values = np.arange(distinct).repeat(3)
+    whole, left, right = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    whole.update(values)
+    left.update(values[::2])
+    right.update(values[1::2])
+    left.merge(right)
+    np.testing.assert_array_equal(left.registers, whole.registers)
+    assert abs(whole.estimate() - distinct) <= max(1, 0.03 * distinct)
+
+
+def test_byte_ranges_cover_every_line_once(tmp_path):
+    path = tmp_path / "data.csv"
+    _frame(5000).to_csv(path, index=False)
+    ranges = csv_byte_ranges(str(path), 7)
+    data = path.read_bytes()
+    assert ranges[0][0] == data.index(b"\n") + 1 and ranges[-1][1] == len(data)
+    assert all(a == b for (_, a), (b, _) in zip(ranges[:-1], ranges[1:]))
+    assert all(data[a - 1:a] == b"\n" for a, _ in ranges)
+
+
+def test_parallel_csv_matches_serial(tmp_path, monkeypatch):
+    path = tmp_path / "data.csv"
+    df = _frame(30_000, seed=3)
+    df.to_csv(path, index=False)
+    serial = summarize_csv(str(path), chunk_rows=4000)
+    monkeypatch.setattr(stream_stats, "MIN_PARALLEL_BYTES", 0)
+    parallel = summarize_csv(str(path), chunk_rows=4000, workers=2)
+    for column in df.columns:
+        assert (parallel[column].count, parallel[column].missing) == (serial[column].count, serial[column].missing)
+        np.testing.assert_array_equal(parallel[column].distinct.registers, serial[column].distinct.registers)
+    np.testing.assert_allclose(parallel["value"].mean, serial["value"].mean, rtol=1e-12)
+    _assert_same_moments(parallel["value"], pd.read_csv(path)["value"].to_numpy())
@@ -0,0 +1,107 @@
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cache_utils
+
+
+class Upload(io.BytesIO):
+    # Stand-in for Streamlit's UploadedFile
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_utils, "UPLOAD_CACHE_DIR", str(tmp_path / "uploads"))
+    cache_utils.get_cache("uploads", max_bytes=cache_utils.UPLOAD_MEMORY_MAX_BYTES).clear()
+    cache_utils._upload_timings.clear()
+    return tmp_path / "uploads"
+
+
+def _csv(seed=0, rows=500):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"site": rng.choice(["Alpha", "Beta", "Gamma, Ltd"], rows), "depth": rng.random(rows),
+                       "count": rng.integers(0, 100, rows), "note": np.where(rng.random(rows) < 0.3, None, "ok")})
+    return df.to_csv(index=False).encode()
+
+
+@pytest.mark.parametrize("arrow", [True, False])
+def test_disk_copy_round_trips(upload_dir, monkeypatch, arrow):
+    if arrow and not cache_utils.HAS_ARROW:
+        pytest.skip("pyarrow not installed")
+    monkeypatch.setattr(cache_utils, "HAS_ARROW", arrow)
+    data = _csv()
+    parsed = cache_utils.read_upload(Upload(data, "survey.csv"))
+    cache_utils.get_cache("uploads").clear()  # force the next read to come from disk
+    loaded = cache_utils.read_upload(Upload(data, "survey.csv"))
+
+    pd.testing.assert_frame_equal(loaded, parsed)
+    pd.testing.assert_frame_equal(loaded, pd.read_csv(io.BytesIO(data)))
+    (entry,) = os.listdir(upload_dir)
+    assert ("data.feather" in os.listdir(upload_dir / entry)) == arrow
+    report = cache_utils.upload_cache_report()
+    assert report["Format"].iloc[0] == ("feather" if arrow else "npy") and report["Cache Load (s)"].notna().all()
+
+
+def test_same_bytes_under_another_name_hit_the_cache(upload_dir):
+    data = _csv()
+    first = cache_utils.read_upload(Upload(data, "a.csv"))
+    first.loc[0, "depth"] = -1  # callers get their own copy
+    second = cache_utils.read_upload(Upload(data, "renamed.csv"))
+    assert second.loc[0, "depth"] != -1
+    assert cache_utils.get_cache("uploads").stats()["Hits"] == 1
+    assert len(os.listdir(upload_dir)) == 1
+    cache_utils.read_upload(Upload(data, "a.csv"), sep=";")  # other parser options are another entry
+    assert len(os.listdir(upload_dir)) == 2
+
+
+def test_npy_columns_are_never_unpickled(upload_dir, monkeypatch):
+    monkeypatch.setattr(cache_utils, "HAS_ARROW", False)
+    data = _csv()
+    cache_utils.read_upload(Upload(data, "a.csv"))
+    (entry,) = os.listdir(upload_dir)
+    # A pickled object array planted in the shared directory must not be loaded
+    np.save(upload_dir / entry / "col_0.npy", np.array([object()] * 3, dtype=object), allow_pickle=True)
+    cache_utils.get_cache("uploads").clear()
+    df = cache_utils.read_upload(Upload(data, "a.csv"))
+    pd.testing.assert_frame_equal(df, pd.read_csv(io.BytesIO(data)))  # rebuilt from the upload itself
+
+    mixed = pd.DataFrame({"mixed": [1, "x", 2.5]})
+    with pytest.raises(ValueError):
+        cache_utils._write_columns(mixed, str(upload_dir))
+
+
+def test_lru_eviction_keeps_recent_entries(upload_dir):
+    keys = []
+    for seed in range(4):
+        data = _csv(seed, rows=2000)
+        cache_utils.read_upload(Upload(data, f"{seed}.csv"))
+        keys.append(cache_utils.make_key(cache_utils.hash_bytes(data), []))
+    for age, key in enumerate(keys):  # oldest first
+        stamp = time.time() - 1000 + age
+        os.utime(cache_utils._entry_dir(key), (stamp, stamp))
+    size = cache_utils._dir_size(cache_utils._entry_dir(keys[0]))
+    cache_utils._evict_uploads(keep=keys[0], max_bytes=int(size * 2.5))
+    assert sorted(os.listdir(upload_dir)) == sorted([keys[0], keys[3]])
+
+
+def test_in_memory_layer_is_byte_bounded(upload_dir, monkeypatch):
+    cache = cache_utils.get_cache("uploads")
+    assert cache.max_bytes == cache_utils.UPLOAD_MEMORY_MAX_BYTES
+    uploads = [Upload(_csv(seed, rows=3000), f"{seed}.csv") for seed in range(3)]
+    one_frame = cache_utils.value_nbytes(cache_utils.read_upload(uploads[0]))
+    monkeypatch.setattr(cache, "max_bytes", int(one_frame * 1.5))
+    for upload in uploads[1:]:
+        cache_utils.read_upload(upload)
+    assert len(cache) == 1 and cache.nbytes <= cache.max_bytes
+    # Evicted frames come back from the disk copy, not a re-parse
+    pd.testing.assert_frame_equal(cache_utils.read_upload(uploads[0]), pd.read_csv(io.BytesIO(uploads[0].getvalue())))
+    assert len(os.listdir(upload_dir)) == 3
+    report = cache_utils.upload_cache_report().set_index("File")
+    assert report.loc["0.csv", "Cache Load (s)"] > 0
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from scipy import ndimage
+
+import cache_utils
+from coastal_tools import label_water_bodies
+
+
+def _assert_same_partition(labels, expected):
+    # Same components up to renumbering: the (ours, reference) pairs form a one-to-one map
+    labels, expected = np.asarray(labels), np.asarray(expected)
+    np.testing.assert_array_equal(labels > 0, expected > 0)
+    water = expected > 0
+    pairs = np.unique(np.stack([labels[water], expected[water]], axis=1), axis=0)
+    assert len(pairs) == len(np.unique(pairs[:, 0])) == len(np.unique(pairs[:, 1]))
+
+
+def _random_scene(seed, shape=(97, 83)):
+    rng = np.random.default_rng(seed)
+    # Smoothed noise gives blobs that cross tile borders in every direction
+    return ndimage.uniform_filter(rng.standard_normal(shape), size=5).astype(np.float32)
+
+
+@pytest.mark.parametrize("connectivity", [4, 8])
+@pytest.mark.parametrize("tile", [16, 25, 200])
+def test_tiled_labels_match_ndimage(connectivity, tile):
+    ndwi = _random_scene(tile + connectivity)
+    structure = np.ones((3, 3), dtype=bool) if connectivity == 8 else None
+    expected, n = ndimage.label(ndwi > 0, structure=structure)
+
+    bodies, labels = label_water_bodies(ndwi, connectivity=connectivity, tile=tile)
+
+    assert len(bodies) == n
+    _assert_same_partition(labels, expected)
+    assert bodies["Pixels"].sum() == (ndwi > 0).sum()
+    ref_sizes = np.sort(np.bincount(expected.ravel())[1:])
+    np.testing.assert_array_equal(np.sort(bodies["Pixels"].to_numpy()), ref_sizes)
+    for body in bodies.itertuples():
+        rr, cc = np.nonzero(labels == body[1])
+        assert (rr.min(), rr.max(), cc.min(), cc.max()) == (body[3], body[4], body[5], body[6])
+
+
+@pytest.mark.parametrize("corner", [[(3, 3), (4, 4)], [(3, 4), (4, 3)]])
+def test_diagonal_only_contact_across_tile_corners(corner):
+    # Two pixels meeting only at the corner shared by four 4x4 tiles (diagonal and anti-diagonal)
+    ndwi = -np.ones((8, 8), dtype=np.float32)
+    for r, c in corner:
+        ndwi[r, c] = 1
+    assert len(label_water_bodies(ndwi, connectivity=8, tile=4)[0]) == 1
+    assert len(label_water_bodies(ndwi, connectivity=4, tile=4)[0]) == 2
+
+
+def test_process_pool_matches_serial(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_utils, "SCRATCH_DIR", str(tmp_path))
+    ndwi = _random_scene(3, shape=(120, 110))
+    serial_bodies, serial = label_water_bodies(ndwi, connectivity=8, tile=32)
+    pool_bodies, pooled = label_water_bodies(ndwi, connectivity=8, tile=32, workers=2)
+    np.testing.assert_array_equal(np.asarray(pooled), serial)
+    assert serial_bodies.equals(pool_bodies)
@@ -0,0 +1,50 @@
+import importlib
+import sys
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+
+# Sidebar label -> (module, entry point). A tool module, and the heavy libraries it pulls in,
+# is imported the first time its page is opened rather than at app start-up.
+TOOLS = {
+    "🪨 Geology Tools": ("geology_tools", "grain_size_analysis"),
+    "🧱 Soil Tools": ("soil_tools", "soil_texture_triangle"),
+    "🌿 Botany Tools": ("botany_tools", "biodiversity_index_calculator"),
+    "🌊 Coastal Tools": ("coastal_tools", "coastal_ndwi_viewer"),
+    "📊 General Tools": ("general_tools", "general_data_tools"),
+    "🤖 AI Predictions": ("ai_tools", "ai_prediction_tool"),
+    "🧬 3D Visualization": ("visual_3d_tools", "visual_3d_tool"),
+    "📊 QFL & MIA Tool": ("qfl_mia_tool", "qfl_and_mia_tool"),
+}
+
+# Module state survives reruns, so each import is timed once per server process
+_import_times = {}
+_import_lock = threading.Lock()
+
+
+def load_tool(label):
+    module_name, entry = TOOLS[label]
+    with _import_lock:
+        if module_name not in sys.modules:
+            start = time.perf_counter()
+            importlib.import_module(module_name)
+            _import_times[module_name] = time.perf_counter() - start
+    return getattr(sys.modules[module_name], entry)
+
+
+def import_profile():
+    rows = [{"Module": name, "First Import (s)": seconds} for name, seconds in _import_times.items()]
+    return pd.DataFrame(rows, columns=["Module", "First Import (s)"])
+
+
+def show_import_profile():
+    with st.expander("⏱️ Import Profile", expanded=False):
+        profile = import_profile()
+        if profile.empty:
+            st.caption("No tool modules loaded yet.")
+            return
+        st.dataframe(profile.style.format({"First Import (s)": "{:.3f}"}), use_container_width=True, hide_index=True)
+        st.caption("The first tool opened also pays for shared libraries (pandas, matplotlib). "
+                   "Run `python benchmarks.py imports` for a cold-start profile of every module.")
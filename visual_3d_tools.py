@@ -1,9 +1,599 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
 import numpy as np
 import io
+import json
+import os
 import random
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_utils import data_path_input, hash_array, hash_bytes, hash_file_identity, make_key, memoize, read_upload, scratch_path
+
+POINT_BUDGET = 200_000  # points sent to the browser per render
+MAX_POINT_BUDGET = 1_000_000
+OCTREE_DEPTH = 10  # finest level: 1024 cells per axis
+DEFAULT_VOXELS_PER_AXIS = 200
+OCTREE_CACHE_MAX_BYTES = 2 * 1024 ** 3  # Morton codes and sort order of recently viewed clouds
+PAYLOAD_BYTES_PER_VALUE = 6.7  # measured plotly JSON size of one float32 value
+FIGURE_OVERHEAD_BYTES = 4_000
+POINT_FILE_TYPES = ["xyz", "txt", "csv", "las", "npy"]
+XYZ_CHUNK_ROWS = 1_000_000
+GRID_TILE = 256  # output cells per tile edge
+DEFAULT_GRID_CELLS = 200  # cells along the longer axis
+MAX_GRID_CELLS = 4000
+MAX_SURFACE_CELLS = 400  # per axis sent to the browser
+COLOR_SCALES = ["Viridis", "Earth", "Cividis", "Plasma", "Blues", "Greys"]
+CATEGORICAL_ATTRIBUTES = {"classification", "class", "return_number", "return number", "point_source_id"}
+
+# LAS point data record formats: core fields, plus GPS time / RGB / NIR where the format has them
+LAS_LEGACY_CORE = [("X", "<i4"), ("Y", "<i4"), ("Z", "<i4"), ("intensity", "<u2"), ("return_byte", "u1"),
+                   ("classification", "u1"), ("scan_angle", "i1"), ("user_data", "u1"), ("point_source_id", "<u2")]
+LAS_CORE = [("X", "<i4"), ("Y", "<i4"), ("Z", "<i4"), ("intensity", "<u2"), ("return_byte", "u1"),
+            ("flags", "u1"), ("classification", "u1"), ("user_data", "u1"), ("scan_angle", "<i2"),
+            ("point_source_id", "<u2"), ("gps_time", "<f8")]
+GPS = [("gps_time", "<f8")]
+RGB = [("red", "<u2"), ("green", "<u2"), ("blue", "<u2")]
+LAS_FORMATS = {
+    0: LAS_LEGACY_CORE, 1: LAS_LEGACY_CORE + GPS, 2: LAS_LEGACY_CORE + RGB, 3: LAS_LEGACY_CORE + GPS + RGB,
+    6: LAS_CORE, 7: LAS_CORE + RGB, 8: LAS_CORE + RGB + [("nir", "<u2")],
+}
+
+# --- Point file ingestion ---
+# A point cloud is {"xyz": (n, 3) float64 array or ScaledXYZ, "attributes": {name: spec}, "info": {...}};
+# each attribute spec holds a (usually memory-mapped) "values" column plus an optional bit "mask", and is
+# only read for the rows that are actually rendered.
+
+class ScaledXYZ:
+    # (n, 3) float64 view over three memory-mapped coordinate columns: raw * scale + offset is
+    # applied only to the rows (and axes) being indexed, so opening a file reads no coordinates
+    ndim = 2
+    dtype = np.dtype(np.float64)
+
+    def __init__(self, columns, scale=(1.0, 1.0, 1.0), offset=(0.0, 0.0, 0.0)):
+        self.columns = columns
+        self.scale = np.asarray(scale, dtype=float)
+        self.offset = np.asarray(offset, dtype=float)
+        self.shape = (len(columns[0]), 3)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        rows, axes = index if isinstance(index, tuple) else (index, slice(None))
+        picked = range(3)[axes]
+        if isinstance(picked, int):
+            return np.asarray(self.columns[picked][rows], dtype=float) * self.scale[picked] + self.offset[picked]
+        return np.stack([np.asarray(self.columns[k][rows], dtype=float) * self.scale[k] + self.offset[k]
+                         for k in picked], axis=-1)
+
+def iter_point_chunks(xyz, chunk_rows=XYZ_CHUNK_ROWS):
+    # Row blocks of an array or ScaledXYZ; full passes (bounds, Morton codes) go block by block
+    for start in range(0, len(xyz), chunk_rows):
+        yield xyz[start:start + chunk_rows]
+
+def point_bounds(xyz):
+    lo, hi = np.full(3, np.inf), np.full(3, -np.inf)
+    for chunk in iter_point_chunks(xyz):
+        lo, hi = np.minimum(lo, chunk.min(axis=0)), np.maximum(hi, chunk.max(axis=0))
+    return lo, hi
+
+def _attribute(values, mask=None, name=""):
+    return {"values": values, "mask": mask, "categorical": name.strip().lower() in CATEGORICAL_ATTRIBUTES}
+
+def attribute_values(spec, index):
+    values = np.asarray(spec["values"][index])
+    return values & spec["mask"] if spec["mask"] else values
+
+def read_las_header(path):
+    with open(path, "rb") as f:
+        head = f.read(375)
+    if head[:4] != b"LASF":
+        raise ValueError(f"'{os.path.basename(path)}' is not a LAS file.")
+    version = (head[24], head[25])
+    offset_to_points, = struct.unpack_from("<I", head, 96)
+    point_format, record_length, count = struct.unpack_from("<BHI", head, 104)
+    if point_format & 0x80 or point_format & 0x40:
+        raise ValueError("Compressed (LAZ) point records are not supported; decompress to LAS first.")
+    if version >= (1, 4) and count == 0:
+        count, = struct.unpack_from("<Q", head, 247)
+    scale = np.array(struct.unpack_from("<3d", head, 131))
+    offset = np.array(struct.unpack_from("<3d", head, 155))
+    max_x, min_x, max_y, min_y, max_z, min_z = struct.unpack_from("<6d", head, 179)
+    return {
+        "version": f"{version[0]}.{version[1]}", "point_format": point_format, "record_length": record_length,
+        "count": count, "offset_to_points": offset_to_points, "scale": scale, "offset": offset,
+        "min": np.array([min_x, min_y, min_z]), "max": np.array([max_x, max_y, max_z]),
+    }
+
+def open_las(path):
+    # Memory-map the point records of an uncompressed LAS file (formats 0-3, 6-8); extra bytes
+    # at the end of each record are skipped via the record length
+    header = read_las_header(path)
+    if header["point_format"] not in LAS_FORMATS:
+        raise ValueError(f"LAS point format {header['point_format']} is not supported.")
+    fields = LAS_FORMATS[header["point_format"]]
+    base = np.dtype(fields)
+    dtype = np.dtype({"names": base.names, "formats": [base.fields[n][0] for n in base.names],
+                      "offsets": [base.fields[n][1] for n in base.names], "itemsize": header["record_length"]})
+    records = np.memmap(path, dtype=dtype, mode="r", offset=header["offset_to_points"], shape=(header["count"],))
+    # Scaled integers -> world coordinates, for the rows that are read
+    xyz = ScaledXYZ([records[axis] for axis in "XYZ"], header["scale"], header["offset"])
+
+    legacy = header["point_format"] < 6
+    attributes = {
+        "Intensity": _attribute(records["intensity"]),
+        "Classification": _attribute(records["classification"], 0x1F if legacy else None, "classification"),
+        "Return Number": _attribute(records["return_byte"], 0x07 if legacy else 0x0F, "return_number"),
+    }
+    for name in ("gps_time", "red", "green", "blue", "nir"):
+        if name in dtype.names:
+            attributes[name.replace("_", " ").title()] = _attribute(records[name])
+    info = {"Format": f"LAS {header['version']} (point format {header['point_format']})", "Points": header["count"],
+            "Bytes per point": header["record_length"]}
+    return {"xyz": xyz, "attributes": attributes, "info": info}
+
+def write_las(path, xyz, intensity=None, classification=None, scale=0.001):
+    # Minimal LAS 1.2, point format 0 writer (used for exports and benchmarks)
+    xyz = np.asarray(xyz, dtype=float)
+    n = len(xyz)
+    offset = np.floor(xyz.min(axis=0)) if n else np.zeros(3)
+    records = np.zeros(n, dtype=np.dtype(LAS_LEGACY_CORE))
+    for k, axis in enumerate("XYZ"):
+        records[axis] = np.rint((xyz[:, k] - offset[k]) / scale)
+    records["return_byte"] = 0x09  # return 1 of 1
+    if intensity is not None:
+        records["intensity"] = intensity
+    if classification is not None:
+        records["classification"] = np.asarray(classification) & 0x1F
+    lo, hi = (xyz.min(axis=0), xyz.max(axis=0)) if n else (np.zeros(3), np.zeros(3))
+
+    header = bytearray(227)
+    header[0:4] = b"LASF"
+    header[24:26] = bytes([1, 2])
+    header[26:58] = b"EcoGeo Lab".ljust(32, b"\0")
+    struct.pack_into("<HIIBHI", header, 94, 227, 227, 0, 0, records.dtype.itemsize, n)
+    struct.pack_into("<3d3d", header, 131, scale, scale, scale, *offset)
+    struct.pack_into("<6d", header, 179, hi[0], lo[0], hi[1], lo[1], hi[2], lo[2])
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(records.tobytes())
+
+def open_point_npy(path):
+    # Structured .npy with x/y/z fields (any case) plus attribute fields, or a plain (n, >=3)
+    # array whose extra columns become attributes
+    records = np.load(path, mmap_mode="r")
+    if records.dtype.names:
+        lookup = {name.lower(): name for name in records.dtype.names}
+        missing = [axis for axis in "xyz" if axis not in lookup]
+        if missing:
+            raise ValueError(f"Structured .npy needs x, y, z fields; missing {', '.join(missing)}.")
+        xyz = ScaledXYZ([records[lookup[axis]] for axis in "xyz"])
+        attributes = {name: _attribute(records[name], name=name)
+                      for name in records.dtype.names if name.lower() not in ("x", "y", "z")}
+    else:
+        if records.ndim != 2 or records.shape[1] < 3:
+            raise ValueError(f"Point array must be (n, 3+), got shape {records.shape}.")
+        xyz = ScaledXYZ([records[:, k] for k in range(3)])
+        attributes = {f"Column {k + 1}": _attribute(records[:, k]) for k in range(3, records.shape[1])}
+    info = {"Format": "NumPy .npy", "Points": len(xyz), "Bytes per point": records.dtype.itemsize * (
+        1 if records.dtype.names else records.shape[1])}
+    return {"xyz": xyz, "attributes": attributes, "info": info}
+
+def _sniff_text(path):
+    # Delimiter and column names of an XYZ/CSV text file (header row optional, '#' comments skipped)
+    with open(path, "r", errors="replace") as f:
+        first = next((line for line in f if line.strip() and not line.startswith("#")), "")
+    sep = "," if "," in first else ";" if ";" in first else r"\s+"
+    tokens = [t.strip().strip('"') for t in (first.split(sep) if sep != r"\s+" else first.split())]
+    try:
+        [float(t) for t in tokens]
+        has_header = False
+        names = ["x", "y", "z"] + [f"attr_{k + 1}" for k in range(len(tokens) - 3)]
+    except ValueError:
+        has_header = True
+        names = [t.lower() if t.lower() in ("x", "y", "z") else t for t in tokens]
+    if len(tokens) < 3 or not {"x", "y", "z"} <= set(names):
+        raise ValueError("Text point files need X, Y, Z columns (header row) or at least three numeric columns.")
+    return sep, names, has_header
+
+def convert_xyz_text(path, out_path, chunk_rows=XYZ_CHUNK_ROWS):
+    # Chunked XYZ/CSV -> raw float32 records with a JSON header sidecar; peak memory is one chunk.
+    # Coordinates are stored relative to the first chunk's minimum so float32 keeps them precise.
+    sep, names, has_header = _sniff_text(path)
+    dtype = np.dtype([(name, "<f4") for name in names])
+    offset = None
+    count = 0
+    with open(out_path + ".part", "wb") as out:
+        reader = pd.read_csv(path, sep=sep, header=0 if has_header else None, names=names, comment="#",
+                             chunksize=chunk_rows, dtype={name: np.float64 if name in ("x", "y", "z") else np.float32 for name in names})
+        for chunk in reader:
+            chunk = chunk.dropna(subset=["x", "y", "z"])
+            if offset is None and len(chunk):
+                offset = np.floor(chunk[["x", "y", "z"]].min().to_numpy())
+            records = np.empty(len(chunk), dtype=dtype)
+            for name in names:
+                values = chunk[name].to_numpy()
+                records[name] = values - offset["xyz".index(name)] if name in ("x", "y", "z") else values
+            out.write(records.tobytes())
+            count += len(records)
+    os.replace(out_path + ".part", out_path)
+    header = {"dtype": [[name, "<f4"] for name in names], "count": count,
+              "offset": (offset if offset is not None else np.zeros(3)).tolist()}
+    with open(out_path + ".json", "w") as f:
+        json.dump(header, f)
+    return header
+
+def open_point_records(path, header):
+    # Raw float32 records written by convert_xyz_text
+    records = np.memmap(path, dtype=np.dtype([tuple(field) for field in header["dtype"]]), mode="r",
+                        shape=(header["count"],))
+    xyz = ScaledXYZ([records[axis] for axis in "xyz"], offset=header["offset"])
+    attributes = {name: _attribute(records[name], name=name) for name in records.dtype.names if name not in ("x", "y", "z")}
+    info = {"Format": "XYZ text (float32 records)", "Points": header["count"], "Bytes per point": records.dtype.itemsize}
+    return {"xyz": xyz, "attributes": attributes, "info": info}
+
+def open_point_file(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".las":
+        return open_las(path)
+    if ext == ".npy":
+        return open_point_npy(path)
+    # Text is converted once per file into a binary record cache under scratch
+    records_path = scratch_path(f"points_{hash_file_identity(path)}.f32")
+    if os.path.exists(records_path + ".json"):
+        with open(records_path + ".json") as f:
+            header = json.load(f)
+    else:
+        header = convert_xyz_text(path, records_path)
+    return open_point_records(records_path, header)
+
+def point_file_input():
+    # Returns the path of a point file (server path or saved upload), or None while incomplete
+    source = st.radio("Point Source:", ["📁 Server File Path", "📤 Upload File"], horizontal=True, key="vis3d_point_source")
+    if source == "📁 Server File Path":
+        return data_path_input("Point file path (.las, .npy, .xyz, .txt, .csv)", "vis3d_point_path",
+                               [f".{t}" for t in POINT_FILE_TYPES])
+    uploaded = st.file_uploader("📤 Upload Point File", type=POINT_FILE_TYPES, key="vis3d_point_upload")
+    if not uploaded:
+        st.info("Upload a point file to proceed.")
+        return None
+    data = uploaded.getvalue()
+    path = scratch_path(f"points_{hash_bytes(data)}{os.path.splitext(uploaded.name)[1].lower()}")
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(data)
+    return path
+
+def cloud_from_frame(df):
+    # X/Y/Z table (upload or manual entry); any other numeric columns become attributes
+    numeric = df.apply(pd.to_numeric, errors="coerce")
+    numeric = numeric.dropna(subset=["X", "Y", "Z"])
+    attributes = {str(c): _attribute(numeric[c].to_numpy(), name=str(c)) for c in numeric.columns
+                  if c not in ("X", "Y", "Z") and numeric[c].notna().any()}
+    return {"xyz": numeric[["X", "Y", "Z"]].to_numpy(dtype=float), "attributes": attributes,
+            "info": {"Format": "Table", "Points": len(numeric)}}
+
+# --- Level of detail ---
+
+def _spread_bits(v):
+    # Insert two zero bits after each of the low 21 bits, for 3-D Morton interleaving
+    v = v.astype(np.uint64) & np.uint64(0x1FFFFF)
+    for shift, mask in ((32, 0x1F00000000FFFF), (16, 0x1F0000FF0000FF), (8, 0x100F00F00F00F00F),
+                        (4, 0x10C30C30C30C30C3), (2, 0x1249249249249249)):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+def morton_codes(xyz, lo, hi, depth=OCTREE_DEPTH):
+    cells = 1 << depth
+    extent = np.where(hi > lo, hi - lo, 1)
+    q = np.clip(((xyz - lo) / extent * cells).astype(np.int64), 0, cells - 1)
+    return _spread_bits(q[:, 0]) | (_spread_bits(q[:, 1]) << np.uint64(1)) | (_spread_bits(q[:, 2]) << np.uint64(2))
+
+def build_octree(xyz, depth=OCTREE_DEPTH):
+    # Point order along the Morton (Z-order) curve: every octree node at every level is then a
+    # contiguous run, so a level of detail is a run-length reduction over the sorted codes.
+    # Only codes and order are stored; coordinates stay in xyz (memory-mapped for point files)
+    # and are gathered for the rows being rendered.
+    lo, hi = point_bounds(xyz)
+    codes = np.concatenate([np.zeros(0, dtype=np.uint64)] + [morton_codes(chunk, lo, hi, depth)
+                                                              for chunk in iter_point_chunks(xyz)])
+    order = np.argsort(codes, kind="stable")
+    codes = codes[order]
+    if len(order) < 2 ** 31:
+        order = order.astype(np.int32)
+    return {"xyz": xyz, "codes": codes, "order": order, "lo": lo, "hi": hi, "depth": depth}
+
+def gather_points(tree, rows):
+    # Coordinates of sorted rows, read from the source points
+    return np.asarray(tree["xyz"][tree["order"][rows]], dtype=float).reshape(-1, 3)
+
+def box_rows(tree, box, chunk_rows=XYZ_CHUNK_ROWS):
+    # Sorted rows inside box; the source is scanned in file order, one chunk at a time
+    inside = np.zeros(len(tree["order"]), dtype=bool)
+    for start in range(0, len(inside), chunk_rows):
+        chunk = tree["xyz"][start:start + chunk_rows]
+        inside[start:start + len(chunk)] = np.all((chunk >= box[0]) & (chunk <= box[1]), axis=1)
+    return np.flatnonzero(inside[tree["order"]])
+
+def _cell_starts(codes, level, depth):
+    cell = codes >> np.uint64(3 * (depth - level))
+    return np.flatnonzero(np.concatenate([[True], cell[1:] != cell[:-1]]))
+
+def lod_select(tree, budget=POINT_BUDGET, box=None):
+    # Rows of the points inside box (into the tree's sorted arrays) and, when they exceed the
+    # budget, run starts of at most budget cells: the finest octree level that fits, refined
+    # towards the next level by merging its cells in even runs along the Morton curve.
+    # Returns (rows, starts or None, level or None).
+    codes = tree["codes"]
+    rows = np.arange(len(codes))
+    if box is not None:
+        rows = box_rows(tree, box)
+        codes = codes[rows]
+    if len(rows) <= budget:
+        return rows, None, None
+
+    # Occupied cells grow with level, so binary-search the deepest level within budget
+    low, high = 0, tree["depth"]
+    while low < high:
+        mid = (low + high + 1) // 2
+        if len(_cell_starts(codes, mid, tree["depth"])) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    starts = _cell_starts(codes, low, tree["depth"])
+    if low < tree["depth"]:
+        finer = _cell_starts(codes, low + 1, tree["depth"])
+        starts = np.unique(finer[np.linspace(0, len(finer) - 1, budget).astype(np.int64)])
+    return rows, starts, low
+
+def reduce_cells(values, rows, starts):
+    # Per-cell mean of values (sorted tree order); the selected values themselves at full detail
+    values = values[rows]
+    if starts is None:
+        return values
+    counts = np.diff(np.append(starts, len(values)))
+    sums = np.add.reduceat(values, starts, axis=0)
+    return sums / (counts[:, None] if sums.ndim > 1 else counts)
+
+def reduce_points(tree, rows, starts, chunk_rows=XYZ_CHUNK_ROWS):
+    # reduce_cells for coordinates, gathered chunk by chunk so only the cell sums are held
+    if starts is None:
+        return gather_points(tree, rows)
+    counts = np.diff(np.append(starts, len(rows)))
+    sums = np.zeros((len(starts), 3))
+    for start in range(0, len(rows), chunk_rows):
+        positions = np.arange(start, min(start + chunk_rows, len(rows)))
+        cells = np.searchsorted(starts, positions, side="right") - 1
+        points = gather_points(tree, rows[positions])
+        for k in range(3):
+            sums[:, k] += np.bincount(cells, weights=points[:, k], minlength=len(starts))
+    return sums / counts[:, None]
+
+def voxel_cells(xyz, voxel_size):
+    # Occupied voxels of a regular grid: (cell index per point, first point per cell, points per cell)
+    xyz = np.asarray(xyz)
+    lo = xyz.min(axis=0)
+    idx = np.floor((xyz - lo) / voxel_size).astype(np.int64)
+    dims = idx.max(axis=0) + 1
+    if np.prod(dims.astype(float)) < 2 ** 62:
+        _, first, inverse = np.unique(np.ravel_multi_index(idx.T, dims), return_index=True, return_inverse=True)
+    else:
+        _, first, inverse = np.unique(idx, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    return inverse, first, np.bincount(inverse)
+
+def voxel_downsample(xyz, voxel_size):
+    # Centroid of the points falling in each occupied voxel
+    inverse, _, counts = voxel_cells(xyz, voxel_size)
+    return np.column_stack([np.bincount(inverse, weights=xyz[:, k]) / counts for k in range(3)])
+
+def point_cloud_figure(points, color, color_label="Z"):
+    # float32 arrays keep the plotly payload (base64 typed arrays) at 4 bytes per value
+    points = points.astype(np.float32)
+    fig = go.Figure(go.Scatter3d(
+        x=points[:, 0], y=points[:, 1], z=points[:, 2], mode="markers",
+        marker=dict(size=2 if len(points) > 10_000 else 4, color=np.asarray(color, dtype=np.float32),
+                    colorscale="Viridis", opacity=0.8, colorbar=dict(title=color_label)),
+    ))
+    fig.update_layout(title="3D Point Cloud Visualization", margin=dict(l=0, r=0, b=0, t=30),
+                      scene=dict(xaxis_title="X", yaxis_title="Y", zaxis_title="Z"))
+    return fig
+
+def estimate_payload_bytes(n_points):
+    # x, y, z and colour go out as base64 float32 arrays (plus JSON escaping of "/"), and a few
+    # KB of layout; estimated from the counts so the figure is not serialised twice
+    return int(n_points * 4 * PAYLOAD_BYTES_PER_VALUE) + FIGURE_OVERHEAD_BYTES
+
+def visible_box(lo, hi):
+    # Range sliders per axis; only points inside the box are sent, at the finest level that fits
+    box_lo, box_hi = lo.astype(float).copy(), hi.astype(float).copy()
+    with st.expander("🔍 Visible Box (zoom to load more detail)", expanded=False):
+        for k, axis in enumerate("XYZ"):
+            if hi[k] > lo[k]:
+                box_lo[k], box_hi[k] = st.slider(f"{axis} range", float(lo[k]), float(hi[k]),
+                                                 (float(lo[k]), float(hi[k])), key=f"vis3d_box_{axis}")
+    return box_lo, box_hi
+
+def render_point_cloud(cloud, key=None):
+    # Level-of-detail selection + plot + stats for a point cloud (see the ingestion section)
+    xyz = cloud["xyz"]
+    key = key or hash_array(xyz)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        mode = st.radio("Level of detail", ["🌳 Octree (point budget)", "🧊 Voxel grid (fixed size)"],
+                        horizontal=True, key="vis3d_lod_mode")
+    with col2:
+        budget = st.number_input("Point budget", min_value=1_000, max_value=MAX_POINT_BUDGET, value=POINT_BUDGET,
+                                 step=10_000, key="vis3d_budget")
+    with col3:
+        color_by = st.selectbox("Color by", ["Z"] + list(cloud["attributes"]), key="vis3d_color_by")
+    spec = cloud["attributes"].get(color_by)
+
+    with st.spinner("Indexing points..."):
+        tree = memoize("vis3d_octree", key, lambda: build_octree(xyz), max_bytes=OCTREE_CACHE_MAX_BYTES)
+    box = visible_box(tree["lo"], tree["hi"])
+    rows, starts, level = lod_select(tree, int(budget), box)
+
+    if mode.startswith("🧊"):
+        extent = float(np.max(tree["hi"] - tree["lo"])) or 1.0
+        voxel = st.number_input("Voxel size", min_value=extent / 5000, value=extent / DEFAULT_VOXELS_PER_AXIS,
+                                format="%.4g", key="vis3d_voxel")
+        selected = gather_points(tree, rows)
+        if len(rows):
+            inverse, first, counts = memoize("vis3d_voxels", make_key(key, voxel, *box[0], *box[1]),
+                                             lambda: voxel_cells(selected, voxel))
+        else:
+            inverse, first, counts = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+        points = np.column_stack([np.bincount(inverse, weights=selected[:, k], minlength=len(counts)) / counts
+                                  for k in range(3)]) if len(rows) else selected
+        color = points[:, 2]
+        if spec is not None and len(rows):
+            values = attribute_values(spec, tree["order"][rows]).astype(float)
+            color = values[first] if spec["categorical"] else np.bincount(inverse, weights=values) / counts
+        if len(points) > budget:
+            # Still over budget: keep an even stride along the Morton order. Voxels come out of
+            # np.unique in grid-index order; their first rows are positions on the Morton curve.
+            morton = np.argsort(first, kind="stable")
+            keep = morton[np.linspace(0, len(points) - 1, int(budget)).astype(np.int64)]
+            points, color = points[keep], color[keep]
+        detail = f"voxel {voxel:.4g}"
+    else:
+        points = reduce_points(tree, rows, starts)
+        color = points[:, 2]
+        if spec is not None:
+            original = tree["order"][rows]
+            if spec["categorical"] and starts is not None:
+                color = attribute_values(spec, original[starts])
+            else:
+                color = reduce_cells(attribute_values(spec, original).astype(float), np.arange(len(rows)), starts)
+        detail = "full" if level is None else f"octree level {level}–{level + 1} of {tree['depth']}"
+
+    if len(points) == 0:
+        st.warning("No points inside the visible box.")
+        return points
+
+    fig = point_cloud_figure(points, color, color_by)
+    payload = estimate_payload_bytes(len(points))
+    st.plotly_chart(fig, use_container_width=True)
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Raw points", f"{len(xyz):,}")
+    col2.metric("In visible box", f"{len(rows):,}")
+    col3.metric("Rendered", f"{len(points):,}", detail, delta_color="off")
+    col4.metric("Payload", f"{payload / 1e3:,.0f} KB",
+                f"~{payload * len(xyz) / len(points) / 1e6:,.1f} MB if sent raw" if len(points) < len(xyz) else None,
+                delta_color="off")
+    return points
+
+def points_csv(points):
+    # CSV of the rendered points, keyed on their content so reruns that draw the same points reuse it
+    return memoize("vis3d_points_csv", hash_array(points),
+                   lambda: pd.DataFrame(points, columns=["X", "Y", "Z"]).to_csv(index=False).encode(), max_entries=4)
+
+# --- DEM gridding ---
+
+def grid_axes(lo, hi, cell_size):
+    # Cell-centre coordinates covering [lo, hi] in x and y
+    nx = max(1, int(np.ceil((hi[0] - lo[0]) / cell_size)))
+    ny = max(1, int(np.ceil((hi[1] - lo[1]) / cell_size)))
+    return lo[0] + (np.arange(nx) + 0.5) * cell_size, lo[1] + (np.arange(ny) + 0.5) * cell_size
+
+def _idw_tile(tree, z, gx, gy, r0, r1, k, power, radius):
+    cx, cy = np.meshgrid(gx, gy[r0:r1])
+    dist, idx = tree.query(np.column_stack([cx.ravel(), cy.ravel()]), k=k,
+                           distance_upper_bound=radius if radius else np.inf)
+    dist, idx = dist.reshape(len(cx.ravel()), -1), idx.reshape(len(cx.ravel()), -1)
+    found = idx < len(z)  # neighbours beyond the radius come back with index n
+    values = z[np.where(found, idx, 0)]
+    exact = found & (dist == 0)
+    with np.errstate(divide="ignore"):
+        weights = np.where(found, 1.0 / np.where(exact, 1.0, dist) ** power, 0.0)
+    # A point exactly on the cell centre takes that cell
+    weights = np.where(exact.any(axis=1, keepdims=True), exact.astype(float), weights)
+    total = weights.sum(axis=1)
+    out = np.divide((weights * values).sum(axis=1), total, out=np.full(len(total), np.nan), where=total > 0)
+    return r0, out.reshape(r1 - r0, len(gx)).astype(np.float32)
+
+def idw_grid(tree, z, gx, gy, k=8, power=2.0, radius=None, tile=GRID_TILE, workers=None):
+    # k-nearest-neighbour inverse-distance weighting onto the (gy, gx) grid; cells with no point
+    # inside radius are NaN. Row tiles are queried in a thread pool (the KD-tree releases the GIL).
+    k = int(min(k, len(z)))
+    grid = np.empty((len(gy), len(gx)), dtype=np.float32)
+    rows_per_tile = max(1, tile * tile // len(gx))
+    tiles = [(r0, min(r0 + rows_per_tile, len(gy))) for r0 in range(0, len(gy), rows_per_tile)]
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        for r0, values in pool.map(lambda rows: _idw_tile(tree, z, gx, gy, *rows, k, power, radius), tiles):
+            grid[r0:r0 + len(values)] = values
+    return grid
+
+def dem_npy(grid):
+    buf = io.BytesIO()
+    np.save(buf, grid)
+    return buf.getvalue()
+
+def dem_csv(grid, gx, gy):
+    gxx, gyy = np.meshgrid(gx, gy)
+    return pd.DataFrame({"X": gxx.ravel(), "Y": gyy.ravel(), "Z": grid.ravel()}).to_csv(index=False).encode()
+
+def show_dem_gridding(cloud, key):
+    st.markdown("### 🗺️ DEM Surface (IDW Gridding)")
+    if not st.checkbox("Grid points to a surface (k-nearest-neighbour IDW)", key="vis3d_dem"):
+        return
+
+    xyz = cloud["xyz"]
+    lo, hi = (bound[:2] for bound in memoize("vis3d_bounds", key, lambda: point_bounds(xyz)))
+    extent = float(np.max(hi - lo)) or 1.0
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        cell_size = st.number_input("Cell size", min_value=extent / MAX_GRID_CELLS, value=extent / DEFAULT_GRID_CELLS,
+                                    format="%.4g", key="vis3d_cell_size")
+    with col2:
+        k = st.number_input("Neighbours (k)", min_value=1, max_value=64, value=8, key="vis3d_idw_k")
+    with col3:
+        power = st.number_input("IDW power", min_value=0.5, max_value=5.0, value=2.0, step=0.5, key="vis3d_idw_power")
+    with col4:
+        radius = st.number_input("Search radius (0 = none)", min_value=0.0, value=0.0, format="%.4g", key="vis3d_idw_radius")
+    col1, col2 = st.columns(2)
+    with col1:
+        view = st.radio("View", ["🏔️ Surface", "🟩 Heatmap"], horizontal=True, key="vis3d_dem_view")
+    with col2:
+        colorscale = st.selectbox("Colour scale", COLOR_SCALES, key="vis3d_dem_colors")
+
+    # Index and grid are cached; the view and colour scale only restyle the cached grid
+    from scipy.spatial import cKDTree
+    gx, gy = grid_axes(lo, hi, cell_size)
+    with st.spinner("Building KD-tree..."):
+        tree = memoize("vis3d_kdtree", key, lambda: cKDTree(xyz[:, :2]), max_entries=4)
+    with st.spinner(f"Interpolating {len(gx):,} x {len(gy):,} cells..."):
+        dem_key = make_key(key, cell_size, int(k), power, radius)
+        grid = memoize("vis3d_dem", dem_key, lambda: idw_grid(tree, xyz[:, 2], gx, gy, int(k), power, radius or None))
+
+    step = max(1, int(np.ceil(max(grid.shape) / MAX_SURFACE_CELLS)))
+    shown = grid[::step, ::step]
+    if view == "🏔️ Surface":
+        fig = go.Figure(go.Surface(z=shown, x=gx[::step], y=gy[::step], colorscale=colorscale, colorbar=dict(title="Z")))
+        fig.update_layout(scene=dict(xaxis_title="X", yaxis_title="Y", zaxis_title="Z"))
+    else:
+        fig = go.Figure(go.Heatmap(z=shown, x=gx[::step], y=gy[::step], colorscale=colorscale, colorbar=dict(title="Z")))
+        fig.update_yaxes(scaleanchor="x")
+    fig.update_layout(title="Interpolated Surface (IDW)", margin=dict(l=0, r=0, b=0, t=30))
+    st.plotly_chart(fig, use_container_width=True)
+
+    empty = int(np.isnan(grid).sum())
+    st.caption(f"{grid.shape[1]:,} x {grid.shape[0]:,} cells of {cell_size:.4g}"
+               + (f" · shown every {step} cells" if step > 1 else "")
+               + (f" · {empty:,} cells without points in the radius" if empty else ""))
+
+    # Download files are built once per grid, not on every rerun
+    st.download_button("📥 Download DEM Grid (.npy, float32)",
+                       memoize("vis3d_dem_files", make_key(dem_key, "npy"), lambda: dem_npy(grid), max_entries=4),
+                       file_name="dem_idw.npy")
+    if grid.size <= 1_000_000:
+        st.download_button("📄 Download DEM Grid as CSV (X, Y, Z)",
+                           memoize("vis3d_dem_files", make_key(dem_key, "csv"), lambda: dem_csv(grid, gx, gy), max_entries=4),
+                           file_name="dem_idw.csv")
 
 def visual_3d_tool():
     st.subheader("📡 3D Visualization Tool (Point Cloud & Profiles)")
@@ -25,13 +615,50 @@ def visual_3d_tool():
         - 3D plot shows point cloud with depth/elevation.
         - Export image or data.
 
+        #### 🛰️ LiDAR & Survey Files:
+        Choose `🛰️ Point File` for **.las** (uncompressed), structured **.npy** or large
+        **.xyz/.txt/.csv** exports. Binary files are memory-mapped; text is read in chunks
+        once. Extra columns (intensity, classification, ...) can be used to color points.
+
+        #### 🌳 Large Clouds:
+        At most the **point budget** is sent to the browser: an octree picks the finest
+        level of detail that fits, or choose a fixed voxel size. Narrow the **visible box**
+        to load more detail for that area.
+
+        #### 🗺️ DEM Surface:
+        Tick `🗺️ DEM Surface` to interpolate the points onto a regular grid with
+        inverse-distance weighting of the k nearest points (optionally within a radius),
+        shown as a 3D surface or heatmap and downloadable as a grid.
+
         #### 💡 Use For:
         - 3D terrain models
         - Lidar/lab profile points
         - Borehole/sample visualization
         """)
 
-    input_method = st.radio("Select Input Method", ["📤 Upload CSV", "✍️ Manual Entry"], key="vis3d_input_method")
+    input_method = st.radio("Select Input Method", ["📤 Upload CSV", "🛰️ Point File (LAS / NPY / XYZ)", "✍️ Manual Entry"],
+                            key="vis3d_input_method")
+
+    if input_method == "🛰️ Point File (LAS / NPY / XYZ)":
+        path = point_file_input()
+        if path is None:
+            return
+        try:
+            key = hash_file_identity(path)
+            with st.spinner("Opening point file..."):
+                cloud = memoize("vis3d_point_files", key, lambda: open_point_file(path), max_entries=4)
+        except Exception as e:
+            st.error(f"❌ File Error: {e}")
+            return
+        st.caption(" · ".join(f"{name}: {value:,}" if isinstance(value, int) else f"{name}: {value}"
+                              for name, value in cloud["info"].items()))
+        try:
+            points = render_point_cloud(cloud, key)
+            st.download_button("📥 Download Rendered Points as CSV", points_csv(points), file_name="3d_point_cloud.csv")
+            show_dem_gridding(cloud, key)
+        except Exception as e:
+            st.error(f"⚠️ Visualization Error: {e}")
+        return
 
     default_df = pd.DataFrame({
         "X": [1, 2, 3, 4, 5],
@@ -67,7 +694,7 @@ def visual_3d_tool():
 
         if uploaded:
             try:
-                df = pd.read_csv(uploaded)
+                df = read_upload(uploaded)
                 st.write("📄 Uploaded Data", df)
 
                 if st.button("🧹 Clear Uploaded File"):
@@ -83,23 +710,19 @@ def visual_3d_tool():
 
     # --- 3D Plotting ---
     try:
-        fig = px.scatter_3d(
-            df,
-            x='X', y='Y', z='Z',
-            color='Z',
-            size_max=8,
-            opacity=0.8,
-            color_continuous_scale='Viridis'
-        )
-        fig.update_layout(title="3D Point Cloud Visualization", margin=dict(l=0, r=0, b=0, t=30))
-        st.plotly_chart(fig, use_container_width=True)
+        cloud = cloud_from_frame(df)
+        if len(cloud["xyz"]) == 0:
+            st.warning("No valid X, Y, Z rows to plot.")
+            return
+        points = render_point_cloud(cloud)
 
-        # PNG Export
         st.download_button(
-            "📥 Download Data as CSV",
-            df.to_csv(index=False),
+            "📥 Download Rendered Points as CSV",
+            points_csv(points),
             file_name="3d_point_cloud.csv"
         )
 
+        show_dem_gridding(cloud, hash_array(cloud["xyz"]))
+
     except Exception as e:
         st.error(f"⚠️ Visualization Error: {e}")